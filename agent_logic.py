@@ -2,20 +2,28 @@
 
 import os
 import json
-import pandas as pd
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.tools import Tool
+import importlib
 import streamlit as st
 from datetime import datetime
 import re
 
-# --- Import all tools from the new modular files ---
-from tools.daily_ops import *
-from tools.monthly_ops import *
-from tools.reports import *
+from app.conversation import format_conversation_context
+from llm_backends import create_llm
+import telemetry
+import mongo_monitor
 
-def manually_render_text_descriptions(tools: list[Tool]) -> str:
+# langchain, the model client and the tool modules (pandas, pymongo) are imported on
+# first use so the first paint of the app doesn't wait for them.
+
+def _lazy_tool(module: str, name: str):
+    """Returns a callable that imports the tool's module on first call."""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+    call.__name__ = name
+    call.__qualname__ = name
+    return call
+
+def manually_render_text_descriptions(tools: list) -> str:
     output = ""
     for tool in tools:
         description = tool.description.strip() if tool.description else "No description available."
@@ -26,14 +34,22 @@ def manually_render_text_descriptions(tools: list[Tool]) -> str:
 
 # Dictionary of all available tool functions with their parameter requirements
 AVAILABLE_TOOLS = {
+    "execute_daily_pipeline": {
+        "func": _lazy_tool("tools.daily_pipeline", "execute_daily_pipeline"),
+        "required_params": ["sales_date"],
+        "description": "Execute all daily steps 1-7 for the SAP ES matched data of a sales date: recover commission, reconcile SAP vs ES, check recovery, process payment, create the bank file, update ES and summarize. Resumes from the last good step if a previous run stopped.",
+        "param_descriptions": {
+            "sales_date": "Sales date in YYYY-MM-DD format or natural language (e.g., 'yesterday')"
+        }
+    },
     "recover_sap_commission": {
-        "func": recover_sap_commission,
+        "func": _lazy_tool("tools.daily_ops", "recover_sap_commission"),
         "required_params": ["order_id", "reason"],
         "description": "Recovers commission from SAP for a specific cancelled order ID and reason.",
         "param_descriptions": {}
     },
     "reconcile_sap_vs_es_sales": {
-        "func": reconcile_sap_vs_es_sales,
+        "func": _lazy_tool("tools.daily_ops", "reconcile_sap_vs_es_sales"),
         "required_params": ["start_date", "end_date"],
         "description": "Reconcile SAP vs ES Commission For a specific date: Reconciles sales data between SAP and ES for a given date range.",
         "param_descriptions": {
@@ -41,87 +57,155 @@ AVAILABLE_TOOLS = {
             "end_date": "End date in YYYY-MM-DD format or natural language"
         }
     },
+    "remove_payment_block": {
+        "func": _lazy_tool("tools.sap_bulk", "remove_payment_block"),
+        # SAP write run only from the reconciliation's confirmation button, never planned by the LLM
+        "planner": False,
+        "required_params": ["records"],
+        "description": "Removes the SAP payment block for the records listed by a SAP vs ES reconciliation, in concurrent batches.",
+        "param_descriptions": {
+            "records": "The payment block removal records of a reconciliation result"
+        }
+    },
     "check_recovery_status": {
-        "func": check_recovery_status,
+        "func": _lazy_tool("tools.recovery", "check_recovery_status"),
         "required_params": [],
-        "description": "Checks if today's order cancellations are fully recovered in payment.",
-        "param_descriptions": {}
+        "description": "Checks if the order cancellations of a date or date range (default: today) are fully recovered in payment, listing the unrecovered orders and their commission.",
+        "param_descriptions": {
+            "start_date": "Cancellation date, or first date of the range, in YYYY-MM-DD format or natural language (e.g., 'yesterday', 'this month'); omit for today",
+            "end_date": "Last date of the range in YYYY-MM-DD format; the same as start_date for a single date"
+        }
     },
     "process_sales_payment": {
-        "func": process_sales_payment,
+        "func": _lazy_tool("tools.daily_ops", "process_sales_payment"),
         "required_params": ["sales_date"],
         "description": "Processes sales payment for a specific sales date.",
         "param_descriptions": {}
     },
     "issue_payment": {
-        "func": issue_payment,
+        "func": _lazy_tool("tools.payment_files", "issue_payment"),
         "required_params": ["amount", "vendor_id"],
-        "description": "Issues a payment to a vendor for a specific amount.",
-        "param_descriptions": {}
+        "description": "Issues a payment to a vendor for a specific amount, by bank transfer or cheque.",
+        "param_descriptions": {
+            "amount": "Amount to pay",
+            "vendor_id": "ID of the vendor to pay"
+        }
+    },
+    "generate_payment_files": {
+        "func": _lazy_tool("tools.payment_files", "generate_payment_files"),
+        "required_params": ["sales_date"],
+        "description": "Creates the bank transfer files and cheque print batches paying the approved commissions of a sales date.",
+        "param_descriptions": {
+            "sales_date": "Sales date in YYYY-MM-DD format or natural language (e.g., 'yesterday')"
+        }
     },
     "update_es_payment_result": {
-        "func": update_es_payment_result,
+        "func": _lazy_tool("tools.daily_ops", "update_es_payment_result"),
         "required_params": ["file_name"],
         "description": "Updates the payment result for a specific file.",
         "param_descriptions": {}
     },
     "recover_canceled_orders": {
-        "func": recover_canceled_orders,
+        "func": _lazy_tool("tools.daily_ops", "recover_canceled_orders"),
         "required_params": [],
         "description": "Recovers canceled orders.",
         "param_descriptions": {}
     },
     "post_intercompany_debits": {
-        "func": post_intercompany_debits,
+        "func": _lazy_tool("tools.monthly_ops", "post_intercompany_debits"),
         "required_params": [],
         "description": "Posts intercompany debits.",
         "param_descriptions": {}
     },
     "accrue_reverse_commissions": {
-        "func": accrue_reverse_commissions,
+        "func": _lazy_tool("tools.monthly_ops", "accrue_reverse_commissions"),
         "required_params": [],
         "description": "Accrues reverse commissions.",
         "param_descriptions": {}
     },
     "reconcile_intercompany_payments": {
-        "func": reconcile_intercompany_payments,
+        "func": _lazy_tool("tools.ic_matching", "reconcile_intercompany_payments"),
         "required_params": [],
-        "description": "Reconciles intercompany payments.",
+        "description": "Reconciles intercompany payments: matches open payment instructions to debit notes, including FX rounding differences, split and partial payments.",
         "param_descriptions": {}
     },
     "send_balance_confirmations": {
-        "func": send_balance_confirmations,
+        "func": _lazy_tool("tools.monthly_ops", "send_balance_confirmations"),
         "required_params": [],
         "description": "Sends balance confirmations.",
         "param_descriptions": {}
     },
+    "fetch_invoice_details": {
+        "func": _lazy_tool("tools.invoices", "fetch_invoice_details"),
+        "required_params": ["start_date", "end_date"],
+        "description": "Fetches invoice details from the external invoice system for a sales date or a date range.",
+        "param_descriptions": {
+            "start_date": "Sales date, or first date of the range, in YYYY-MM-DD format or natural language (e.g., 'yesterday')",
+            "end_date": "Last date of the range in YYYY-MM-DD format; the same as start_date for a single date"
+        }
+    },
+    "get_invoice_count": {
+        "func": _lazy_tool("tools.invoices", "get_invoice_count"),
+        "required_params": ["start_date", "end_date"],
+        "description": "Counts invoices per sales date for a date or a date range (e.g. per day across a month).",
+        "param_descriptions": {
+            "start_date": "Sales date, or first date of the range, in YYYY-MM-DD format or natural language (e.g., 'this month')",
+            "end_date": "Last date of the range in YYYY-MM-DD format; the same as start_date for a single date"
+        }
+    },
     "get_general_commission_report": {
-        "func": get_general_commission_report,
+        "func": _lazy_tool("tools.reports", "get_general_commission_report"),
         "required_params": ["start_date", "end_date"],
         "description": "Generates a general commission report for a given date range.",
         "param_descriptions": {}
     },
     "get_top_vendor_payments": {
-        "func": get_top_vendor_payments,
+        "func": _lazy_tool("tools.reports", "get_top_vendor_payments"),
         "required_params": [],
         "description": "Gets the top vendor payments.",
         "param_descriptions": {}
     },
+    "get_shipment_report": {
+        "func": _lazy_tool("tools.shipments", "get_shipment_report"),
+        "required_params": ["date_query"],
+        "description": "Gets a shipment report by delivery date.",
+        "param_descriptions": {
+            "date_query": "'this month', 'overdue', 'last 7 days', or a specific delivery date in YYYY/MM/DD format"
+        }
+    },
     "get_6a_bonus_forecast": {
-        "func": get_6a_bonus_forecast,
+        "func": _lazy_tool("tools.bonus_forecast", "get_6a_bonus_forecast"),
         "required_params": [],
-        "description": "Gets the 6A bonus forecast.",
+        "description": "Gets the 6A bonus forecast: distributors on track for 6A this month and the expected bonus accrual.",
         "param_descriptions": {}
+    },
+    "generate_1099_report": {
+        "func": _lazy_tool("tools.year_end", "generate_1099_report"),
+        "required_params": ["tax_year"],
+        "description": "Writes the year-end 1099 report of commission payments per distributor and the list of distributors who had a name or SSN change.",
+        "param_descriptions": {
+            "tax_year": "Tax year as a four-digit year (e.g., '2025'); 'last year' means the previous calendar year"
+        }
     }
 }
 
-# Create a list of Tool objects for the agent
-tool_objects = [Tool(name=name, func=info["func"], description=info["description"]) for name, info in AVAILABLE_TOOLS.items()]
+_tool_objects = None
+
+def get_tool_objects() -> list:
+    """Returns the list of langchain Tool objects for the agent, built on first use."""
+    global _tool_objects
+    if _tool_objects is None:
+        from langchain.tools import Tool
+        _tool_objects = [Tool(name=name, func=info["func"], description=info["description"])
+                         for name, info in AVAILABLE_TOOLS.items() if info.get("planner", True)]
+    return _tool_objects
 
 def generate_tool_descriptions() -> str:
     """Generates a formatted string of all available tools and their parameters."""
     descriptions = []
     for name, tool in AVAILABLE_TOOLS.items():
+        if not tool.get("planner", True):
+            continue
         desc = f"- {name}: {tool['description']}\n"
         if 'required_params' in tool:
             desc += "  Required parameters:\n"
@@ -133,7 +217,20 @@ def generate_tool_descriptions() -> str:
         descriptions.append(desc)
     return "\n".join(descriptions)
 
-llm = ChatOpenAI(model="gpt-4-turbo", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+# Chat model backend, selected by LLM_BACKEND (see llm_backends.py) and created on first use
+llm = None
+
+def get_llm():
+    """Returns the chat model backend, creating it on first use."""
+    global llm
+    if llm is None:
+        llm = create_llm()
+    return llm
+
+def set_llm(backend):
+    """Swaps the chat model backend (e.g. for a ReplayLLM stand-in)."""
+    global llm
+    llm = backend
 
 def get_date_prediction_prompt() -> str:
     today = datetime.now().date()
@@ -203,37 +300,30 @@ Remember to:
 11. For "this year" or similar expressions, ALWAYS use the current year (2024) and NEVER use 2023 or any other hardcoded year
 """
 
-prompt = ChatPromptTemplate.from_template(prompt_template_string)
+_prompt = None
 
-# Update the prompt with tool descriptions
-prompt = prompt.partial(tool_descriptions=generate_tool_descriptions())
+def get_prompt():
+    """Returns the planner prompt template, built on first use."""
+    global _prompt
+    if _prompt is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        prompt = ChatPromptTemplate.from_template(prompt_template_string)
+        # Update the prompt with tool descriptions
+        _prompt = prompt.partial(tool_descriptions=generate_tool_descriptions())
+    return _prompt
 
+@telemetry.instrument("turn", "get_planned_action",
+                      is_error=lambda result: result.get("type") in ("json_parse_error", "execution_error"))
 def get_planned_action(user_input: str) -> dict:
     """Determines the action to take based on user input."""
     tool_descriptions = generate_tool_descriptions()
     
-    # Get conversation history
-    conversation_history = st.session_state.get("messages", [])
-    # Get the last 25 messages for context (excluding the current input)
-    recent_messages = conversation_history[-25:-1] if len(conversation_history) > 1 else []
-    
-    # Format conversation history with token optimization
-    conversation_context = ""
-    if recent_messages:
-        conversation_context = "Recent conversation (last 25 messages):\n"
-        for msg in recent_messages:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            # Truncate long messages to save tokens
-            content = str(msg['content'])
-            if len(content) > 100:  # Truncate messages longer than 100 chars
-                content = content[:97] + "..."
-            conversation_context += f"{role}: {content}\n"
+    # Conversation context comes from the incrementally maintained state
+    conversation_context = format_conversation_context(st.session_state.get("conversation_state"), user_input)
     
-    # Update the prompt with conversation context
-    chain = prompt | llm
     try:
         # Do not remove formatted_prompt commented code
-        formatted_prompt = prompt.format_messages(
+        formatted_prompt = get_prompt().format_messages(
             tool_descriptions=tool_descriptions, 
             user_input=user_input,
             date_prediction_prompt=get_date_prediction_prompt(),
@@ -243,17 +333,22 @@ def get_planned_action(user_input: str) -> dict:
         for msg in formatted_prompt:
             print(f"{msg.type.upper()}: {msg.content}")
 
-        response = chain.invoke({
-            "tool_descriptions": tool_descriptions, 
-            "user_input": user_input,
-            "date_prediction_prompt": get_date_prediction_prompt(),
-            "conversation_context": conversation_context
-        })
+        with telemetry.timed("llm", "planner"):
+            response = get_llm().invoke(formatted_prompt)
+        telemetry.record_llm_usage(response)
         content = response.content
         print("============content===============")
         print(content)
         try:
             planned_action = json.loads(content)
+            if planned_action.get("status") == "action_found" and \
+                    not AVAILABLE_TOOLS.get(planned_action.get("action"), {}).get("planner", True):
+                # e.g. remove_payment_block: only the reconciliation's button may run it
+                return {
+                    "status": "action_not_found",
+                    "message": f"{planned_action['action']} can only be run from its confirmation button.",
+                    "type": "action_not_found"
+                }
             if planned_action["status"] == "action_found" and "action" in planned_action and "args" in planned_action:
                 return {
                     "status": "action_found",
@@ -281,13 +376,17 @@ def get_planned_action(user_input: str) -> dict:
             "type": "execution_error"
         }
 
+@telemetry.instrument("tool", label=lambda action: action.get("action"),
+                      is_error=lambda result: "error" in result or (result.get("result") or {}).get("status") == "error",
+                      rows_read=telemetry.count_rows)
 def execute_action(action: dict):
     tool_name = action.get("action")
     tool_args = action.get("args")
     if tool_name in AVAILABLE_TOOLS:
         try:
             tool_function = AVAILABLE_TOOLS[tool_name]["func"]
-            result = tool_function(**tool_args)
+            with mongo_monitor.tool_context(tool_name):
+                result = tool_function(**tool_args)
             return {
                 "tool": tool_name,
                 "result": result
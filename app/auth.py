@@ -25,6 +25,7 @@ def show_login_ui():
         if submitted:
             if username == correct_username and password == correct_password:
                 st.session_state.authenticated = True
+                st.session_state.username = username
                 st.rerun()
             else:
                 st.error("Invalid username or password.")
\ No newline at end of file
@@ -1,11 +1,58 @@
 # app/chat_ui.py
 
+import json
 import streamlit as st
-import pandas as pd
 from streamlit_mic_recorder import mic_recorder
 from agent_logic import execute_action
+from jobs import get_job_manager
 from ui_components import display_predefined_actions, display_welcome_message, display_reconciliation_results, TOOL_UI_RENDERERS
 from app.state import add_message, process_text_input, handle_user_input
+from app.conversation import get_conversation_state, mark_action_cancelled, rebuild_conversation_state
+from app.rendering import render_history, history_page_of, message_key
+from app.render_cache import clear_render_cache
+from app.voice import transcribe_audio
+from app.session_memory import enforce_budget, memory_report, OPERATOR_PANEL
+import telemetry
+
+# How often the jobs panel polls for progress (seconds)
+JOB_POLL_SECONDS = 1
+# Chats listed in the sidebar per "Load more" page
+SIDEBAR_PAGE_SIZE = 20
+# Search hits listed in the sidebar
+SEARCH_RESULT_LIMIT = 10
+
+def _open_chat(db_manager, chat_id: str, focus_message_id: str = None, focus_position: int = None):
+    """Loads a stored chat into the session, optionally at the page showing one of its messages."""
+    st.session_state.chat_id = chat_id
+    st.session_state.messages = db_manager.get_chat_messages(chat_id)
+    if focus_message_id is None and focus_position is not None and focus_position < len(st.session_state.messages):
+        # Messages stored before ids existed get one now, as message_key would on render
+        focus_message_id = message_key(st.session_state.messages[focus_position], focus_position)
+    st.session_state.conversation_state = rebuild_conversation_state(st.session_state.messages)
+    st.session_state.pending_action = None
+    st.session_state.focus_message_id = focus_message_id
+    st.session_state.history_page = history_page_of(st.session_state.messages, focus_message_id)
+    clear_render_cache()
+    # Pick up background jobs still running for this chat
+    st.session_state.active_jobs = get_job_manager().jobs_for_chat(chat_id)
+    enforce_budget(db_manager)
+
+def _render_chat_search(db_manager):
+    """Full-text search over stored chats; a hit opens its chat at the matching message."""
+    query = st.text_input("Search chats", key="chat_search_query", placeholder="🔎 Slip, distributor, order or words",
+                          label_visibility="collapsed").strip()
+    if not query or not hasattr(db_manager, "search_messages"):
+        return
+    hits = db_manager.search_messages(query, limit=SEARCH_RESULT_LIMIT)
+    if not hits:
+        st.caption("No matching chats.")
+    for hit in hits:
+        key = f"search_{hit['chat_id']}_{hit['position']}"
+        if st.button(hit["title"], key=key, use_container_width=True, help="Open at the matching message"):
+            _open_chat(db_manager, hit["chat_id"], hit["message_id"], hit["position"])
+            st.rerun()
+        st.caption(hit["snippet"])
+    st.markdown("---")
 
 def _render_sidebar(db_manager):
     """Renders the sidebar with chat history, controls, and DB status."""
@@ -14,34 +61,44 @@ def _render_sidebar(db_manager):
         st.markdown("---")
         if st.button("➕ New Chat", use_container_width=True):
             auth_state = st.session_state.authenticated
+            username = st.session_state.get("username")
             for key in st.session_state.keys():
                 del st.session_state[key]
             st.session_state.authenticated = auth_state
+            if username:
+                st.session_state.username = username
             st.rerun()
 
         st.markdown("#### Chat History")
-        chat_summaries = db_manager.get_chat_summaries()
+        _render_chat_search(db_manager)
+        limit = st.session_state.get("sidebar_chat_limit", SIDEBAR_PAGE_SIZE)
+        # Fetch one extra summary to know whether there is more to load
+        chat_summaries = db_manager.get_chat_summaries(limit=limit + 1)
+        has_more = len(chat_summaries) > limit
         if "chat_id" not in st.session_state:
             st.session_state.chat_id = None
-        for chat in chat_summaries:
+        for chat in chat_summaries[:limit]:
             col1, col2 = st.columns([4, 1])
             if col1.button(chat["title"], key=f"load_{chat['chat_id']}", use_container_width=True):
-                st.session_state.chat_id = chat["chat_id"]
-                st.session_state.messages = db_manager.get_chat_messages(chat['chat_id'])
-                st.session_state.pending_action = None
+                _open_chat(db_manager, chat["chat_id"])
                 st.rerun()
             if col2.button("🗑️", key=f"del_{chat['chat_id']}", help="Delete chat"):
                 db_manager.delete_chat(chat['chat_id'])
                 if st.session_state.get("chat_id") == chat['chat_id']:
                     st.session_state.chat_id = None
                     st.session_state.messages = []
+                    st.session_state.conversation_state = None
                     st.session_state.pending_action = None
                 st.rerun()
+        if has_more and st.button("Load more", key="load_more_chats", use_container_width=True):
+            st.session_state.sidebar_chat_limit = limit + SIDEBAR_PAGE_SIZE
+            st.rerun()
 
         st.markdown("---")
         if st.button("Clear All History", type="primary", use_container_width=True):
             db_manager.clear_all_history()
             st.session_state.messages = []
+            st.session_state.conversation_state = None
             st.session_state.pending_action = None
             if 'chat_id' in st.session_state:
                 del st.session_state['chat_id']
@@ -55,47 +112,139 @@ def _render_sidebar(db_manager):
             else:
                 st.warning(status_info["message"], icon="⚠️")
 
+        if OPERATOR_PANEL:
+            _render_memory_panel()
+            if telemetry.ENABLED:
+                _render_telemetry_panel()
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def _render_memory_panel():
+    """Operator view of the memory held by this session and by all sessions on this server."""
+    report = memory_report()
+    own = report["sessions"].get(st.session_state.get("memory_session_id"), {})
+    with st.expander("🧠 Session memory"):
+        st.caption(f"Budget per session: {_format_bytes(report['budget_bytes'])}")
+        st.markdown(
+            f"**This session:** {_format_bytes(own.get('bytes', 0))} in memory, "
+            f"{own.get('spilled_messages', 0)} results spilled ({_format_bytes(own.get('spilled_bytes', 0))})"
+        )
+        st.markdown(
+            f"**All sessions ({len(report['sessions'])}):** {_format_bytes(report['total_bytes'])} in memory, "
+            f"{_format_bytes(report['total_spilled_bytes'])} spilled"
+        )
+        if report["sessions"]:
+            st.dataframe(
+                [{"session": s[:8], "in memory": _format_bytes(i["bytes"]), "messages": i["messages"],
+                  "spilled": i["spilled_messages"]} for s, i in report["sessions"].items()],
+                hide_index=True, use_container_width=True
+            )
+
+def _render_telemetry_panel():
+    """Operator view of latency, tokens, rows and errors per operation since the server started."""
+    snapshot = telemetry.snapshot()
+    with st.expander("⏱️ Performance"):
+        tokens = {c["metric"]: c["value"] for c in snapshot["counters"] if c["kind"] == "llm"}
+        st.caption(
+            f"LLM tokens: {tokens.get('llm_prompt_tokens', 0):,} prompt, "
+            f"{tokens.get('llm_completion_tokens', 0):,} completion"
+        )
+        if snapshot["operations"]:
+            st.dataframe(
+                [{"operation": f"{o['kind']}:{o['name']}", "calls": o["calls"], "errors": o["errors"],
+                  "p50 ms": o["p50_ms"], "p95 ms": o["p95_ms"], "rows": o["rows_read"] + o["rows_written"]}
+                 for o in snapshot["operations"]],
+                hide_index=True, use_container_width=True
+            )
+        cols = st.columns(2)
+        cols[0].download_button("Prometheus", data=telemetry.prometheus_text, file_name="metrics.prom",
+                                use_container_width=True)
+        cols[1].download_button("JSON", data=lambda: json.dumps(telemetry.snapshot(), indent=2),
+                                file_name="metrics.json", use_container_width=True)
+
 def _render_chat_messages():
-    for idx, msg in enumerate(st.session_state.messages):
-        with st.chat_message(msg["role"]):
-            content = msg["content"]
-            # If this is a tool result dict, use render_tool_result and pass idx
-            if isinstance(content, dict) and "tool" in content and "result" in content:
-                render_tool_result(content, idx=idx)
-            elif isinstance(content, list):
-                df = pd.DataFrame(content)
-                if "Error" in df.columns:
-                    st.error(df["Error"].iloc[0])
-                elif df.empty:
-                    st.write("No records found for your query.")
-                else:
-                    st.write("Here is a preview of the report:")
-                    st.dataframe(df.head(10))
-                    @st.cache_data
-                    def convert_df_to_csv(d):
-                        return d.to_csv(index=False).encode('utf-8')
-                    csv_data = convert_df_to_csv(df)
-                    st.download_button("📥 Download Full Report", csv_data, "report.csv", "text/csv")
-            else:
-                st.markdown(str(content))
+    render_history(st.session_state.messages)
     
     # Always check for pending action first
     if st.session_state.pending_action:
         col1, col2, col3 = st.columns([1, 1, 4])
         if col1.button("✅ Yes, proceed", use_container_width=True):
-            with st.spinner("Executing action..."):
-                action_to_run = st.session_state.pending_action
-                st.session_state.pending_action = None
-                result = execute_action(action_to_run)
-                add_message("assistant", result)
-                st.rerun()
+            action_to_run = st.session_state.pending_action
+            st.session_state.pending_action = None
+            # Run the tool on the worker pool so the session stays responsive
+            job_id = get_job_manager().submit(
+                execute_action, action_to_run,
+                label=action_to_run.get("action", "action"),
+                chat_id=st.session_state.get("chat_id")
+            )
+            st.session_state.active_jobs.append(job_id)
+            st.rerun()
         if col2.button("❌ No, cancel", use_container_width=True):
             st.session_state.pending_action = None
+            mark_action_cancelled(get_conversation_state())
             add_message("assistant", "Action cancelled.")
             st.rerun()
         return  # Do not render chat messages if pending action is present
 
-def _render_user_input(openai_client):
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _render_jobs():
+    """Shows progress of background jobs and posts their results to the chat once finished."""
+    job_manager = get_job_manager()
+    finished = []
+    for job_id in list(st.session_state.active_jobs):
+        job = job_manager.get(job_id)
+        if job is None:
+            # Expired or collected by another session
+            st.session_state.active_jobs.remove(job_id)
+            continue
+        if job.finished:
+            finished.append(job_id)
+            continue
+        info = job.snapshot()
+        status_text = info["progress_message"] or info["status"].capitalize()
+        st.progress(info["progress"], text=f"⏳ {info['label']}: {status_text} ({info['elapsed']:.0f}s)")
+
+    if finished:
+        for job_id in finished:
+            st.session_state.active_jobs.remove(job_id)
+            job = job_manager.collect(job_id)
+            if job is None:
+                continue
+            if job.status == "done":
+                add_message("assistant", job.result)
+            else:
+                add_message("assistant", {"tool": job.label, "error": job.error})
+        st.rerun()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _render_transcription():
+    """Waits for the background transcription and feeds the text to the chat once ready."""
+    job_manager = get_job_manager()
+    job_id = st.session_state.transcription_job
+    job = job_manager.get(job_id)
+    if job is None:
+        st.session_state.transcription_job = None
+        return
+    if not job.finished:
+        st.caption("🎤 Transcribing...")
+        return
+
+    job_manager.collect(job_id)
+    st.session_state.transcription_job = None
+    if job.status == "failed":
+        st.session_state.voice_error = job.error
+    elif job.result:
+        handle_user_input(job.result)
+    else:
+        add_message("assistant", "I couldn't understand the audio. Could you please try again or type your message?")
+    st.rerun()
+
+def _render_user_input():
     """Renders the user input bar."""
     st.markdown('<div class="sticky-input-bar">', unsafe_allow_html=True)
     input_container = st.container()
@@ -116,35 +265,23 @@ def _render_user_input(openai_client):
                     key='mic',
                     just_once=True,
                     use_container_width=True,
+                    format="wav",
                 )
         
         if audio_bytes:
-            with st.spinner("Transcribing..."):
-                try:
-                    transcript = openai_client.audio.transcriptions.create(
-                        model="whisper-1", file=("audio.wav", audio_bytes['bytes'])
-                    )
-                    handle_user_input(transcript.text)
-                    st.rerun()
-                except Exception as e:
-                    # Use a more appropriate error display method
-                    st.markdown(f'<div class="error-message">🚨 Voice transcription failed: {str(e)}</div>', unsafe_allow_html=True)
+            # Downsample and transcribe on the worker pool so the UI stays responsive
+            st.session_state.transcription_job = get_job_manager().submit(
+                transcribe_audio, audio_bytes['bytes'], label="transcription"
+            )
+            st.session_state.voice_error = None
+        if st.session_state.get("transcription_job"):
+            _render_transcription()
+        if st.session_state.get("voice_error"):
+            # Use a more appropriate error display method
+            st.markdown(f'<div class="error-message">🚨 Voice transcription failed: {st.session_state.voice_error}</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
-def render_tool_result(tool_result, idx=None):
-    tool = tool_result.get("tool")
-    result = tool_result.get("result")
-    error = tool_result.get("error")
-    if error:
-        st.error(error)
-        return
-    renderer = TOOL_UI_RENDERERS.get(tool)
-    if renderer:
-        renderer(result, idx=idx)
-    else:
-        st.write(result)
-
-def show_main_chat_ui(db_manager, openai_client):
+def show_main_chat_ui(db_manager):
     """The main function to build the entire chat UI."""
     _render_sidebar(db_manager)
     
@@ -158,4 +295,6 @@ def show_main_chat_ui(db_manager, openai_client):
     st.markdown("---")
 
     _render_chat_messages()
-    _render_user_input(openai_client)
\ No newline at end of file
+    if st.session_state.active_jobs:
+        _render_jobs()
+    _render_user_input()
\ No newline at end of file
@@ -0,0 +1,126 @@
+# app/conversation.py
+
+import streamlit as st
+from app.session_memory import is_spilled
+
+# Number of lines kept in the rolling summary fed to the planner
+SUMMARY_MAX_LINES = 12
+# Max characters kept per summary line
+SUMMARY_LINE_CHARS = 100
+
+
+def new_conversation_state() -> dict:
+    """Returns an empty conversation state record."""
+    return {
+        "last_action": None,      # {"action": ..., "args": {...}, "status": "pending" | "executed" | "cancelled" | "failed"}
+        "gathered_params": {},    # Parameters collected so far for the last action
+        "summary": [],            # Rolling list of {"role": ..., "text": ...}
+        "message_count": 0
+    }
+
+
+def get_conversation_state() -> dict:
+    """Returns the conversation state for the current session, creating it if needed."""
+    if st.session_state.get("conversation_state") is None:
+        st.session_state.conversation_state = new_conversation_state()
+    return st.session_state.conversation_state
+
+
+def _truncate(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        return text[:SUMMARY_LINE_CHARS - 3] + "..."
+    return text
+
+
+def _summarize_content(content) -> str:
+    """Builds a short description of a message without stringifying large payloads."""
+    if isinstance(content, str):
+        return _truncate(content)
+    if is_spilled(content):
+        return content.get("summary", "Returned a large result")
+    if isinstance(content, dict) and "tool" in content:
+        tool = content.get("tool")
+        if content.get("error"):
+            return _truncate(f"Ran {tool}: failed ({content['error']})")
+        result = content.get("result")
+        if isinstance(result, dict):
+            status = result.get("status", "done")
+            message = result.get("message")
+            if isinstance(message, str):
+                return _truncate(f"Ran {tool}: {status} - {message}")
+            return f"Ran {tool}: {status}"
+        if isinstance(result, list):
+            return f"Ran {tool}: returned {len(result)} rows"
+        return f"Ran {tool}"
+    if isinstance(content, list):
+        return f"Returned a table with {len(content)} rows"
+    if isinstance(content, dict):
+        return _truncate(f"Returned a record with fields: {', '.join(map(str, list(content)[:8]))}")
+    return _truncate(type(content).__name__)
+
+
+def update_conversation_state(state: dict, role: str, content) -> dict:
+    """Folds a single new message into the conversation state."""
+    state["summary"].append({"role": role, "text": _summarize_content(content)})
+    if len(state["summary"]) > SUMMARY_MAX_LINES:
+        del state["summary"][:-SUMMARY_MAX_LINES]
+    state["message_count"] += 1
+
+    last_action = state.get("last_action")
+    if role == "assistant" and last_action and last_action.get("status") == "pending":
+        if isinstance(content, dict) and content.get("tool") == last_action.get("action"):
+            last_action["status"] = "failed" if content.get("error") else "executed"
+    return state
+
+
+def record_planned_action(state: dict, action: str, args: dict) -> dict:
+    """Records the action proposed by the planner and merges the parameters gathered so far."""
+    last_action = state.get("last_action")
+    if not last_action or last_action.get("action") != action:
+        state["gathered_params"] = {}
+    state["gathered_params"].update({k: v for k, v in (args or {}).items() if v not in (None, "")})
+    state["last_action"] = {"action": action, "args": dict(args or {}), "status": "pending"}
+    return state
+
+
+def mark_action_cancelled(state: dict) -> dict:
+    """Marks the pending action as cancelled by the user."""
+    if state.get("last_action"):
+        state["last_action"]["status"] = "cancelled"
+    return state
+
+
+def rebuild_conversation_state(messages: list) -> dict:
+    """Rebuilds the conversation state from a stored chat (e.g. when loading from history)."""
+    state = new_conversation_state()
+    for msg in messages[-SUMMARY_MAX_LINES:]:
+        if isinstance(msg, dict):
+            update_conversation_state(state, msg.get("role", "assistant"), msg.get("content"))
+    state["message_count"] = len(messages)
+    return state
+
+
+def format_conversation_context(state: dict | None, user_input: str | None = None) -> str:
+    """Formats the conversation state into the planner's context block."""
+    if not state or not state.get("summary"):
+        return ""
+
+    summary = state["summary"]
+    # The current input is already part of the state; the planner gets it separately
+    if user_input is not None and summary[-1]["role"] == "user" and summary[-1]["text"] == _truncate(user_input):
+        summary = summary[:-1]
+
+    lines = []
+    last_action = state.get("last_action")
+    if last_action:
+        lines.append(f"Last proposed action: {last_action['action']} ({last_action['status']})")
+        if state.get("gathered_params"):
+            params = ", ".join(f"{k}={v}" for k, v in state["gathered_params"].items())
+            lines.append(f"Parameters gathered so far: {params}")
+    if summary:
+        lines.append(f"Recent conversation (last {len(summary)} messages):")
+        for entry in summary:
+            role = "User" if entry["role"] == "user" else "Assistant"
+            lines.append(f"{role}: {entry['text']}")
+    return "\n".join(lines) + "\n" if lines else ""
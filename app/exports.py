@@ -0,0 +1,133 @@
+# app/exports.py
+
+import io
+import importlib.util
+import threading
+from collections import OrderedDict
+import streamlit as st
+
+# Rows serialized per chunk
+EXPORT_CHUNK_ROWS = 5000
+# Max number of serialized exports kept in memory (shared by all sessions)
+EXPORT_CACHE_MAX_ENTRIES = 32
+
+_export_cache = OrderedDict()
+_export_cache_lock = threading.Lock()
+
+
+def _chunks(records: list, chunk_rows: int):
+    import pandas as pd
+    for start in range(0, len(records), chunk_rows):
+        yield pd.DataFrame(records[start:start + chunk_rows])
+
+
+def write_csv(records: list, out, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    for i, chunk in enumerate(_chunks(records, chunk_rows)):
+        chunk.to_csv(text, index=False, header=(i == 0))
+    text.detach()
+
+
+def _parquet_schema(records: list, chunk_rows: int):
+    """
+    One schema for every chunk: the chunk schemas unified and widened (null -> the type
+    seen later, int64 -> double), so a column that is empty in the first chunk still fits.
+    """
+    import pyarrow as pa
+    schemas = [pa.Schema.from_pandas(chunk, preserve_index=False).remove_metadata()
+               for chunk in _chunks(records, chunk_rows)]
+    return pa.unify_schemas(schemas, promote_options="permissive") if schemas else None
+
+
+def write_parquet(records: list, out, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema(records, chunk_rows)
+    if schema is None:
+        return
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in _chunks(records, chunk_rows):
+            # Columns a chunk lacks are written as nulls
+            chunk = chunk.reindex(columns=schema.names)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_xlsx(records: list, out, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    import pandas as pd
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Report")
+    for i, chunk in enumerate(_chunks(records, chunk_rows)):
+        if i == 0:
+            sheet.append([str(c) for c in chunk.columns])
+        for row in chunk.itertuples(index=False):
+            sheet.append([None if pd.isna(v) else (v.to_pydatetime() if isinstance(v, pd.Timestamp) else v) for v in row])
+    workbook.save(out)
+
+
+def _module_available(name: str) -> bool:
+    # find_spec avoids importing the (heavy) module just to check for it
+    return importlib.util.find_spec(name) is not None
+
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "mime": "text/csv", "writer": write_csv, "requires": None},
+    "parquet": {"label": "Parquet", "mime": "application/vnd.apache.parquet", "writer": write_parquet, "requires": "pyarrow"},
+    "xlsx": {"label": "Excel", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "writer": write_xlsx, "requires": "openpyxl"},
+}
+
+_available_formats = None
+
+
+def available_formats() -> list:
+    """Formats whose optional dependencies are installed."""
+    global _available_formats
+    if _available_formats is None:
+        _available_formats = [fmt for fmt, spec in EXPORT_FORMATS.items()
+                              if spec["requires"] is None or _module_available(spec["requires"])]
+    return _available_formats
+
+
+def _serialize(records: list, fmt: str) -> bytes:
+    out = io.BytesIO()
+    EXPORT_FORMATS[fmt]["writer"](records, out)
+    return out.getvalue()
+
+
+def export_records(artifact_id: str | None, records: list, fmt: str) -> bytes:
+    """Serializes records in the given format, cached by artifact ID and format (None disables caching)."""
+    if artifact_id is None:
+        return _serialize(records, fmt)
+    key = (artifact_id, fmt)
+    with _export_cache_lock:
+        if key in _export_cache:
+            _export_cache.move_to_end(key)
+            return _export_cache[key]
+
+    data = _serialize(records, fmt)
+
+    with _export_cache_lock:
+        _export_cache[key] = data
+        while len(_export_cache) > EXPORT_CACHE_MAX_ENTRIES:
+            _export_cache.popitem(last=False)
+    return data
+
+
+def render_download_buttons(artifact_id: str | None, records: list, file_stem: str, label: str = "📥 Download"):
+    """
+    Renders one download button per available format. Nothing is serialized until a
+    button is clicked; Streamlit then calls the deferred callable off the script thread.
+    """
+    formats = available_formats()
+    cols = st.columns(len(formats) + 2)
+    for col, fmt in zip(cols, formats):
+        spec = EXPORT_FORMATS[fmt]
+        col.download_button(
+            f"{label} {spec['label']}",
+            data=lambda fmt=fmt: export_records(artifact_id, records, fmt),
+            file_name=f"{file_stem}.{fmt}",
+            mime=spec["mime"],
+            key=f"export_{artifact_id or file_stem}_{fmt}",
+            on_click="ignore",
+            use_container_width=True
+        )
@@ -0,0 +1,68 @@
+# app/render_cache.py
+
+from collections import OrderedDict
+import streamlit as st
+
+# Max number of render-ready objects kept per session
+RENDER_CACHE_MAX_ENTRIES = 200
+
+
+def _get_cache() -> OrderedDict:
+    if not isinstance(st.session_state.get("render_cache"), OrderedDict):
+        st.session_state.render_cache = OrderedDict()
+    return st.session_state.render_cache
+
+
+def cached_render_object(key, builder):
+    """
+    Returns the render-ready object stored under key, building it once with builder().
+    A key of None disables caching.
+    """
+    if key is None:
+        return builder()
+    cache = _get_cache()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = builder()
+    cache[key] = value
+    while len(cache) > RENDER_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+    return value
+
+
+def cached_latest(key, version, builder):
+    """
+    Like cached_render_object, but keeps only the object built for the latest version
+    under key (e.g. one filtered view per grid), rebuilding it when the version changes.
+    """
+    if key is None:
+        return builder()
+    cache = _get_cache()
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        cache.move_to_end(key)
+        return entry[1]
+    value = builder()
+    cache[key] = (version, value)
+    cache.move_to_end(key)
+    while len(cache) > RENDER_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+    return value
+
+
+def cached_frame(key, records: list) -> "pandas.DataFrame":
+    """Builds a DataFrame from records once per key."""
+    import pandas as pd
+    return cached_render_object(key, lambda: pd.DataFrame(records))
+
+
+def clear_render_cache():
+    st.session_state.render_cache = OrderedDict()
+
+
+def evict_render_cache(prefix: str):
+    """Drops the render-ready objects built for one message (keys start with its id)."""
+    cache = _get_cache()
+    for key in [k for k in cache if isinstance(k, str) and k.startswith(prefix)]:
+        del cache[key]
@@ -0,0 +1,127 @@
+# app/rendering.py
+
+import uuid
+import streamlit as st
+from ui_components import TOOL_UI_RENDERERS
+from app.render_cache import cached_render_object, cached_frame
+from app.exports import render_download_buttons
+from app.session_memory import resolve_content
+
+# Most recent messages always rendered in full
+RECENT_MESSAGES = 10
+# Older messages are shown one page at a time
+HISTORY_PAGE_SIZE = 10
+
+
+def history_page_of(messages: list, message_id: str = None) -> int:
+    """Page of the older-messages view that shows a message; 1 when it is recent or not found."""
+    older_count = max(0, len(messages) - RECENT_MESSAGES)
+    for idx, msg in enumerate(messages[:older_count]):
+        if isinstance(msg, dict) and message_id and msg.get("id") == message_id:
+            return (older_count - 1 - idx) // HISTORY_PAGE_SIZE + 1
+    return 1
+
+
+def _focus_marker(msg: dict):
+    """Marks the message a chat search opened the chat at."""
+    if msg.get("id") and msg.get("id") == st.session_state.get("focus_message_id"):
+        st.caption("🔎 Search match")
+
+
+def message_key(msg: dict, idx: int) -> str:
+    """Stable key for a message, used for render caching, export caching and widget keys."""
+    if not msg.get("id"):
+        # Messages stored before ids existed get one for the rest of the session
+        msg["id"] = uuid.uuid4().hex
+    return msg["id"]
+
+
+def render_tool_result(tool_result, idx=None):
+    tool = tool_result.get("tool")
+    result = tool_result.get("result")
+    error = tool_result.get("error")
+    if error:
+        st.error(error)
+        return
+    renderer = TOOL_UI_RENDERERS.get(tool)
+    if renderer:
+        renderer(result, idx=idx)
+    else:
+        st.write(result)
+
+
+def _table_view(key: str, records: list) -> dict:
+    """Builds the render-ready form of a list message once."""
+    df = cached_frame(f"{key}:table", records)
+    if "Error" in df.columns:
+        return {"error": df["Error"].iloc[0]}
+    if df.empty:
+        return {"empty": True}
+    return {"df": df, "preview": df.head(10)}
+
+
+def render_message_content(msg: dict, key: str):
+    # Spilled payloads are reloaded for this render only and not kept in session memory
+    content = resolve_content(msg)
+    # If this is a tool result dict, use render_tool_result and pass the message key
+    if isinstance(content, dict) and "tool" in content and ("result" in content or "error" in content):
+        render_tool_result(content, idx=key)
+    elif isinstance(content, list):
+        view = cached_render_object(f"{key}:view", lambda: _table_view(key, content))
+        if "error" in view:
+            st.error(view["error"])
+        elif view.get("empty"):
+            st.write("No records found for your query.")
+        else:
+            st.write("Here is a preview of the report:")
+            st.dataframe(view["preview"])
+            render_download_buttons(f"{key}:report", content, "report", label="📥 Full Report")
+    else:
+        st.markdown(str(content))
+
+
+@st.fragment
+def _render_message(msg: dict, key: str):
+    """Renders one message; widget interactions inside only rerun this fragment."""
+    with st.chat_message(msg["role"]):
+        _focus_marker(msg)
+        render_message_content(msg, key)
+
+
+@st.fragment
+def _render_older_messages(messages: list, older_count: int):
+    """Paginated view of the messages before the recent window."""
+    page_count = (older_count + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    # Page 1 is the page right before the recent window
+    page = min(st.session_state.get("history_page", 1), page_count)
+    end = older_count - (page - 1) * HISTORY_PAGE_SIZE
+    start = max(0, end - HISTORY_PAGE_SIZE)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("◀ Older", disabled=page >= page_count, key="history_older", use_container_width=True):
+        st.session_state.history_page = page + 1
+        st.rerun(scope="fragment")
+    col2.caption(f"Messages {start + 1}-{end} of {older_count} (page {page} of {page_count})")
+    if col3.button("Newer ▶", disabled=page <= 1, key="history_newer", use_container_width=True):
+        st.session_state.history_page = page - 1
+        st.rerun(scope="fragment")
+
+    for idx in range(start, end):
+        msg = messages[idx]
+        with st.chat_message(msg["role"]):
+            _focus_marker(msg)
+            render_message_content(msg, message_key(msg, idx))
+
+
+def render_history(messages: list):
+    """Renders the chat history: older messages collapsed and paginated, recent ones in full."""
+    older_count = max(0, len(messages) - RECENT_MESSAGES)
+    if older_count:
+        # A search hit among the older messages opens them at its page
+        focus = st.session_state.get("focus_message_id")
+        expanded = bool(focus) and any(m.get("id") == focus for m in messages[:older_count] if isinstance(m, dict))
+        with st.expander(f"Earlier messages ({older_count})", expanded=expanded):
+            _render_older_messages(messages, older_count)
+    for idx in range(older_count, len(messages)):
+        msg = messages[idx]
+        _render_message(msg, message_key(msg, idx))
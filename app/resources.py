@@ -0,0 +1,24 @@
+# app/resources.py
+
+import os
+import streamlit as st
+
+# Storage manager registered by main.py once resources are initialized
+_db_manager = None
+
+
+def set_db_manager(db_manager):
+    """Registers the storage manager shared by the app."""
+    global _db_manager
+    _db_manager = db_manager
+
+
+def get_db_manager():
+    return _db_manager
+
+
+@st.cache_resource
+def get_openai_client():
+    """OpenAI client used for voice transcription, created on first use."""
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
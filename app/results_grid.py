@@ -0,0 +1,119 @@
+# app/results_grid.py
+
+import streamlit as st
+import pandas as pd
+from app.render_cache import cached_render_object, cached_latest
+
+PAGE_SIZES = [25, 50, 100, 250]
+# Distributors listed in the per-distributor count summary
+TOP_DISTRIBUTORS = 10
+
+
+def prepare_results_frame(records: list) -> pd.DataFrame:
+    """Builds the server-side frame once, with typed dates and the amount delta column."""
+    df = pd.DataFrame(records)
+    if "Sale date" in df.columns:
+        df["Sale date"] = pd.to_datetime(df["Sale date"], errors="coerce")
+    if "ES Amount" in df.columns and "SAP Amount" in df.columns:
+        df["Amount Delta"] = df["ES Amount"] - df["SAP Amount"]
+    return df
+
+
+def compute_aggregates(df: pd.DataFrame) -> dict:
+    """Summary figures for a result, computed once per result."""
+    aggregates = {"rows": len(df)}
+    if "Amount Delta" in df.columns:
+        aggregates["total_delta"] = float(df["Amount Delta"].sum())
+        aggregates["abs_delta"] = float(df["Amount Delta"].abs().sum())
+    elif "Amount" in df.columns:
+        aggregates["total_amount"] = float(df["Amount"].sum())
+    if "Distributor ID" in df.columns:
+        counts = df.groupby(df["Distributor ID"].astype(str)).size().sort_values(ascending=False)
+        aggregates["distributors"] = int(counts.size)
+        top = counts.head(TOP_DISTRIBUTORS).rename("Records").reset_index()
+        if "Distributor Name" in df.columns:
+            names = df.assign(_id=df["Distributor ID"].astype(str)).drop_duplicates("_id").set_index("_id")["Distributor Name"]
+            top.insert(1, "Distributor Name", top["Distributor ID"].map(names))
+        aggregates["per_distributor"] = top
+    return aggregates
+
+
+def filter_results(df: pd.DataFrame, distributor: str = "", buyer: str = "", date_range=None,
+                   min_abs_delta: float = 0.0, sort_by: str | None = None, ascending: bool = True) -> pd.DataFrame:
+    """Applies the grid filters and sort on the server-side frame."""
+    mask = pd.Series(True, index=df.index)
+    if distributor:
+        needle = distributor.strip().lower()
+        match = df["Distributor ID"].astype(str).str.lower().str.contains(needle, regex=False)
+        if "Distributor Name" in df.columns:
+            match |= df["Distributor Name"].astype(str).str.lower().str.contains(needle, regex=False)
+        mask &= match
+    if buyer and "Buyer ID" in df.columns:
+        mask &= df["Buyer ID"].astype(str).str.contains(buyer.strip(), regex=False)
+    if date_range and "Sale date" in df.columns and len(date_range) == 2:
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+        mask &= (df["Sale date"] >= start) & (df["Sale date"] < end)
+    if min_abs_delta and "Amount Delta" in df.columns:
+        mask &= df["Amount Delta"].abs() >= min_abs_delta
+    view = df[mask]
+    if sort_by and sort_by in view.columns:
+        view = view.sort_values(sort_by, ascending=ascending, kind="stable")
+    return view
+
+
+def _render_aggregates(aggregates: dict):
+    cols = st.columns(3)
+    cols[0].metric("Records", f"{aggregates['rows']:,}")
+    if "total_delta" in aggregates:
+        cols[1].metric("Total delta (ES - SAP)", f"{aggregates['total_delta']:,.2f}")
+    elif "total_amount" in aggregates:
+        cols[1].metric("Total amount", f"{aggregates['total_amount']:,.2f}")
+    if "distributors" in aggregates:
+        cols[2].metric("Distributors", f"{aggregates['distributors']:,}")
+        with st.expander("Records per distributor"):
+            st.dataframe(aggregates["per_distributor"], hide_index=True)
+
+
+@st.fragment
+def render_results_grid(grid_id: str, records: list, cache_key: str | None = None):
+    """
+    Paginated, filterable view of a result list. The full frame stays on the server;
+    only the current page is sent to the browser. Filter changes rerun this fragment only.
+    """
+    df = cached_render_object(cache_key and f"{cache_key}:frame", lambda: prepare_results_frame(records))
+    aggregates = cached_render_object(cache_key and f"{cache_key}:aggregates", lambda: compute_aggregates(df))
+    _render_aggregates(aggregates)
+
+    with st.expander("Filter and sort", expanded=False):
+        col1, col2 = st.columns(2)
+        distributor = col1.text_input("Distributor ID or name", key=f"{grid_id}_distributor")
+        buyer = col2.text_input("Buyer ID", key=f"{grid_id}_buyer") if "Buyer ID" in df.columns else ""
+        date_range = None
+        if "Sale date" in df.columns and df["Sale date"].notna().any():
+            min_date, max_date = df["Sale date"].min().date(), df["Sale date"].max().date()
+            date_range = col1.date_input("Sale date", value=(min_date, max_date), key=f"{grid_id}_dates")
+        min_abs_delta = 0.0
+        if "Amount Delta" in df.columns:
+            min_abs_delta = col2.number_input("Min |amount delta|", min_value=0.0, value=0.0, key=f"{grid_id}_delta")
+        sort_by = col1.selectbox("Sort by", ["(none)"] + list(df.columns), key=f"{grid_id}_sort")
+        ascending = col2.radio("Order", ["Ascending", "Descending"], horizontal=True, key=f"{grid_id}_order") == "Ascending"
+
+    filters = (distributor, buyer, tuple(date_range or ()), min_abs_delta, sort_by, ascending)
+    # Only the latest filtered view is kept, so each filter change does not add another frame copy
+    view = cached_latest(
+        cache_key and f"{cache_key}:view", filters,
+        lambda: filter_results(df, distributor, buyer, date_range, min_abs_delta,
+                               None if sort_by == "(none)" else sort_by, ascending)
+    )
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, key=f"{grid_id}_page_size")
+    page_count = max(1, (len(view) + page_size - 1) // page_size)
+    page_key = f"{grid_id}_page"
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    page = col2.number_input("Page", min_value=1, max_value=page_count, key=page_key)
+    col3.caption(f"{len(view):,} of {len(df):,} records match · page {page} of {page_count}")
+
+    start = (page - 1) * page_size
+    st.dataframe(view.iloc[start:start + page_size], hide_index=True)
@@ -0,0 +1,189 @@
+# app/session_memory.py
+
+import os
+import sys
+import time
+import uuid
+import pickle
+import shutil
+import threading
+from pathlib import Path
+import streamlit as st
+from app.render_cache import evict_render_cache
+
+# Per-session budget for message payloads held in st.session_state
+SESSION_MEMORY_BUDGET_BYTES = int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", "50")) * 1024 * 1024)
+# Only payloads at least this large are worth spilling
+SPILL_MIN_BYTES = int(os.getenv("SPILL_MIN_BYTES", str(64 * 1024)))
+# Local disk cache for spilled payloads
+SPILL_DIR = Path(os.getenv("SESSION_SPILL_DIR", ".session_spill"))
+# Spill files and registry entries of sessions idle this long are removed
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL_SECONDS", str(24 * 3600)))
+# How often enforce_budget looks for idle sessions
+SWEEP_INTERVAL = 300
+# Shows the memory panel in the sidebar
+OPERATOR_PANEL = os.getenv("OPERATOR_PANEL", "").lower() in ("1", "true", "yes")
+
+SPILL_KEY = "$spilled"
+
+# Process-wide view of what every session holds, for operators
+_sessions = {}
+_sessions_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def estimate_size(obj, _seen=None) -> int:
+    """Approximate deep size in bytes of a message payload."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+
+def is_spilled(content) -> bool:
+    return isinstance(content, dict) and SPILL_KEY in content
+
+
+def _session_id() -> str:
+    if not st.session_state.get("memory_session_id"):
+        st.session_state.memory_session_id = uuid.uuid4().hex
+    return st.session_state.memory_session_id
+
+
+def _message_size(msg: dict) -> int:
+    """In-memory size of a message; computed once and kept on the message."""
+    if is_spilled(msg.get("content")):
+        return 0
+    if "size" not in msg:
+        msg["size"] = estimate_size(msg.get("content"))
+    return msg["size"]
+
+
+def _spill(copies: list, session_id: str):
+    """Writes a payload to the disk cache and leaves a placeholder in every message holding it."""
+    from app.conversation import _summarize_content
+    msg = copies[0]
+    content = msg["content"]
+    message_id = msg.get("id") or uuid.uuid4().hex
+    path = SPILL_DIR / session_id / f"{message_id}.pkl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    placeholder = {SPILL_KEY: str(path), "size": msg["size"], "summary": _summarize_content(content)}
+    for copy in copies:
+        copy["id"] = message_id
+        copy["content"] = placeholder
+        copy["size"] = msg["size"]
+    evict_render_cache(f"{message_id}:")
+
+
+def _held_messages(db_manager) -> list:
+    """
+    Groups every message dict this session holds by message, oldest chats first and the
+    open chat last. The in-memory store keeps its own dicts for the same payloads.
+    """
+    groups = {}
+    stored = db_manager.held_messages() if hasattr(db_manager, "held_messages") else []
+    session_messages = st.session_state.get("messages", [])
+    for msg in list(stored) + session_messages:
+        if isinstance(msg, dict):
+            key = msg.get("id") or id(msg)
+            groups.setdefault(key, []).append(msg)
+    # Dicts insert in first-seen order; move the open chat to the end
+    open_keys = [m.get("id") or id(m) for m in session_messages if isinstance(m, dict)]
+    for key in open_keys:
+        if key in groups:
+            groups[key] = groups.pop(key)
+    return list(groups.values())
+
+
+def resolve_content(msg: dict):
+    """Returns the message payload, reloading it from the disk cache if it was spilled."""
+    content = msg.get("content")
+    if not is_spilled(content):
+        return content
+    try:
+        with open(content[SPILL_KEY], "rb") as f:
+            return pickle.load(f)
+    except OSError as e:
+        print(f"Could not reload spilled message {msg.get('id')}: {e}")
+        return f"_This result is no longer available ({content.get('summary', 'spilled')})._"
+
+
+def _sweep_idle_sessions(now: float):
+    """
+    Forgets sessions idle longer than SESSION_IDLE_TTL and deletes their spill files,
+    including spill directories left by an earlier process. Runs at most every SWEEP_INTERVAL.
+    """
+    global _last_sweep
+    cutoff = now - SESSION_IDLE_TTL
+    with _sessions_lock:
+        if now - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+        idle = [s for s, info in _sessions.items() if info["updated"] < cutoff]
+        for session_id in idle:
+            del _sessions[session_id]
+        active = set(_sessions)
+    try:
+        leftovers = [path for path in SPILL_DIR.iterdir()
+                     if path.is_dir() and path.name not in active and path.stat().st_mtime < cutoff]
+    except OSError:
+        leftovers = []
+    for path in [SPILL_DIR / session_id for session_id in idle] + leftovers:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def enforce_budget(db_manager=None):
+    """
+    Spills the oldest large payloads this session holds until it fits its budget and
+    updates the operator view. The latest message always stays in memory.
+    """
+    groups = _held_messages(db_manager)
+    session_id = _session_id()
+    total = sum(_message_size(copies[0]) for copies in groups)
+
+    if total > SESSION_MEMORY_BUDGET_BYTES:
+        for copies in groups[:-1]:
+            if total <= SESSION_MEMORY_BUDGET_BYTES:
+                break
+            size = copies[0]["size"]
+            if size >= SPILL_MIN_BYTES and not is_spilled(copies[0].get("content")):
+                try:
+                    _spill(copies, session_id)
+                except OSError as e:
+                    print(f"Session memory spill failed: {e}")
+                    break
+                total -= size
+
+    spilled = [copies[0]["content"] for copies in groups if is_spilled(copies[0].get("content"))]
+    with _sessions_lock:
+        _sessions[session_id] = {
+            "bytes": total,
+            "messages": len(groups),
+            "spilled_messages": len(spilled),
+            "spilled_bytes": sum(content.get("size", 0) for content in spilled),
+            "updated": time.time()
+        }
+    _sweep_idle_sessions(time.time())
+    return total
+
+
+def memory_report() -> dict:
+    """Per-session and total memory figures for the operator panel (idle sessions are swept by enforce_budget)."""
+    with _sessions_lock:
+        sessions = {s: dict(info) for s, info in _sessions.items()}
+    return {
+        "budget_bytes": SESSION_MEMORY_BUDGET_BYTES,
+        "sessions": sessions,
+        "total_bytes": sum(info["bytes"] for info in sessions.values()),
+        "total_spilled_bytes": sum(info["spilled_bytes"] for info in sessions.values())
+    }
@@ -2,11 +2,13 @@
 
 import streamlit as st
 from agent_logic import get_planned_action
-import pandas as pd
-
-def get_db_manager():
-    from main import db_manager
-    return db_manager
+import sys
+import uuid
+from app.conversation import get_conversation_state, update_conversation_state, record_planned_action
+from app.resources import get_db_manager
+from app.voice import transcribe_audio
+from app.session_memory import enforce_budget
+import telemetry
 
 # --- Session State Initialization ---
 def initialize_session_state():
@@ -15,6 +17,10 @@ def initialize_session_state():
         "authenticated": False,
         "messages": [],
         "pending_action": None,
+        "conversation_state": None,
+        "active_jobs": [],
+        "transcription_job": None,
+        "voice_error": None,
         "prompt_input": "",
         "db_status": None  # <-- New key for database status message
     }
@@ -23,27 +29,34 @@ def initialize_session_state():
             st.session_state[key] = value
 
 # --- Helper & Callback Functions ---
-def add_message(role: str, content: str | pd.DataFrame):
+@telemetry.instrument("turn", "add_message")
+def add_message(role: str, content):
     """Adds a message to the chat history and saves it to the database."""
     try:
         # Convert content to savable format
         savable_content = content
-        if isinstance(content, pd.DataFrame):
+        # pandas is only loaded once a tool needed it; no DataFrame can exist before that
+        pd = sys.modules.get("pandas")
+        if pd is not None and isinstance(content, pd.DataFrame):
             savable_content = content.to_dict('records')
         
         # Add to session state
-        st.session_state.messages.append({"role": role, "content": savable_content})
+        message_id = uuid.uuid4().hex
+        st.session_state.messages.append({"id": message_id, "role": role, "content": savable_content})
+        update_conversation_state(get_conversation_state(), role, savable_content)
         
         # Save to database if available
         chat_id = st.session_state.get("chat_id")
         print("chat_id", chat_id)
         if chat_id is not None:
             try:
-                st.session_state.chat_id = get_db_manager().save_message(chat_id, role, savable_content)
+                st.session_state.chat_id = get_db_manager().save_message(chat_id, role, savable_content, message_id=message_id)
             except Exception as db_error:
                 print(f"Database save error: {str(db_error)}")
                 # Continue even if database save fails
                 pass
+        # Spill older large payloads once the session is over its memory budget
+        enforce_budget(get_db_manager())
     except Exception as e:
         print(f"Error in add_message: {str(e)}")
         # Ensure the message is at least added to the session state
@@ -69,6 +82,7 @@ def handle_user_input(user_input: str):
             "action": planned_action["action"],
             "args": planned_action["args"]
         }
+        record_planned_action(get_conversation_state(), planned_action["action"], planned_action["args"])
         add_message("assistant", f"{planned_action['message']}. Would you like me to proceed?")
     else:
         add_message("assistant", planned_action["message"])
@@ -0,0 +1,178 @@
+# app/voice.py
+
+import io
+import os
+import time
+import wave
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+# Whisper works at 16 kHz mono; anything above that is wasted upload
+TARGET_SAMPLE_RATE = 16000
+# Transcripts kept in memory, keyed by audio hash (shared by all sessions)
+TRANSCRIPT_CACHE_MAX_ENTRIES = 256
+# Number of recent transcriptions kept for the metrics view
+METRICS_HISTORY = 50
+
+_transcript_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_metrics = deque(maxlen=METRICS_HISTORY)
+
+
+# --- Audio preparation ---
+
+def _audio_file_name(audio_bytes: bytes) -> str:
+    """File name whose extension matches the container, from its magic bytes."""
+    if audio_bytes[:4] == b"\x1aE\xdf\xa3":  # EBML (WebM / Matroska)
+        return "audio.webm"
+    if audio_bytes[:4] == b"OggS":
+        return "audio.ogg"
+    return "audio.wav"
+
+
+def prepare_audio(audio_bytes: bytes) -> tuple:
+    """
+    Downmixes to mono, resamples to 16 kHz and compresses a WAV recording before upload.
+    Returns (payload_bytes, file_name). Input that is not parseable WAV is passed through
+    unchanged, named after its container.
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return audio_bytes, _audio_file_name(audio_bytes)
+
+    if sample_width != 2 and sample_width != 4:
+        return audio_bytes, "audio.wav"
+
+    import numpy as np
+    dtype = np.int16 if sample_width == 2 else np.int32
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if sample_width == 4:
+        samples /= 65536.0  # scale 32-bit PCM down to the 16-bit range
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    if sample_rate != TARGET_SAMPLE_RATE and len(samples):
+        target_len = int(round(len(samples) * TARGET_SAMPLE_RATE / sample_rate))
+        if sample_rate > TARGET_SAMPLE_RATE:
+            # Box filter over the decimation factor to limit aliasing before interpolation
+            factor = sample_rate / TARGET_SAMPLE_RATE
+            width = max(1, int(factor))
+            if width > 1:
+                samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode="same")
+        positions = np.linspace(0, len(samples) - 1, num=target_len, dtype=np.float64)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+    pcm = np.clip(samples, -32768, 32767).astype(np.int16)
+    return _encode(pcm)
+
+
+def _encode(pcm) -> tuple:
+    """FLAC when the optional soundfile package is installed, 16-bit PCM WAV otherwise."""
+    try:
+        import soundfile
+        out = io.BytesIO()
+        soundfile.write(out, pcm, TARGET_SAMPLE_RATE, format="FLAC")
+        return out.getvalue(), "audio.flac"
+    except ImportError:
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(TARGET_SAMPLE_RATE)
+            wav.writeframes(pcm.tobytes())
+        return out.getvalue(), "audio.wav"
+
+
+# --- Transcription backends ---
+
+class OpenAITranscriber:
+    """Transcribes with OpenAI Whisper."""
+    def __init__(self, client=None, model: str = "whisper-1"):
+        self.client = client
+        self.model = model
+
+    def transcribe(self, payload: bytes, file_name: str) -> str:
+        if self.client is None:
+            from app.resources import get_openai_client
+            self.client = get_openai_client()
+        transcript = self.client.audio.transcriptions.create(model=self.model, file=(file_name, payload))
+        return transcript.text
+
+
+class StaticTranscriber:
+    """Local stand-in: returns canned text (optionally per audio hash) after a fixed delay."""
+    def __init__(self, text: str = "", by_hash: dict | None = None, latency_ms: float = 0.0):
+        self.text = text
+        self.by_hash = by_hash or {}
+        self.latency_ms = latency_ms
+
+    def transcribe(self, payload: bytes, file_name: str) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return self.by_hash.get(hashlib.sha256(payload).hexdigest(), self.text)
+
+
+_transcriber = None
+
+
+def get_transcriber():
+    """Backend selected by TRANSCRIBE_BACKEND ("openai" or "static")."""
+    global _transcriber
+    if _transcriber is None:
+        if os.getenv("TRANSCRIBE_BACKEND", "openai").lower() == "static":
+            _transcriber = StaticTranscriber(os.getenv("TRANSCRIBE_STATIC_TEXT", ""))
+        else:
+            _transcriber = OpenAITranscriber()
+    return _transcriber
+
+
+def set_transcriber(transcriber):
+    """Swaps the transcription backend (e.g. for a StaticTranscriber in tests)."""
+    global _transcriber
+    _transcriber = transcriber
+
+
+# --- Pipeline ---
+
+def audio_hash(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def transcribe_audio(audio_bytes: bytes) -> str:
+    """Prepares, uploads and transcribes a recording, serving repeats from the transcript cache."""
+    key = audio_hash(audio_bytes)
+    with _cache_lock:
+        if key in _transcript_cache:
+            _transcript_cache.move_to_end(key)
+            _metrics.append({"raw_bytes": len(audio_bytes), "upload_bytes": 0, "latency_ms": 0.0, "cached": True})
+            return _transcript_cache[key]
+
+    prepare_start = time.perf_counter()
+    payload, file_name = prepare_audio(audio_bytes)
+    prepare_ms = (time.perf_counter() - prepare_start) * 1000
+    start = time.perf_counter()
+    text = get_transcriber().transcribe(payload, file_name)
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    metrics = {"raw_bytes": len(audio_bytes), "upload_bytes": len(payload), "prepare_ms": prepare_ms,
+               "latency_ms": latency_ms, "cached": False}
+    _metrics.append(metrics)
+    print(f"Transcribed {file_name}: {len(audio_bytes)} -> {len(payload)} bytes uploaded, "
+          f"prepare {prepare_ms:.0f} ms, transcription {latency_ms:.0f} ms")
+
+    with _cache_lock:
+        _transcript_cache[key] = text
+        while len(_transcript_cache) > TRANSCRIPT_CACHE_MAX_ENTRIES:
+            _transcript_cache.popitem(last=False)
+    return text
+
+
+def voice_metrics() -> list:
+    """Upload size and latency of the most recent transcriptions."""
+    return list(_metrics)
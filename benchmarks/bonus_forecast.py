@@ -0,0 +1,106 @@
+# benchmarks/bonus_forecast.py
+"""
+Benchmark of the 6A forecast engine's downline roll-up on a synthetic sponsor tree.
+
+Builds a tree of N distributors, each sponsored by a random earlier one (or by one of
+the last --chain-window, which makes long chains). Times the array-backed tree build,
+the full vectorized roll-up and the update for newly arrived sales against a per-node
+Python roll-up, and checks that they agree.
+
+Usage (from the repository root):
+    python -m benchmarks.bonus_forecast --distributors 300000 --new-sales 2000
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+
+from tools.bonus_forecast import DownlineTree
+
+
+def synthetic_tree(n: int, seed: int = 0, chain_window: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1_000_000, 1_000_000 + n, dtype=np.int64)
+    # The first distributor is the root
+    if chain_window:
+        sponsor_pos = np.arange(n) - rng.integers(1, chain_window + 1, size=n)
+    else:
+        sponsor_pos = (rng.random(n) * np.arange(n)).astype(np.int64) - (np.arange(n) == 0)
+    sponsors = np.where(sponsor_pos >= 0, ids[np.maximum(sponsor_pos, 0)], -1)
+    personal = np.where(rng.random(n) < 0.3, rng.integers(100, 5000, size=n), 0).astype(np.float64)
+    return ids, sponsors, personal
+
+
+def python_rollup(parent: np.ndarray, personal: np.ndarray) -> np.ndarray:
+    """Per-node baseline: children lists and an explicit post-order walk."""
+    n = len(parent)
+    children = [[] for _ in range(n)]
+    for node, p in enumerate(parent.tolist()):
+        if p >= 0:
+            children[p].append(node)
+    group = personal.tolist()
+    for root in np.flatnonzero(parent < 0).tolist():
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                group[node] += sum(group[c] for c in children[node])
+            else:
+                stack.append((node, True))
+                stack.extend((c, False) for c in children[node])
+    return np.array(group)
+
+
+def run_benchmark(n: int, new_sales: int, seed: int = 0, chain_window: int = 0) -> dict:
+    ids, sponsors, personal = synthetic_tree(n, seed, chain_window)
+    report = {"distributors": n}
+
+    t = time.perf_counter()
+    tree = DownlineTree(ids, sponsors)
+    report["tree_build_ms"] = (time.perf_counter() - t) * 1000
+    report["max_depth"] = int(tree.depth.max())
+
+    order = np.argsort(ids)
+    personal = personal[order]
+    t = time.perf_counter()
+    group = tree.rollup(personal)
+    report["vectorized_rollup_ms"] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    expected = python_rollup(tree.parent, personal)
+    report["python_rollup_ms"] = (time.perf_counter() - t) * 1000
+    report["rollups_match"] = bool(np.allclose(group, expected))
+
+    rng = np.random.default_rng(seed + 1)
+    nodes = rng.integers(0, n, size=new_sales)
+    amounts = rng.integers(100, 5000, size=new_sales).astype(np.float64)
+    t = time.perf_counter()
+    if tree.prefers_incremental(new_sales):
+        tree.add_to_ancestors(group, nodes, amounts)
+        report["update_mode"] = "incremental"
+    else:
+        np.add.at(personal, nodes, amounts)
+        group = tree.rollup(personal)
+        np.add.at(personal, nodes, -amounts)
+        report["update_mode"] = "full roll-up"
+    report["update_ms"] = (time.perf_counter() - t) * 1000
+    np.add.at(personal, nodes, amounts)
+    report["update_matches_full"] = bool(np.allclose(group, tree.rollup(personal)))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="6A forecast roll-up benchmark")
+    parser.add_argument("--distributors", type=int, default=300000)
+    parser.add_argument("--new-sales", type=int, default=2000, help="Sales folded in incrementally")
+    parser.add_argument("--chain-window", type=int, default=0, help="Sponsor among the last N distributors (deep tree)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for key, value in run_benchmark(args.distributors, args.new_sales, args.seed, args.chain_window).items():
+        print(f"{key:<26} {value:.1f}" if isinstance(value, float) else f"{key:<26} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
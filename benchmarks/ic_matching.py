@@ -0,0 +1,122 @@
+# benchmarks/ic_matching.py
+"""
+Throughput benchmark of the intercompany payment matcher on synthetic month-end data.
+
+Generates debit notes for a set of counterparties and currencies, then payment
+instructions that settle them exactly, with FX rounding differences, quoting the note
+number, as one payment for several notes, as several payments for one note and as
+partial payments, plus unrelated noise on both sides. Times the matcher and, for small
+inputs, a pairwise baseline that compares every payment with every note.
+
+Usage (from the repository root):
+    python -m benchmarks.ic_matching --notes 50000 --counterparties 40
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from tools.ic_matching import match_intercompany_payments, TOLERANCE_ABS, TOLERANCE_PCT
+
+CURRENCIES = ["USD", "EUR", "JPY", "KRW", "TWD"]
+
+
+def synthetic_data(n_notes: int, counterparties: int, seed: int = 0) -> tuple:
+    rng = random.Random(seed)
+    notes, payments = [], []
+    for i in range(n_notes):
+        notes.append({"note_id": f"DN-{i:07d}", "counterparty": f"IC{rng.randrange(counterparties):03d}",
+                      "currency": rng.choice(CURRENCIES), "amount": round(rng.uniform(50, 250000), 2)})
+    i = 0
+    while i < len(notes):
+        note = notes[i]
+        kind = rng.random()
+        payment = {"payment_id": f"PI-{len(payments):07d}", "counterparty": note["counterparty"],
+                   "currency": note["currency"]}
+        if kind < 0.45:
+            payments.append({**payment, "amount": note["amount"]})
+        elif kind < 0.65:
+            payments.append({**payment, "amount": round(note["amount"] + rng.uniform(-0.9, 0.9), 2)})
+        elif kind < 0.75:
+            payments.append({**payment, "amount": note["amount"], "reference": note["note_id"]})
+        elif kind < 0.83 and i + 2 < len(notes):
+            # one payment for a few notes of the same counterparty and currency
+            group = [note]
+            for j in range(i + 1, min(i + 40, len(notes))):
+                if len(group) == 3:
+                    break
+                if (notes[j]["counterparty"], notes[j]["currency"]) == (note["counterparty"], note["currency"]) \
+                        and not notes[j].get("_used"):
+                    group.append(notes[j])
+            for g in group:
+                g["_used"] = True
+            payments.append({**payment, "amount": round(sum(g["amount"] for g in group), 2)})
+        elif kind < 0.90:
+            first = round(note["amount"] * rng.uniform(0.3, 0.7), 2)
+            payments.append({**payment, "amount": first})
+            payments.append({**payment, "payment_id": f"PI-{len(payments):07d}", "amount": round(note["amount"] - first, 2)})
+        elif kind < 0.95:
+            payments.append({**payment, "amount": round(note["amount"] * 0.5, 2), "reference": note["note_id"]})
+        i += 1
+        while i < len(notes) and notes[i].get("_used"):
+            i += 1
+    for note in notes:
+        note.pop("_used", None)
+    for _ in range(n_notes // 50):
+        payments.append({"payment_id": f"PI-{len(payments):07d}", "counterparty": f"IC{rng.randrange(counterparties):03d}",
+                         "currency": rng.choice(CURRENCIES), "amount": round(rng.uniform(50, 250000), 2)})
+    rng.shuffle(payments)
+    return payments, notes
+
+
+def pairwise_baseline(payments: list, notes: list) -> int:
+    """One-to-one matching by comparing every payment with every open note."""
+    used = [False] * len(notes)
+    matched = 0
+    for p in payments:
+        tolerance = max(TOLERANCE_ABS, abs(p["amount"]) * TOLERANCE_PCT)
+        for j, n in enumerate(notes):
+            if not used[j] and n["counterparty"] == p["counterparty"] and n["currency"] == p["currency"] \
+                    and abs(n["amount"] - p["amount"]) <= tolerance:
+                used[j] = True
+                matched += 1
+                break
+    return matched
+
+
+def run_benchmark(n_notes: int, counterparties: int, seed: int = 0, baseline_limit: int = 5000) -> dict:
+    payments, notes = synthetic_data(n_notes, counterparties, seed)
+    report = {"debit_notes": len(notes), "payment_instructions": len(payments)}
+
+    t = time.perf_counter()
+    result = match_intercompany_payments(payments, notes)
+    elapsed = time.perf_counter() - t
+    report["matcher_ms"] = elapsed * 1000
+    report["items_per_second"] = (len(payments) + len(notes)) / elapsed
+    for kind, count in sorted(result["match_counts"].items()):
+        report[f"matched_{kind}"] = count
+    report["unmatched_payments"] = len(result["unmatched_payments"])
+    report["unmatched_notes"] = len(result["unmatched_notes"])
+
+    if len(notes) <= baseline_limit:
+        t = time.perf_counter()
+        report["pairwise_one_to_one"] = pairwise_baseline(payments, notes)
+        report["pairwise_ms"] = (time.perf_counter() - t) * 1000
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Intercompany payment matching benchmark")
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--counterparties", type=int, default=40)
+    parser.add_argument("--baseline-limit", type=int, default=5000, help="Run the pairwise baseline up to this many notes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for key, value in run_benchmark(args.notes, args.counterparties, args.seed, args.baseline_limit).items():
+        print(f"{key:<24} {value:.1f}" if isinstance(value, float) else f"{key:<24} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
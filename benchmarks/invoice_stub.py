@@ -0,0 +1,151 @@
+# benchmarks/invoice_stub.py
+"""
+Local HTTP stand-in for the external invoice system, and a benchmark of
+tools/invoices.InvoiceClient against it.
+
+The stub answers GET /invoices?date=YYYY-MM-DD with {"invoices": [...]} that are
+deterministic per date, after a configurable latency, and fails a share of requests
+with HTTP 503 so the retry policy is exercised.
+
+Usage (from the repository root):
+    python -m benchmarks.invoice_stub --serve --port 8766   # then INVOICE_API_URL=http://127.0.0.1:8766
+    python -m benchmarks.invoice_stub --days 31 --latency-ms 120 --fail-rate 0.05
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class InvoiceStub:
+    def __init__(self, latency_ms: float = 50.0, fail_rate: float = 0.0, invoices_per_day: int = 40, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.invoices_per_day = invoices_per_day
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def invoices(self, day: str) -> list:
+        rng = random.Random(day)
+        return [{"Invoice ID": f"INV-{day.replace('-', '')}-{i:04d}",
+                 "Amount": round(rng.uniform(100, 5000), 2),
+                 "Status": rng.choice(["Paid", "Unpaid", "Overdue"])} for i in range(self.invoices_per_day)]
+
+    def handle(self, day: str) -> tuple:
+        with self.lock:
+            self.requests += 1
+            fail = self.rng.random() < self.fail_rate
+        time.sleep(self.latency_ms / 1000.0)
+        if fail:
+            return 503, {"error": "invoice system busy"}
+        return 200, {"invoices": self.invoices(day)}
+
+
+def make_server(stub: InvoiceStub, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            day = parse_qs(url.query).get("date", [""])[0]
+            if url.path != "/invoices" or not day:
+                status, body = 404, {"error": "not found"}
+            else:
+                status, body = stub.handle(day)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub(stub: InvoiceStub, port: int = 0) -> tuple:
+    """Serves the stub on a background thread; returns (server, base_url)."""
+    server = make_server(stub, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _serial_baseline(base_url: str, days: list) -> int:
+    """The old access pattern: one fresh connection per date, one date after the other."""
+    fetched = 0
+    for day in days:
+        try:
+            with urllib.request.urlopen(f"{base_url}/invoices?date={day.isoformat()}", timeout=15) as response:
+                fetched += len(json.loads(response.read())["invoices"])
+        except OSError:
+            pass
+    return fetched
+
+
+def run_benchmark(days: int, latency_ms: float, fail_rate: float, parallel: int) -> dict:
+    from tools.invoices import InvoiceClient
+    stub = InvoiceStub(latency_ms=latency_ms, fail_rate=fail_rate)
+    server, base_url = start_stub(stub)
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    dates = [start + timedelta(days=i) for i in range(days)]
+    report = {"days": days}
+    try:
+        t = time.perf_counter()
+        _serial_baseline(base_url, dates)
+        report["serial_ms"] = (time.perf_counter() - t) * 1000
+
+        client = InvoiceClient(base_url, max_parallel=parallel)
+        for run in ("cold", "warm"):
+            t = time.perf_counter()
+            results = client.fetch_range(start, end)
+            report[f"client_{run}_ms"] = (time.perf_counter() - t) * 1000
+            report[f"client_{run}_failed_dates"] = sum(1 for r in results.values() if isinstance(r, Exception))
+        report["client_requests"] = client.stats["requests"]
+        report["client_cache_hits"] = client.stats["cache_hits"]
+        report["stub_requests"] = stub.requests
+    finally:
+        server.shutdown()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invoice API stand-in and client benchmark")
+    parser.add_argument("--serve", action="store_true", help="Only run the stub server")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        server = make_server(InvoiceStub(latency_ms=args.latency_ms, fail_rate=args.fail_rate), port=args.port)
+        print(f"Invoice stand-in listening on http://127.0.0.1:{args.port}")
+        server.serve_forever()
+        return 0
+
+    report = run_benchmark(args.days, args.latency_ms, args.fail_rate, args.parallel)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:<28} {value:.1f}" if isinstance(value, float) else f"{key:<28} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
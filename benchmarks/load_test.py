@@ -0,0 +1,309 @@
+# benchmarks/load_test.py
+"""
+Multi-session load test for the Streamlit app.
+
+Drives N simulated sessions through main.py headlessly with Streamlit's app-testing
+API (streamlit.testing.v1.AppTest), the replay LLM and either the in-memory store or
+an in-process Mongo stand-in (mongomock, optional). Each session runs a mix of turns
+(plan + confirm, plan + cancel, small talk, reopening an earlier chat) and the run
+reports throughput, per-turn latency percentiles and memory per session. It also
+checks for state leaking across sessions through shared resources.
+
+AppTest patches process-wide runtime state while a script runs, so the sessions are
+interleaved turn by turn on one driver thread; confirmed actions still run
+concurrently on the app's job worker pool, as they do in production.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --sessions 40 --turns 10
+    python -m benchmarks.load_test --store mongomock --latency-ms 400 --jitter-ms 100
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import contextlib
+from pathlib import Path
+
+from benchmarks.turn_latency import percentile, load_corpus, DEFAULT_CORPUS
+
+APP_PATH = Path(__file__).resolve().parent.parent / "main.py"
+# Turn kinds and their share of a session's turns
+DEFAULT_MIX = {"confirm": 0.5, "cancel": 0.1, "small_talk": 0.25, "reopen": 0.15}
+# Max time a confirmed action may run before the turn counts as failed
+JOB_TIMEOUT_SECONDS = 30
+JOB_POLL_SECONDS = 0.02
+
+
+def _configure(store: str, corpus: list, latency_ms: float, jitter_ms: float):
+    """Points the app at the local stand-ins before any session starts."""
+    os.environ["LLM_BACKEND"] = "replay"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ.setdefault("TRANSCRIBE_BACKEND", "static")
+    if store == "mongomock":
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("--store mongomock needs the mongomock package (pip install mongomock)")
+        import database
+        database.MongoClient = mongomock.MongoClient
+        os.environ["MONGO_URI"] = "mongodb://load-test"
+    else:
+        os.environ.pop("MONGO_URI", None)
+
+    import streamlit as st
+    import agent_logic
+    from llm_backends import ReplayLLM
+    st.cache_resource.clear()
+    recordings = {entry["input"]: entry["completion"] for entry in corpus if "completion" in entry}
+    agent_logic.set_llm(ReplayLLM(recordings, latency_ms=latency_ms, jitter_ms=jitter_ms))
+
+
+class SimulatedSession:
+    """One browser session driven through AppTest."""
+    def __init__(self, index: int, corpus: list, mix: dict, seed: int):
+        from streamlit.testing.v1 import AppTest
+        self.index = index
+        self.rng = random.Random(seed + index)
+        self.actions = [e for e in corpus if e.get("expected_action")]
+        self.small_talk = [e for e in corpus if not e.get("expected_action")]
+        self.kinds, self.weights = zip(*mix.items())
+        self.app = AppTest.from_file(str(APP_PATH), default_timeout=JOB_TIMEOUT_SECONDS)
+        self.turns = []       # {"kind", "seconds", "ok"}
+        self.own_chats = set()
+        self.observations = []  # (chat_id, message ids) after each turn
+        self.sidebar_chats = set()
+
+    # --- helpers ---
+    def _button(self, label_prefix: str = None, key_prefix: str = None):
+        for button in list(self.app.button) + list(self.app.sidebar.button):
+            if label_prefix and str(button.label).startswith(label_prefix):
+                return button
+            if key_prefix and button.key and button.key.startswith(key_prefix):
+                return button
+        return None
+
+    def _say(self, text: str):
+        self.app.text_input(key="prompt_input").set_value(text).run()
+
+    def _wait_for_jobs(self) -> bool:
+        deadline = time.perf_counter() + JOB_TIMEOUT_SECONDS
+        while self.app.session_state["active_jobs"]:
+            if time.perf_counter() > deadline:
+                return False
+            time.sleep(JOB_POLL_SECONDS)
+            self.app.run()
+        return True
+
+    # --- turns ---
+    def start(self):
+        self.app.run()
+        # Start a persisted chat so reopening has something to load
+        self.app.session_state["chat_id"] = ""
+
+    def _turn_confirm(self) -> bool:
+        self._say(self.rng.choice(self.actions)["input"])
+        button = self._button(label_prefix="✅")
+        if button is None:
+            return False
+        button.click().run()
+        return self._wait_for_jobs()
+
+    def _turn_cancel(self) -> bool:
+        self._say(self.rng.choice(self.actions)["input"])
+        button = self._button(label_prefix="❌")
+        if button is None:
+            return False
+        button.click().run()
+        return True
+
+    def _turn_small_talk(self) -> bool:
+        self._say(self.rng.choice(self.small_talk)["input"])
+        return True
+
+    def _turn_reopen(self) -> bool:
+        buttons = [b for b in self.app.sidebar.button if b.key and b.key.startswith("load_")]
+        if not buttons:
+            return self._turn_small_talk()
+        self.rng.choice(buttons).click().run()
+        return True
+
+    def run_turn(self):
+        kind = self.rng.choices(self.kinds, weights=self.weights)[0]
+        start = time.perf_counter()
+        try:
+            ok = getattr(self, f"_turn_{kind}")() and not self.app.exception
+        except Exception as e:
+            print(f"session {self.index}: {kind} turn failed: {e}", file=sys.stderr)
+            ok = False
+        self.turns.append({"kind": kind, "seconds": time.perf_counter() - start, "ok": ok})
+        self._observe()
+
+    def _observe(self):
+        state = self.app.session_state
+        chat_id = state["chat_id"] if "chat_id" in state else None
+        if chat_id:
+            self.own_chats.add(chat_id)
+        messages = state["messages"] if "messages" in state else []
+        self.observations.append((chat_id, {m.get("id") for m in messages if isinstance(m, dict) and m.get("id")}))
+        self.sidebar_chats |= {b.key[len("load_"):] for b in self.app.sidebar.button
+                               if b.key and b.key.startswith("load_")}
+
+    # --- memory ---
+    def memory(self) -> dict:
+        from app.session_memory import estimate_size, memory_report
+        state = self.app.session_state
+        held = {key: value for key, value in state.items()}
+        session_id = held.get("memory_session_id")
+        return {
+            "session_state_bytes": estimate_size(held),
+            "message_bytes": memory_report()["sessions"].get(session_id, {}).get("bytes", 0)
+        }
+
+
+def find_leaks(sessions: list, store: str) -> list:
+    """State visible in more than one session that was not meant to be shared."""
+    leaks = []
+
+    for session in sessions:
+        state = session.app.session_state
+        if "db_status" not in state or not state["db_status"]:
+            leaks.append(f"session {session.index}: no db_status (resource status written to another session)")
+
+    # The same mutable object held by two sessions means a shared resource handed it out
+    owners = {}
+    for session in sessions:
+        for key, value in session.app.session_state.items():
+            if isinstance(value, (list, dict, set)) and value:
+                other = owners.setdefault(id(value), (session.index, key, value))
+                if other[0] != session.index:
+                    leaks.append(f"sessions {other[0]} and {session.index} share the same object "
+                                 f"({other[1]!r} / {key!r})")
+
+    # A message may only show up in two sessions when both have the same chat open
+    seen = {}
+    for session in sessions:
+        for chat_id, message_ids in session.observations:
+            for message_id in message_ids:
+                other = seen.setdefault(message_id, (session.index, chat_id))
+                if other[0] != session.index and other[1] != chat_id:
+                    leaks.append(f"message {message_id} seen in session {other[0]} (chat {other[1]}) "
+                                 f"and session {session.index} (chat {chat_id})")
+
+    if store == "memory":
+        # The in-memory store is private to a session, so its sidebar only lists its own chats
+        for session in sessions:
+            foreign = session.sidebar_chats - session.own_chats
+            if foreign:
+                leaks.append(f"session {session.index} lists {len(foreign)} chats it did not create")
+    return sorted(set(leaks))
+
+
+def _rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def run_load_test(corpus: list, sessions: int = 10, turns: int = 10, store: str = "memory",
+                  latency_ms: float = 0.0, jitter_ms: float = 0.0, mix: dict | None = None,
+                  seed: int = 0) -> dict:
+    """Runs the simulated sessions and returns the aggregated report."""
+    _configure(store, corpus, latency_ms, jitter_ms)
+    mix = mix or DEFAULT_MIX
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # A warm-up session pays for the imports and shared resources, which are not per-session
+        SimulatedSession(-1, corpus, mix, seed).start()
+        rss_before = _rss_mb()
+        simulated = [SimulatedSession(i, corpus, mix, seed) for i in range(sessions)]
+        for session in simulated:
+            session.start()
+
+        start = time.perf_counter()
+        for _ in range(turns):
+            for session in simulated:
+                session.run_turn()
+        elapsed = time.perf_counter() - start
+
+    all_turns = [turn for session in simulated for turn in session.turns]
+    latencies = [turn["seconds"] for turn in all_turns]
+    by_kind = {}
+    for turn in all_turns:
+        by_kind.setdefault(turn["kind"], []).append(turn["seconds"])
+    memory = [session.memory() for session in simulated]
+    return {
+        "store": store,
+        "sessions": sessions,
+        "turns": len(all_turns),
+        "failed_turns": sum(1 for turn in all_turns if not turn["ok"]),
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(all_turns) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "p95_ms_by_kind": {kind: percentile(values, 95) * 1000 for kind, values in sorted(by_kind.items())},
+        "session_state_kb_mean": sum(m["session_state_bytes"] for m in memory) / len(memory) / 1024 if memory else 0.0,
+        "session_state_kb_max": max((m["session_state_bytes"] for m in memory), default=0) / 1024,
+        "message_kb_mean": sum(m["message_bytes"] for m in memory) / len(memory) / 1024 if memory else 0.0,
+        "rss_growth_mb_per_session": max(0.0, _rss_mb() - rss_before) / sessions if sessions else 0.0,
+        "leaks": find_leaks(simulated, store)
+    }
+
+
+def print_report(report: dict):
+    print(f"Store:               {report['store']}")
+    print(f"Sessions:            {report['sessions']}")
+    print(f"Turns:               {report['turns']} ({report['failed_turns']} failed)")
+    print(f"Throughput:          {report['throughput_turns_per_s']:.1f} turns/s")
+    print(f"Turn latency p50:    {report['p50_ms']:.1f} ms")
+    print(f"Turn latency p95:    {report['p95_ms']:.1f} ms")
+    print(f"Turn latency p99:    {report['p99_ms']:.1f} ms")
+    for kind, p95 in report["p95_ms_by_kind"].items():
+        print(f"  p95 {kind:<14} {p95:.1f} ms")
+    print(f"Session state:       {report['session_state_kb_mean']:.0f} KB mean, {report['session_state_kb_max']:.0f} KB max")
+    print(f"Message payloads:    {report['message_kb_mean']:.0f} KB mean per session")
+    print(f"RSS growth:          {report['rss_growth_mb_per_session']:.2f} MB per session")
+    if report["leaks"]:
+        print(f"Cross-session leaks: {len(report['leaks'])}")
+        for leak in report["leaks"]:
+            print(f"  LEAK {leak}")
+    else:
+        print("Cross-session leaks: none found")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session load test for the Streamlit app")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="JSON corpus of phrasings")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=10, help="Turns per session")
+    parser.add_argument("--store", default="memory", choices=["memory", "mongomock"])
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected model latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Model latency jitter")
+    parser.add_argument("--mix", help='Turn mix as JSON, e.g. \'{"confirm": 0.7, "small_talk": 0.3}\'')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(load_corpus(args.corpus), sessions=args.sessions, turns=args.turns,
+                           store=args.store, latency_ms=args.latency_ms,
+                           jitter_ms=args.jitter_ms, mix=json.loads(args.mix) if args.mix else None,
+                           seed=args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["leaks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
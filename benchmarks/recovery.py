@@ -0,0 +1,113 @@
+# benchmarks/recovery.py
+"""
+Benchmark of the cancelled-order recovery check on a synthetic month.
+
+Generates a month of cancellations and the recoveries booked for most of them (some
+on later days, some never) in an in-memory stand-in for the two collections that
+answers the per-day grouping without server time, then times the first check of the
+month (every day fetched), a repeated check (closed days served from the cached
+arrays) and the sorted-set difference alone.
+
+Usage (from the repository root):
+    python -m benchmarks.recovery --per-day 20000 --days 30
+"""
+
+import sys
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from tools import recovery
+
+
+class _Collection:
+    """
+    Just enough of a pymongo collection for the per-day grouping the checker sends. The
+    groups are built up front, as the server would, so the times are the client side.
+    """
+    def __init__(self, docs: list, date_field: str, amount_field: str = None):
+        self.groups = {}
+        for doc in docs:
+            ids, amounts = self.groups.setdefault(doc[date_field].date(), ([], []))
+            ids.append(doc[recovery.ORDER_ID_FIELD])
+            amounts.append(doc.get(amount_field, 0))
+        self.date_field = date_field
+
+    def create_index(self, keys):
+        pass
+
+    def aggregate(self, pipeline: list, allowDiskUse: bool = False):
+        window = pipeline[0]["$match"][self.date_field]
+        with_amounts = "amounts" in pipeline[1]["$group"]
+        for day, (ids, amounts) in self.groups.items():
+            if window["$gte"].date() <= day < window["$lt"].date():
+                row = {"_id": day.isoformat(), "ids": list(ids)}
+                if with_amounts:
+                    row["amounts"] = list(amounts)
+                yield row
+
+
+def synthetic_db(per_day: int, days: int, today: date, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    cancelled, recovered = [], []
+    first_day = today - timedelta(days=days - 1)
+    order_id = 10_000_000
+    for d in range(days):
+        day = datetime.combine(first_day + timedelta(days=d), datetime.min.time())
+        for _ in range(per_day):
+            order_id += rng.randrange(1, 5)
+            stamp = day + timedelta(seconds=rng.randrange(86400))
+            cancelled.append({recovery.ORDER_ID_FIELD: order_id, recovery.CANCEL_DATE_FIELD: stamp,
+                              recovery.AMOUNT_FIELD: round(rng.uniform(1, 500), 2)})
+            if rng.random() < 0.97:
+                booked = min(stamp + timedelta(days=rng.choice([0, 0, 0, 1, 2])),
+                             datetime.combine(today, datetime.min.time()) + timedelta(hours=23))
+                recovered.append({recovery.ORDER_ID_FIELD: order_id, recovery.RECOVERY_DATE_FIELD: booked})
+    return {
+        recovery.CANCELLED_ORDERS_COLLECTION: _Collection(cancelled, recovery.CANCEL_DATE_FIELD, recovery.AMOUNT_FIELD),
+        recovery.RECOVERIES_COLLECTION: _Collection(recovered, recovery.RECOVERY_DATE_FIELD),
+    }
+
+
+def run_benchmark(per_day: int, days: int, seed: int = 0) -> dict:
+    today = date.today()
+    db = synthetic_db(per_day, days, today, seed)
+    start = today - timedelta(days=days - 1)
+    recovery._cache.clear()
+    report = {"cancelled_orders": per_day * days}
+
+    t = time.perf_counter()
+    details = recovery.find_unrecovered(db, start, today, today)
+    report["first_check_ms"] = (time.perf_counter() - t) * 1000
+    report["unrecovered"] = len(details["unrecovered"])
+
+    t = time.perf_counter()
+    details = recovery.find_unrecovered(db, start, today, today)
+    report["cached_check_ms"] = (time.perf_counter() - t) * 1000
+    report["cached_days"] = details["cached_days"]
+
+    rng = np.random.default_rng(seed)
+    ids = np.sort(rng.choice(per_day * days * 4, per_day * days, replace=False).astype(np.int64))
+    recovered_ids = np.sort(rng.choice(ids, int(len(ids) * 0.97), replace=False))
+    t = time.perf_counter()
+    np.setdiff1d(ids, recovered_ids, assume_unique=True)
+    report["set_difference_ms"] = (time.perf_counter() - t) * 1000
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cancelled-order recovery check benchmark")
+    parser.add_argument("--per-day", type=int, default=20000, help="Cancellations per day")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for key, value in run_benchmark(args.per_day, args.days, args.seed).items():
+        print(f"{key:<24} {value:.1f}" if isinstance(value, float) else f"{key:<24} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# benchmarks/sap_stub.py
+"""
+Local HTTP stand-in for the SAP payment-block endpoint, and an offline load test of
+tools/sap_bulk.SapBulkExecutor against it.
+
+The stub accepts POST {"records": [{"idempotency_key", "slip", ...}]} and answers
+{"results": [{"idempotency_key", "status", "message"}]}. It adds per-record latency,
+and can fail whole requests (HTTP 503), drop the response after applying the batch
+(to exercise idempotent retries) and reject single records.
+
+Usage (from the repository root):
+    python -m benchmarks.sap_stub --serve --port 8765        # then SAP_API_URL=http://127.0.0.1:8765/
+    python -m benchmarks.sap_stub --records 5000 --batch-size 100 --concurrency 8 --fail-rate 0.1
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class SapStub:
+    """State and failure injection shared by the request handlers."""
+    def __init__(self, latency_ms_per_record: float = 1.0, fail_rate: float = 0.0,
+                 drop_rate: float = 0.0, reject_rate: float = 0.0, seed: int = 0):
+        self.latency_ms_per_record = latency_ms_per_record
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.applied = {}      # idempotency key -> outcome
+        self.apply_counts = {}  # slip -> times the block removal was applied
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def _roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.rng.random() < rate
+
+    def handle(self, records: list) -> tuple:
+        """Returns (http_status, body or None to drop the connection)."""
+        with self.lock:
+            self.requests += 1
+        if self._roll(self.fail_rate):
+            return 503, {"error": "SAP temporarily unavailable"}
+        time.sleep(self.latency_ms_per_record * len(records) / 1000.0)
+
+        results = []
+        for record in records:
+            key = record["idempotency_key"]
+            with self.lock:
+                if key in self.applied:
+                    results.append({"idempotency_key": key, **self.applied[key], "replayed": True})
+                    continue
+            if self._roll(self.reject_rate):
+                results.append({"idempotency_key": key, "status": "failed", "message": "Slip not found in SAP"})
+                continue
+            outcome = {"status": "removed", "message": f"Payment block removed for Slip {record['slip']}"}
+            with self.lock:
+                self.applied[key] = outcome
+                self.apply_counts[record["slip"]] = self.apply_counts.get(record["slip"], 0) + 1
+            results.append({"idempotency_key": key, **outcome})
+
+        if self._roll(self.drop_rate):
+            return 502, None  # applied, but the caller never hears about it
+        return 200, {"results": results}
+
+
+def make_server(stub: SapStub, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                records = json.loads(self.rfile.read(length)).get("records", [])
+            except ValueError:
+                self.send_error(400, "invalid JSON")
+                return
+            status, body = stub.handle(records)
+            payload = json.dumps(body or {"error": "bad gateway"}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub(stub: SapStub, port: int = 0) -> tuple:
+    """Serves the stub on a background thread; returns (server, url)."""
+    server = make_server(stub, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def sample_records(count: int) -> list:
+    return [{"Slip": str(900000 + i), "Distributor ID": f"D{i % 500:04d}", "Buyer ID": str(700000 + i),
+             "Amount": 100 + i % 900, "Distributor Name": f"Distributor {i % 500}"} for i in range(count)]
+
+
+def run_load_test(records: int, batch_size: int, concurrency: int, **stub_options) -> dict:
+    from tools.sap_bulk import SapBulkExecutor
+    stub = SapStub(**stub_options)
+    server, url = start_stub(stub)
+    try:
+        executor = SapBulkExecutor(url, batch_size=batch_size, concurrency=concurrency,
+                                   backoff_base=0.05, backoff_max=0.5)
+        details = executor.run(sample_records(records))
+    finally:
+        server.shutdown()
+    details.pop("outcomes")
+    details["stub_requests"] = stub.requests
+    details["applied_twice"] = sum(1 for count in stub.apply_counts.values() if count > 1)
+    return details
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SAP payment-block stand-in and bulk executor load test")
+    parser.add_argument("--serve", action="store_true", help="Only run the stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Stub latency per record")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of applied batches whose response is lost")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of records SAP rejects")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    stub_options = {"latency_ms_per_record": args.latency_ms, "fail_rate": args.fail_rate,
+                    "drop_rate": args.drop_rate, "reject_rate": args.reject_rate}
+    if args.serve:
+        server = make_server(SapStub(**stub_options), port=args.port)
+        print(f"SAP stand-in listening on http://127.0.0.1:{args.port}/")
+        server.serve_forever()
+        return 0
+
+    report = run_load_test(args.records, args.batch_size, args.concurrency, **stub_options)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:<20} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
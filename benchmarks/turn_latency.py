@@ -0,0 +1,197 @@
+# benchmarks/turn_latency.py
+"""
+End-to-end chat turn latency benchmark.
+
+Drives handle_user_input -> get_planned_action -> execute_action over a corpus of
+real-world phrasings and reports p50/p95 turn latency, the share of time spent in
+prompt build vs model vs tool vs persistence, and planner accuracy.
+
+Usage (from the repository root):
+    python -m benchmarks.turn_latency --latency-ms 400 --jitter-ms 100 --repeat 3
+    python -m benchmarks.turn_latency --backend openai     # measure the live model
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+DEFAULT_CORPUS = Path(__file__).with_name("corpus.json")
+
+PHASES = ("prompt_build", "model", "tool", "persistence")
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class PhaseTimer:
+    """Accumulates wall-clock time per phase for the current turn."""
+    def __init__(self):
+        self.current = {}
+
+    def reset(self):
+        self.current = {phase: 0.0 for phase in PHASES}
+
+    @contextlib.contextmanager
+    def measure(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[phase] = self.current.get(phase, 0.0) + time.perf_counter() - start
+
+
+class TimedBackend:
+    """Wraps a chat model backend and times each invoke as model time."""
+    def __init__(self, inner, timer: PhaseTimer):
+        self.inner = inner
+        self.timer = timer
+
+    def invoke(self, messages, **kwargs):
+        with self.timer.measure("model"):
+            return self.inner.invoke(messages, **kwargs)
+
+
+class TimedStore:
+    """Wraps a storage manager and times save_message as persistence time."""
+    def __init__(self, inner, timer: PhaseTimer):
+        self.inner = inner
+        self.timer = timer
+
+    def save_message(self, *args, **kwargs):
+        with self.timer.measure("persistence"):
+            return self.inner.save_message(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_benchmark(corpus: list, repeat: int = 1, backend_name: str = "replay",
+                  latency_ms: float = 0.0, jitter_ms: float = 0.0, execute: bool = True) -> dict:
+    """Runs every corpus entry `repeat` times and returns the aggregated report."""
+    os.environ.setdefault("LLM_BACKEND", backend_name)
+    import streamlit as st
+    import agent_logic
+    import app.state as state
+    from app.resources import set_db_manager
+    from database import MemoryManager
+    from llm_backends import ReplayLLM, create_llm
+
+    timer = PhaseTimer()
+    if backend_name == "replay":
+        recordings = {entry["input"]: entry["completion"] for entry in corpus if "completion" in entry}
+        backend = ReplayLLM(recordings, latency_ms=latency_ms, jitter_ms=jitter_ms)
+    else:
+        backend = create_llm(backend_name)
+    agent_logic.set_llm(TimedBackend(backend, timer))
+
+    store = TimedStore(MemoryManager(), timer)
+    set_db_manager(store)
+
+    # Planner time minus model time is attributed to prompt build
+    original_planner = state.get_planned_action
+    planner_time = {"total": 0.0}
+
+    def timed_planner(user_input):
+        start = time.perf_counter()
+        try:
+            return original_planner(user_input)
+        finally:
+            planner_time["total"] += time.perf_counter() - start
+    state.get_planned_action = timed_planner
+
+    turns = []
+    correct = 0
+    for _ in range(repeat):
+        for entry in corpus:
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            state.initialize_session_state()
+            st.session_state.chat_id = ""  # start a persisted chat
+            timer.reset()
+            planner_time["total"] = 0.0
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                state.handle_user_input(entry["input"])
+                pending = st.session_state.pending_action
+                if execute and pending:
+                    with timer.measure("tool"):
+                        result = agent_logic.execute_action(pending)
+                    st.session_state.pending_action = None
+                    state.add_message("assistant", result)
+            total = time.perf_counter() - start
+
+            timer.current["prompt_build"] = max(0.0, planner_time["total"] - timer.current["model"])
+            planned = pending["action"] if pending else None
+            if planned == entry.get("expected_action"):
+                correct += 1
+            turns.append({"input": entry["input"], "total": total, "planned": planned,
+                          "expected": entry.get("expected_action"), **timer.current})
+
+    totals = [t["total"] for t in turns]
+    grand_total = sum(totals) or 1.0
+    shares = {phase: sum(t[phase] for t in turns) / grand_total for phase in PHASES}
+    shares["other"] = max(0.0, 1.0 - sum(shares.values()))
+    return {
+        "backend": backend_name,
+        "turns": len(turns),
+        "p50_ms": percentile(totals, 50) * 1000,
+        "p95_ms": percentile(totals, 95) * 1000,
+        "mean_ms": grand_total / len(turns) * 1000 if turns else 0.0,
+        "time_share": shares,
+        "planner_accuracy": correct / len(turns) if turns else 0.0,
+        "misplanned": sorted({t["input"] for t in turns if t["planned"] != t["expected"]})
+    }
+
+
+def print_report(report: dict):
+    print(f"Backend:           {report['backend']}")
+    print(f"Turns:             {report['turns']}")
+    print(f"Turn latency p50:  {report['p50_ms']:.1f} ms")
+    print(f"Turn latency p95:  {report['p95_ms']:.1f} ms")
+    print(f"Turn latency mean: {report['mean_ms']:.1f} ms")
+    print("Time share:")
+    for phase, share in report["time_share"].items():
+        print(f"  {phase:<13} {share * 100:5.1f}%")
+    print(f"Planner accuracy:  {report['planner_accuracy'] * 100:.1f}%")
+    for text in report["misplanned"]:
+        print(f"  misplanned: {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end chat turn latency benchmark")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="JSON corpus of phrasings")
+    parser.add_argument("--backend", default="replay", choices=["replay", "openai"])
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected model latency (replay only)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Latency jitter (replay only)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-execute", action="store_true", help="Plan only, do not run tools")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(load_corpus(args.corpus), repeat=args.repeat, backend_name=args.backend,
+                           latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, execute=not args.no_execute)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
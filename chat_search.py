@@ -0,0 +1,161 @@
+# chat_search.py
+"""
+Full-text search over chat history.
+
+Every saved message gets a short search string: its text (or a tool result's tool name
+and message) plus the key fields of the records it carries (slips, distributor, buyer
+and order ids). MongoManager stores it next to the message under a text index, so a
+search is one indexed query; MemoryManager keeps a ChatSearchIndex, an inverted index
+over the same strings. Both rank the best-matching message per chat and return a
+snippet, so the chat can be opened at that message.
+"""
+
+import re
+import math
+
+# Record fields whose values are worth finding a chat by (as stored by ES, SAP and the tools)
+KEY_FIELDS = {
+    "slip", "distribtutor id", "distributor id", "distributor_id", "buyer id", "buyer_id",
+    "order id", "order_id", "gws order number", "payee_id", "vendor id", "note_id", "payment_id",
+}
+MAX_TEXT_CHARS = 2000
+MAX_KEYS = 1000
+# Records inspected per list; key values beyond these are not searchable
+MAX_RECORDS = 5000
+SNIPPET_CHARS = 160
+_TOKEN = re.compile(r"[a-z0-9]+")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+_SUFFIXES = ("iations", "iation", "ations", "ation", "ings", "ing", "ies", "ed", "es", "s")
+STOPWORDS = {"the", "a", "an", "and", "or", "of", "for", "to", "in", "on", "at", "is", "are", "was", "me", "my", "i",
+             "it", "this", "that", "with", "from", "by", "be", "please", "can", "you", "what", "show"}
+
+
+def _stem(token: str) -> str:
+    """Crude suffix stripping, so 'reconciliations' finds 'reconcile' (close to MongoDB's English stemming)."""
+    if token.isdigit():
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+    return token[:-1] if token.endswith("e") and len(token) > 4 else token
+
+
+def tokenize(text: str) -> list:
+    return [_stem(t) for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def _collect_keys(value, keys: list, budget: list):
+    """Appends the values of key fields found in nested dicts and lists."""
+    if len(keys) >= MAX_KEYS:
+        return
+    if isinstance(value, dict):
+        for field, inner in value.items():
+            if str(field).lower() in KEY_FIELDS and not isinstance(inner, (dict, list)):
+                keys.append(str(inner))
+            elif isinstance(inner, dict) and "$numberLong" in inner and str(field).lower() in KEY_FIELDS:
+                keys.append(str(inner["$numberLong"]))
+            elif isinstance(inner, (dict, list)):
+                _collect_keys(inner, keys, budget)
+    elif isinstance(value, list):
+        for item in value:
+            if budget[0] <= 0 or len(keys) >= MAX_KEYS:
+                return
+            budget[0] -= 1
+            _collect_keys(item, keys, budget)
+
+
+def message_text(content) -> str:
+    """The readable part of a message: its text, or a tool result's tool name and message."""
+    if isinstance(content, str):
+        return content[:MAX_TEXT_CHARS]
+    if isinstance(content, dict):
+        if "tool" in content:
+            result = content.get("result")
+            message = result.get("message") if isinstance(result, dict) else None
+            text = f"{content['tool'].replace('_', ' ')}: {message or content.get('error') or ''}"
+            return text[:MAX_TEXT_CHARS]
+        if "summary" in content:  # spilled payload placeholder
+            return str(content["summary"])[:MAX_TEXT_CHARS]
+    if isinstance(content, list):
+        return f"Report with {len(content)} records"
+    return ""
+
+
+def search_text(content) -> str:
+    """Search string stored with a message: readable text followed by the distinct key values."""
+    keys = []
+    if isinstance(content, (dict, list)):
+        _collect_keys(content, keys, [MAX_RECORDS])
+    text = message_text(content)
+    return (text + " " + " ".join(dict.fromkeys(keys))).strip() if keys else text
+
+
+def score(query_terms: list, text: str) -> float:
+    """Matched query terms, counting repeats less than distinct terms."""
+    counts = {}
+    for token in tokenize(text):
+        counts[token] = counts.get(token, 0) + 1
+    return sum(1 + math.log(counts[term]) for term in set(query_terms) if term in counts)
+
+
+def snippet(text: str, query_terms: list) -> str:
+    """A window of the text around the first match, with matched words in bold."""
+    terms = set(query_terms)
+    text = " ".join(str(text).split())
+    positions = [m.start() for m in _TOKEN.finditer(text.lower()) if _stem(m.group()) in terms]
+    start = max(0, positions[0] - SNIPPET_CHARS // 3) if positions else 0
+    window = text[start:start + SNIPPET_CHARS]
+    if positions:
+        window = _WORD.sub(lambda m: f"**{m.group()}**" if _stem(m.group().lower()) in terms else m.group(), window)
+    return ("…" if start else "") + window + ("…" if start + SNIPPET_CHARS < len(text) else "")
+
+
+class ChatSearchIndex:
+    """
+    Inverted index of the in-memory chat store: term -> {(chat_id, position): count}.
+    Keeps the readable text of each message (capped) for snippets.
+    """
+    def __init__(self):
+        self.postings = {}
+        self.docs = {}  # (chat_id, position) -> {"message_id", "role", "text", "terms"}
+
+    def add(self, chat_id: str, position: int, message_id: str, role: str, text: str):
+        terms = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+        key = (chat_id, position)
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[key] = count
+        self.docs[key] = {"message_id": message_id, "role": role, "text": text[:MAX_TEXT_CHARS], "terms": list(terms)}
+
+    def remove_chat(self, chat_id: str):
+        for key in [key for key in self.docs if key[0] == chat_id]:
+            for term in self.docs.pop(key)["terms"]:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(key, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Best message per chat, ranked by tf-idf over the query terms."""
+        terms = set(tokenize(query))
+        total = len(self.docs) or 1
+        scores = {}
+        for term in terms:
+            posting = self.postings.get(term, {})
+            idf = math.log(1 + total / len(posting)) if posting else 0.0
+            for key, count in posting.items():
+                scores[key] = scores.get(key, 0.0) + (1 + math.log(count)) * idf
+        best = {}
+        for (chat_id, position), value in scores.items():
+            if chat_id not in best or value > best[chat_id][1] or \
+                    (value == best[chat_id][1] and position > best[chat_id][0]):
+                best[chat_id] = (position, value)
+        ranked = sorted(best.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        hits = []
+        for chat_id, (position, value) in ranked:
+            doc = self.docs[(chat_id, position)]
+            hits.append({"chat_id": chat_id, "message_id": doc["message_id"], "position": position,
+                         "role": doc["role"], "score": round(value, 3), "snippet": snippet(doc["text"], list(terms))})
+        return hits
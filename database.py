@@ -2,12 +2,73 @@
 
 import os
 import uuid
+import threading
 from datetime import datetime
 import pymongo
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 from bson.objectid import ObjectId
 import streamlit as st
+import telemetry
+import mongo_monitor
+import chat_search
+
+# Command monitoring has to be registered before the first client is created
+mongo_monitor.install()
+
+_shared_db = None
+_shared_db_lock = threading.Lock()
+# Summary fetches retried when a save invalidates the cache mid-read
+SUMMARY_FETCH_ATTEMPTS = 3
+
+def get_shared_db():
+    """
+    Process-wide handle on the ai_poc_db database for tools and background jobs, so they
+    reuse one connection pool instead of connecting per call. None without MONGO_URI.
+    """
+    global _shared_db
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        return None
+    with _shared_db_lock:
+        if _shared_db is None:
+            _shared_db = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000).get_database("ai_poc_db")
+        return _shared_db
+
+def put_payload(db, bucket: str, name: str, value) -> str:
+    """
+    Stores a value too large for one document (MongoDB caps them at 16 MB) as BSON in a
+    GridFS bucket, replacing earlier files of the same name. Returns the file id.
+    """
+    import bson
+    import gridfs
+    files = gridfs.GridFSBucket(db, bucket_name=bucket)
+    for old in files.find({"filename": name}):
+        files.delete(old._id)
+    return str(files.upload_from_stream(name, bson.encode({"value": value})))
+
+
+def get_payload(db, bucket: str, file_id: str):
+    import bson
+    import gridfs
+    return bson.decode(gridfs.GridFSBucket(db, bucket_name=bucket).open_download_stream(ObjectId(file_id)).read())["value"]
+
+
+def delete_payload(db, bucket: str, file_id: str):
+    import gridfs
+    try:
+        gridfs.GridFSBucket(db, bucket_name=bucket).delete(ObjectId(file_id))
+    except gridfs.NoFile:
+        pass
+
+
+def current_user() -> str:
+    """Key of the logged-in user, used to scope per-user caches."""
+    try:
+        return st.session_state.get("username") or "default"
+    except Exception:
+        return "default"
+
 
 # --- In-Memory Storage Manager (No Database Required) ---
 class MemoryManager:
@@ -24,8 +85,36 @@ class MemoryManager:
         if "in_memory_db" not in st.session_state:
             st.session_state.in_memory_db = {}
 
-    def get_chat_summaries(self):
+    def _search_index(self) -> chat_search.ChatSearchIndex:
+        """Inverted index over the stored messages, built on first use and kept up to date by save_message."""
+        index = st.session_state.get("chat_search_index")
+        if index is None:
+            index = chat_search.ChatSearchIndex()
+            for chat_id, data in st.session_state.in_memory_db.items():
+                for position, msg in enumerate(data.get("messages", [])):
+                    index.add(chat_id, position, msg.get("id"), msg.get("role"), chat_search.search_text(msg.get("content")))
+            st.session_state.chat_search_index = index
+        return index
+
+    def search_messages(self, query: str, limit: int = 20):
+        """Best-matching message per chat for a full-text query, ranked, with a snippet and the chat title."""
+        self._ensure_db_exists()
+        hits = self._search_index().search(query, limit=limit)
+        titles = {chat["chat_id"]: chat["title"] for chat in self.get_chat_summaries()}
+        for hit in hits:
+            hit["title"] = titles.get(hit["chat_id"], "Chat")
+        return hits
+
+    def get_chat_summaries(self, limit: int = None, skip: int = 0):
+        """Returns chat summaries, newest first. Cached until a chat is saved, deleted or cleared."""
         self._ensure_db_exists()
+        summaries = st.session_state.get("chat_summaries_cache")
+        if summaries is None:
+            summaries = self._build_chat_summaries()
+            st.session_state.chat_summaries_cache = summaries
+        return summaries[skip:skip + limit] if limit is not None else summaries[skip:]
+
+    def _build_chat_summaries(self):
         sorted_chats = sorted(
             st.session_state.in_memory_db.items(),
             key=lambda item: item[1]['timestamp'],
@@ -49,21 +138,27 @@ class MemoryManager:
         return summaries
         # --- END OF NEW LOGIC ---
 
+    def _invalidate_summaries(self):
+        st.session_state.chat_summaries_cache = None
+
     def get_chat_messages(self, chat_id: str):
         self._ensure_db_exists()
         if not chat_id: return []
         return st.session_state.in_memory_db.get(chat_id, {}).get("messages", [])
 
-    def save_message(self, chat_id: str, role: str, content: any):
+    def save_message(self, chat_id: str, role: str, content: any, message_id: str = None):
         self._ensure_db_exists()
+        self._invalidate_summaries()
         message_doc = {"role": role, "content": content}
+        if message_id:
+            message_doc["id"] = message_id
+        index = self._search_index()
         if not chat_id:
             chat_id = str(uuid.uuid4())
             st.session_state.in_memory_db[chat_id] = {
                 "messages": [message_doc],
                 "timestamp": datetime.utcnow()
             }
-            return chat_id
         else:
             if chat_id in st.session_state.in_memory_db:
                 st.session_state.in_memory_db[chat_id]["messages"].append(message_doc)
@@ -73,18 +168,35 @@ class MemoryManager:
                     "messages": [message_doc],
                     "timestamp": datetime.utcnow()
                 }
-            return chat_id
+        position = len(st.session_state.in_memory_db[chat_id]["messages"]) - 1
+        index.add(chat_id, position, message_id, role, chat_search.search_text(content))
+        return chat_id
+
+    def held_messages(self):
+        """Every stored message; these live in session memory too (see app/session_memory.py)."""
+        self._ensure_db_exists()
+        for chat in st.session_state.in_memory_db.values():
+            yield from chat.get("messages", [])
 
     def delete_chat(self, chat_id: str):
         self._ensure_db_exists()
+        self._invalidate_summaries()
         if chat_id in st.session_state.in_memory_db:
             del st.session_state.in_memory_db[chat_id]
+            self._search_index().remove_chat(chat_id)
 
     def clear_all_history(self):
         st.session_state.in_memory_db = {}
+        st.session_state.chat_search_index = None
+        self._invalidate_summaries()
 
 
 # --- MongoDB Storage Manager ---
+@telemetry.instrument_methods(
+    "mongo",
+    rows_read={"get_chat_summaries": len, "get_chat_messages": len, "search_messages": len},
+    rows_written={"save_message": lambda chat_id: 1, "delete_chat": lambda result: 1}
+)
 class MongoManager:
     def __init__(self):
         mongo_uri = os.getenv("MONGO_URI")
@@ -94,34 +206,85 @@ class MongoManager:
         self.client.admin.command('ping')
         self.db = self.client.get_database("ai_poc_db")
         self.collection = self.db.get_collection("chat_history")
+        self.collection.create_index([("timestamp", pymongo.DESCENDING)])
+        # Text index over each message's search string and the chat title (see chat_search.py)
+        self.collection.create_index([("messages.search", "text"), ("title", "text")],
+                                     weights={"messages.search": 1, "title": 2}, name="chat_search")
+        _start_search_backfill(self.collection)
+        # Per-user summaries cache: user -> {"summaries": [...], "exhausted": bool}
+        self._summaries_cache = {}
+        self._summaries_generation = 0
+        self._summaries_lock = threading.Lock()
+
+    def get_chat_summaries(self, limit: int = None, skip: int = 0):
+        """
+        Returns chat summaries, newest first. Pages already fetched are served from a
+        per-user cache until save_message, delete_chat or clear_all_history invalidates it.
+        """
+        user = current_user()
+        end = skip + limit if limit is not None else None
+        for _ in range(SUMMARY_FETCH_ATTEMPTS):
+            with self._summaries_lock:
+                generation = self._summaries_generation
+                cached = self._summaries_cache.setdefault(user, {"summaries": [], "exhausted": False})
+                have = len(cached["summaries"])
+                if cached["exhausted"] or (end is not None and end <= have):
+                    return cached["summaries"][skip:end]
+                fetched = cached["summaries"][:]
+
+            summaries = self._fetch_summaries(have, end)
+            if summaries is None:
+                return []
+            fetched.extend(summaries)
 
-    def get_chat_summaries(self):
+            with self._summaries_lock:
+                if generation == self._summaries_generation:
+                    cached = self._summaries_cache.setdefault(user, {"summaries": [], "exhausted": False})
+                    if len(cached["summaries"]) == have:
+                        cached["summaries"].extend(summaries)
+                        cached["exhausted"] = end is None or len(summaries) < end - have
+                    return cached["summaries"][skip:end]
+            # Invalidated while fetching; the page may be stale, so start over
+        # Still changing after every attempt: return what was read, without caching it
+        return fetched[skip:end]
+
+    def _fetch_summaries(self, have: int, end: int | None):
+        """Summaries from position `have` up to `end`; None on a database error."""
         try:
-            chats = self.collection.find(
+            cursor = self.collection.find(
                 {"messages.role": "user"},
-                {"_id": 1, "messages.content": 1, "timestamp": 1}
-            ).sort("timestamp", pymongo.DESCENDING)
+                {"_id": 1, "title": 1, "timestamp": 1, "messages": {"$slice": 1}}
+            ).sort("timestamp", pymongo.DESCENDING).skip(have)
+            if end is not None:
+                cursor = cursor.limit(end - have)
             
             # --- NEW ROBUST LOGIC ---
             summaries = []
-            for chat in chats:
-                title = "New Chat"  # Default title
-                # Explicitly loop through messages to find the first user message
-                for msg in chat.get('messages', []):
-                    # Add robust checks for type and key existence
-                    if isinstance(msg, dict) and msg.get('role') == 'user':
-                        title = msg.get('content', 'Chat')
-                        break  # Found the first one, stop looking
+            for chat in cursor:
+                title = chat.get("title") or "New Chat"  # Default title
+                if not chat.get("title"):
+                    # Older chats have no stored title; the first message is the user's
+                    for msg in chat.get('messages', []):
+                        # Add robust checks for type and key existence
+                        if isinstance(msg, dict) and msg.get('role') == 'user':
+                            title = msg.get('content', 'Chat')
+                            break  # Found the first one, stop looking
                 summaries.append({
                     "chat_id": str(chat["_id"]),
                     "title": title
                 })
-            return summaries
             # --- END OF NEW LOGIC ---
+            return summaries
 
         except OperationFailure as e:
             st.error(f"Database error while fetching summaries: {e}")
-            return []
+            return None
+
+    def _invalidate_summaries(self):
+        # Chat history is shared, so a change invalidates every user's cached view
+        with self._summaries_lock:
+            self._summaries_cache.clear()
+            self._summaries_generation += 1
 
     def get_chat_messages(self, chat_id: str):
         if not chat_id: return []
@@ -132,13 +295,50 @@ class MongoManager:
             st.error(f"Database error while fetching messages: {e}")
             return []
 
-    def save_message(self, chat_id: str, role: str, content: any):
-        message_doc = {"role": role, "content": content}
+    def search_messages(self, query: str, limit: int = 20):
+        """
+        Best-matching message per chat for a full-text query, ranked by text score, with a
+        snippet and the chat title. One query on the text index that projects only the
+        message ids, roles and search strings, never the stored results.
+        """
+        terms = chat_search.tokenize(query)
+        if not terms:
+            return []
         try:
-            if not chat_id:
-                result = self.collection.insert_one({
-                    "messages": [message_doc], "timestamp": datetime.utcnow()
+            cursor = self.collection.find(
+                {"$text": {"$search": query}},
+                {"score": {"$meta": "textScore"}, "title": 1, "messages.id": 1, "messages.role": 1, "messages.search": 1}
+            ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+            hits = []
+            for chat in cursor:
+                messages = chat.get("messages", [])
+                scored = [(chat_search.score(terms, msg.get("search", "")), position)
+                          for position, msg in enumerate(messages)]
+                # The title may be the only match (stemmed differently); then open at the start
+                best, position = max(scored, default=(0, 0))
+                msg = messages[position] if messages else {}
+                hits.append({
+                    "chat_id": str(chat["_id"]), "title": chat.get("title") or "Chat",
+                    "message_id": msg.get("id"), "position": position, "role": msg.get("role"),
+                    "score": round(chat.get("score", 0.0), 3),
+                    "snippet": chat_search.snippet(msg.get("search") or chat.get("title") or "", terms),
                 })
+            return hits
+        except OperationFailure as e:
+            st.error(f"Database error while searching chats: {e}")
+            return []
+
+    def save_message(self, chat_id: str, role: str, content: any, message_id: str = None):
+        message_doc = {"role": role, "content": content, "search": chat_search.search_text(content)}
+        if message_id:
+            message_doc["id"] = message_id
+        try:
+            self._invalidate_summaries()
+            if not chat_id:
+                new_chat = {"messages": [message_doc], "timestamp": datetime.utcnow()}
+                if role == "user" and isinstance(content, str):
+                    new_chat["title"] = content
+                result = self.collection.insert_one(new_chat)
                 return str(result.inserted_id)
             else:
                 self.collection.update_one(
@@ -152,12 +352,41 @@ class MongoManager:
 
     def delete_chat(self, chat_id: str):
         try:
+            self._invalidate_summaries()
             self.collection.delete_one({"_id": ObjectId(chat_id)})
         except OperationFailure as e:
             st.error(f"Database error while deleting chat: {e}")
 
     def clear_all_history(self):
         try:
+            self._invalidate_summaries()
             self.collection.delete_many({})
         except OperationFailure as e:
-            st.error(f"Database error while clearing history: {e}")
\ No newline at end of file
+            st.error(f"Database error while clearing history: {e}")
+
+_backfill_started = False
+
+
+def _start_search_backfill(collection):
+    """Adds search strings to messages saved before search existed, once per process and off the request path."""
+    global _backfill_started
+    if _backfill_started:
+        return
+    _backfill_started = True
+
+    def backfill():
+        updated = 0
+        try:
+            for chat in collection.find({"messages": {"$elemMatch": {"search": {"$exists": False}}}},
+                                        {"messages.content": 1, "messages.search": 1}):
+                fields = {f"messages.{i}.search": chat_search.search_text(msg.get("content"))
+                          for i, msg in enumerate(chat.get("messages", [])) if "search" not in msg}
+                if fields:
+                    collection.update_one({"_id": chat["_id"]}, {"$set": fields})
+                    updated += 1
+        except Exception as e:
+            print(f"Chat search backfill stopped: {e}")
+        if updated:
+            print(f"Chat search backfill indexed {updated} chats.")
+
+    threading.Thread(target=backfill, name="chat-search-backfill", daemon=True).start()
@@ -0,0 +1,388 @@
+# ingest.py
+"""
+Bulk loader for ES and SAP sales exports.
+
+Parses CSV, XLSX or MongoDB extended JSON (an array or one document per line) in
+chunks on a process pool, normalizes types once (int64 slips, distributor and buyer
+ids and amounts, datetime sale dates) and writes each chunk with an unordered
+bulk_write keyed on (Slip, Distribtutor id, Buyer id) while the next chunks are parsed.
+Rows that cannot be normalized are rejected and reported, not loaded.
+
+CSV and JSON-lines files are split into byte ranges on line boundaries, so records
+must not contain embedded newlines.
+
+Usage (from the repository root, with MONGO_URI set):
+    python -m ingest es exports/es_2026-10.csv
+    python -m ingest sap exports/sap_2026-10.xlsx --mode insert --workers 8
+    python -m ingest es exports/es.json --dry-run
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+from pathlib import Path
+from functools import lru_cache
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Composite key of a sales record in both systems (field names as stored by ES)
+KEY_FIELDS = ["Slip", "Distribtutor id", "Buyer id"]
+INT_FIELDS = ["Slip", "Distribtutor id", "Buyer id", "Amount"]
+DATE_FIELDS = ["Sale date"]
+SOURCES = {"es": "es", "sap": "sap"}
+CHUNK_ROWS = 20000
+MAX_WRITES_IN_FLIGHT = 4
+# Rejected rows listed in the report
+REJECT_SAMPLE = 20
+# Per-collection counters for caches of loaded data: "generation" counts loads that rewrote
+# existing records, "loads" counts every load that wrote records (new ones included)
+GENERATION_COLLECTION = "ingest_generations"
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d", "%Y%m%d", "%m/%d/%Y", "%d.%m.%Y"]
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+# --- Type normalization ---
+
+def to_int(value):
+    """int from ints, integral floats, numeric strings ("1,200", "12.0") and {"$numberLong": ...}."""
+    if value is None or isinstance(value, bool):
+        raise ValueError(f"not an integer: {value!r}")
+    if isinstance(value, dict):
+        for key in ("$numberLong", "$numberInt", "$numberDouble", "$numberDecimal"):
+            if key in value:
+                return to_int(value[key])
+        raise ValueError(f"not an integer: {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"not an integer: {value!r}")
+        return int(value)
+    text = str(value).strip().replace(",", "")
+    try:
+        return int(text)
+    except ValueError:
+        number = float(text)
+        if not number.is_integer():
+            raise ValueError(f"not an integer: {value!r}")
+        return int(number)
+
+
+def to_datetime(value) -> datetime:
+    """datetime from datetimes, {"$date": ...}, Excel serial days and the export date formats."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, dict) and "$date" in value:
+        return to_datetime(value["$date"])
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return EXCEL_EPOCH + timedelta(days=float(value))
+    text = str(value or "").strip()
+    if not text:
+        raise ValueError("missing date")
+    return _parse_date_text(text)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text: str) -> datetime:
+    # An export covers few distinct dates, so each spelling is parsed once per worker
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"not a date: {text!r}")
+
+
+def normalize_record(raw: dict) -> dict:
+    """One export row with canonical types; raises ValueError for rows that cannot be loaded."""
+    doc = {}
+    for field, value in raw.items():
+        field = str(field).strip()
+        if not field or field == "_id":
+            continue
+        if isinstance(value, str):
+            value = value.strip() or None
+        doc[field] = value
+    for field in INT_FIELDS:
+        if field in KEY_FIELDS or doc.get(field) is not None:
+            try:
+                doc[field] = to_int(doc.get(field))
+            except (ValueError, OverflowError) as e:
+                raise ValueError(f"{field}: {e}")
+    for field in DATE_FIELDS:
+        try:
+            doc[field] = to_datetime(doc.get(field))
+        except ValueError as e:
+            raise ValueError(f"{field}: {e}")
+    return doc
+
+
+def normalize_rows(rows: list) -> tuple:
+    """Normalized documents and the rejects, numbered by their position in the chunk."""
+    docs, rejected = [], []
+    for offset, raw in enumerate(rows):
+        try:
+            docs.append(normalize_record(raw))
+        except ValueError as e:
+            rejected.append({"row": offset, "error": str(e)})
+    return docs, rejected
+
+
+# --- Readers: each yields work items for the pool ---
+
+def _byte_ranges(path: Path, start: int, chunk_bytes: int) -> list:
+    """[start, end) ranges of about chunk_bytes, each ending on a line boundary."""
+    size = path.stat().st_size
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(path: Path, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode("utf-8-sig")
+
+
+def parse_csv_range(path: str, start: int, end: int, header: list) -> tuple:
+    text = _read_range(Path(path), start, end)
+    rows = [dict(zip(header, values)) for values in csv.reader(text.splitlines()) if values]
+    docs, rejected = normalize_rows(rows)
+    return docs, rejected, len(rows)
+
+
+def parse_jsonl_range(path: str, start: int, end: int) -> tuple:
+    from bson import json_util
+    lines = [line.strip().rstrip(",") for line in _read_range(Path(path), start, end).splitlines()]
+    lines = [line for line in lines if line]
+    rows, positions, rejected = [], [], []
+    for offset, line in enumerate(lines):
+        try:
+            rows.append(json_util.loads(line))
+            positions.append(offset)
+        except ValueError as e:
+            rejected.append({"row": offset, "error": f"invalid JSON: {e}"})
+    docs, bad = normalize_rows(rows)
+    rejected += [{**reject, "row": positions[reject["row"]]} for reject in bad]
+    return docs, sorted(rejected, key=lambda reject: reject["row"]), len(lines)
+
+
+def parse_rows(rows: list) -> tuple:
+    docs, rejected = normalize_rows(rows)
+    return docs, rejected, len(rows)
+
+
+def _csv_tasks(path: Path, chunk_bytes: int):
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]))
+        body_start = f.tell()
+    for start, end in _byte_ranges(path, body_start, chunk_bytes):
+        yield parse_csv_range, (str(path), start, end, header)
+
+
+def _json_tasks(path: Path, chunk_bytes: int, chunk_rows: int):
+    with open(path, "rb") as f:
+        first = f.read(64).lstrip()
+    if first.startswith(b"["):
+        # A single array has to be read whole; normalization is still spread over the pool
+        from bson import json_util
+        rows = json_util.loads(path.read_text(encoding="utf-8-sig"))
+        for start in range(0, len(rows), chunk_rows):
+            yield parse_rows, (rows[start:start + chunk_rows],)
+        return
+    for start, end in _byte_ranges(path, 0, chunk_bytes):
+        yield parse_jsonl_range, (str(path), start, end)
+
+
+def _xlsx_tasks(path: Path, chunk_rows: int):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows)]
+        chunk = []
+        for values in rows:
+            chunk.append(dict(zip(header, values)))
+            if len(chunk) == chunk_rows:
+                yield parse_rows, (chunk,)
+                chunk = []
+        if chunk:
+            yield parse_rows, (chunk,)
+    finally:
+        workbook.close()
+
+
+def detect_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    return {".csv": "csv", ".xlsx": "xlsx", ".json": "json", ".jsonl": "json", ".ndjson": "json"}.get(suffix, "csv")
+
+
+def _tasks(path: Path, fmt: str, chunk_rows: int):
+    # about 64 bytes per exported CSV/JSON row
+    chunk_bytes = chunk_rows * 64
+    if fmt == "csv":
+        return _csv_tasks(path, chunk_bytes)
+    if fmt == "json":
+        return _json_tasks(path, chunk_bytes, chunk_rows)
+    if fmt == "xlsx":
+        return _xlsx_tasks(path, chunk_rows)
+    raise ValueError(f"Unsupported format '{fmt}'")
+
+
+# --- Writing ---
+
+def write_chunk(collection, docs: list, mode: str) -> dict:
+    """Unordered bulk write of one chunk; returns the counts MongoDB reported."""
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+    if not docs:
+        return {}
+    try:
+        if mode == "insert":
+            result = collection.insert_many(docs, ordered=False)
+            return {"inserted": len(result.inserted_ids)}
+        result = collection.bulk_write(
+            [UpdateOne({field: doc[field] for field in KEY_FIELDS}, {"$set": doc}, upsert=True) for doc in docs],
+            ordered=False
+        )
+        return {"upserted": result.upserted_count, "modified": result.modified_count, "matched": result.matched_count}
+    except BulkWriteError as e:
+        details = e.details
+        duplicates = sum(1 for err in details.get("writeErrors", []) if err.get("code") == 11000)
+        return {"inserted": details.get("nInserted", 0), "upserted": details.get("nUpserted", 0),
+                "modified": details.get("nModified", 0), "duplicates": duplicates,
+                "write_errors": len(details.get("writeErrors", [])) - duplicates}
+
+
+def ingest_generation(db, collection_name: str, counter: str = "generation") -> int:
+    """A load counter of the collection (see GENERATION_COLLECTION); 0 if none yet."""
+    doc = db[GENERATION_COLLECTION].find_one({"_id": collection_name})
+    return doc.get(counter, 0) if doc else 0
+
+
+def bump_generation(collection, rewrote: bool = True):
+    """Records a load into the collection; rewrote=True when it changed existing records."""
+    counters = {"loads": 1, "generation": 1} if rewrote else {"loads": 1}
+    collection.database[GENERATION_COLLECTION].update_one(
+        {"_id": collection.name}, {"$inc": counters, "$set": {"updated_at": datetime.utcnow()}}, upsert=True)
+
+
+def ingest_file(path: Path, source: str, collection=None, fmt: str = None, mode: str = "upsert",
+                workers: int = None, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """
+    Loads one export into the source's collection (or just parses it when collection is
+    None). Parsing runs on a process pool; writes overlap with parsing on a few threads.
+    """
+    fmt = fmt or detect_format(path)
+    workers = workers or os.cpu_count() or 2
+    report = {"source": source, "file": path.name, "format": fmt, "rows_read": 0, "rows_loaded": 0,
+              "rejected": 0, "rejected_sample": [], "writes": {}}
+    if collection is not None:
+        from pymongo.errors import OperationFailure
+        try:
+            collection.create_index([(field, 1) for field in KEY_FIELDS], name="sales_record_key", unique=True)
+        except OperationFailure as e:
+            # e.g. duplicates loaded before normalization; upserts still work, only slower
+            print(f"Could not create a unique index on {', '.join(KEY_FIELDS)}: {e}")
+
+    start = time.perf_counter()
+    pending_writes = []
+
+    def collect_writes(block: bool):
+        while pending_writes and (block or pending_writes[0].done()):
+            for key, value in pending_writes.pop(0).result().items():
+                report["writes"][key] = report["writes"].get(key, 0) + value
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=MAX_WRITES_IN_FLIGHT) as writer:
+        # Keep a bounded number of chunks in flight so large files do not pile up in memory
+        in_flight = []
+        tasks = _tasks(path, fmt, chunk_rows)
+
+        def drain_one():
+            docs, rejected, rows = in_flight.pop(0).result()
+            # chunks finish in submission order, so chunk positions become data row numbers (1-based)
+            for reject in rejected[:REJECT_SAMPLE - len(report["rejected_sample"])]:
+                report["rejected_sample"].append({**reject, "row": report["rows_read"] + reject["row"] + 1})
+            report["rows_read"] += rows
+            report["rows_loaded"] += len(docs)
+            report["rejected"] += len(rejected)
+            if collection is not None and docs:
+                pending_writes.append(writer.submit(write_chunk, collection, docs, mode))
+                collect_writes(block=len(pending_writes) > MAX_WRITES_IN_FLIGHT)
+
+        for func, args in tasks:
+            in_flight.append(pool.submit(func, *args))
+            if len(in_flight) >= workers * 2:
+                drain_one()
+        while in_flight:
+            drain_one()
+        collect_writes(block=True)
+
+    elapsed = time.perf_counter() - start
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_read"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load ES/SAP sales exports into MongoDB with normalized types")
+    parser.add_argument("source", choices=sorted(SOURCES), help="Which system the export comes from")
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--format", choices=["csv", "xlsx", "json"], help="Default: from the file extension")
+    parser.add_argument("--mode", choices=["upsert", "insert"], default="upsert",
+                        help="upsert on the composite key (default), or insert_many for first loads")
+    parser.add_argument("--collection", help="Default: the source name")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--dry-run", action="store_true", help="Parse and normalize only")
+    args = parser.parse_args(argv)
+
+    collection = None
+    if not args.dry_run:
+        from database import get_shared_db
+        db = get_shared_db()
+        if db is None:
+            print("MONGO_URI is not set; use --dry-run to only parse the files.")
+            return 2
+        collection = db[args.collection or SOURCES[args.source]]
+
+    exit_code = 0
+    for path in args.files:
+        if not path.exists():
+            print(f"{path}: file not found")
+            exit_code = 1
+            continue
+        report = ingest_file(path, args.source, collection, fmt=args.format, mode=args.mode,
+                             workers=args.workers, chunk_rows=args.chunk_rows)
+        writes = ", ".join(f"{count} {kind}" for kind, count in report["writes"].items()) or "nothing written"
+        print(f"{path.name}: {report['rows_read']} rows read, {report['rows_loaded']} normalized, "
+              f"{report['rejected']} rejected; {writes}; "
+              f"{report['elapsed_seconds']}s ({report['rows_per_second']:,.0f} rows/s)")
+        for reject in report["rejected_sample"]:
+            print(f"  row {reject['row']}: {reject['error']}")
+        if report["rejected"] or report["writes"].get("write_errors"):
+            exit_code = 1
+        written = report["writes"]
+        if collection is not None and (written.get("modified") or written.get("upserted") or written.get("inserted")):
+            # Upserts that changed records in place are not seen by incremental readers keyed on _id
+            bump_generation(collection, rewrote=bool(written.get("modified")))
+    if collection is not None:
+        # Precomputed reconciliations were built from the data just replaced
+        import snapshots
+        print(f"Dropped {snapshots.invalidate('reconcile_sap_vs_es_sales')} reconciliation snapshots.")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# jobs.py
+
+import os
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of worker threads shared by all sessions of this process
+MAX_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs nobody collected are dropped after this many seconds
+FINISHED_JOB_TTL = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(fraction: float, message: str = ""):
+    """
+    Reports progress of the job the caller is running in.
+    Tools can call this freely; it is a no-op when the tool runs inline.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.update_progress(fraction, message)
+
+
+class Job:
+    """A single background tool execution."""
+    def __init__(self, label: str, chat_id: str | None = None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.chat_id = chat_id
+        self.status = "queued"  # queued | running | done | failed
+        self.progress = 0.0
+        self.progress_message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, fraction: float, message: str = ""):
+        with self._lock:
+            self.progress = max(0.0, min(1.0, float(fraction)))
+            if message:
+                self.progress_message = message
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "label": self.label,
+                "chat_id": self.chat_id,
+                "status": self.status,
+                "progress": self.progress,
+                "progress_message": self.progress_message,
+                "elapsed": (self.finished_at or time.time()) - self.created_at
+            }
+
+
+class JobManager:
+    """Runs tools on a worker pool and keeps track of their state by job ID."""
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job: Job, func, args, kwargs):
+        token = _current_job.set(job)
+        job.status = "running"
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = "done"
+            job.update_progress(1.0)
+        except Exception as e:
+            print(f"Job {job.id} ({job.label}) failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            _current_job.reset(token)
+
+    def submit(self, func, *args, label: str = "", chat_id: str | None = None, **kwargs) -> str:
+        """Queues func(*args, **kwargs) on the worker pool and returns the job ID."""
+        self._prune()
+        job = Job(label or getattr(func, "__name__", "job"), chat_id=chat_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for_chat(self, chat_id: str) -> list:
+        """Returns the IDs of uncollected jobs started from a chat (e.g. after a browser refresh)."""
+        if not chat_id:
+            return []
+        with self._lock:
+            return [job.id for job in self._jobs.values() if job.chat_id == chat_id]
+
+    def collect(self, job_id: str) -> Job | None:
+        """Removes a finished job from the registry and returns it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+                return job
+        return None
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the process-wide job manager."""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
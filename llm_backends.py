@@ -0,0 +1,103 @@
+# llm_backends.py
+
+import os
+import re
+import json
+import time
+import random
+
+# Backend used when LLM_BACKEND is not set
+DEFAULT_BACKEND = "openai"
+
+_USER_INPUT_PATTERN = re.compile(r"^User input: (.*)$", re.MULTILINE)
+
+DEFAULT_REPLAY_COMPLETION = {
+    "status": "action_not_found",
+    "message": "I couldn't understand what action you want to take. Could you please rephrase your request?",
+    "type": "unclear_action"
+}
+
+
+class ReplayMessage:
+    """Minimal stand-in for a chat model response message."""
+    def __init__(self, content: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.content = content
+        self.type = "ai"
+        self.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+
+class ReplayLLM:
+    """
+    Deterministic local stand-in for the chat model.
+    Replays recorded completions keyed by the user input found in the prompt and
+    optionally sleeps to simulate model latency.
+    """
+    def __init__(self, recordings: dict, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 seed: int = 0, default_completion: dict | str | None = None):
+        self.recordings = {self._normalize(k): v for k, v in recordings.items()}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.default_completion = default_completion or DEFAULT_REPLAY_COMPLETION
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayLLM":
+        """
+        Loads recordings from a JSON file. Accepts either a mapping of user input to
+        completion, or a list of {"input": ..., "completion": ...} entries.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {entry["input"]: entry["completion"] for entry in data if "completion" in entry}
+        return cls(data, **kwargs)
+
+    def _extract_user_input(self, messages) -> str:
+        text = "\n".join(getattr(m, "content", str(m)) for m in messages) if isinstance(messages, list) else str(messages)
+        matches = _USER_INPUT_PATTERN.findall(text)
+        return matches[-1] if matches else ""
+
+    def invoke(self, messages, **kwargs) -> ReplayMessage:
+        self.calls += 1
+        prompt_text = "\n".join(getattr(m, "content", str(m)) for m in messages) if isinstance(messages, list) else str(messages)
+        user_input = self._extract_user_input(messages)
+        completion = self.recordings.get(self._normalize(user_input), self.default_completion)
+        if not isinstance(completion, str):
+            completion = json.dumps(completion)
+
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        # Rough whitespace token counts are enough for a stand-in
+        return ReplayMessage(completion, len(prompt_text.split()), len(completion.split()))
+
+
+def create_llm(backend: str | None = None):
+    """
+    Creates the chat model backend selected by LLM_BACKEND ("openai" or "replay").
+    The replay backend reads LLM_REPLAY_FILE and LLM_REPLAY_LATENCY_MS / LLM_REPLAY_JITTER_MS.
+    """
+    backend = (backend or os.getenv("LLM_BACKEND") or DEFAULT_BACKEND).lower()
+    if backend == "replay":
+        latency_ms = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+        jitter_ms = float(os.getenv("LLM_REPLAY_JITTER_MS", "0"))
+        replay_file = os.getenv("LLM_REPLAY_FILE")
+        if replay_file:
+            return ReplayLLM.from_file(replay_file, latency_ms=latency_ms, jitter_ms=jitter_ms)
+        return ReplayLLM({}, latency_ms=latency_ms, jitter_ms=jitter_ms)
+    if backend == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model="gpt-4-turbo", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+    raise ValueError(f"Unknown LLM backend: {backend}")
@@ -1,5 +1,8 @@
 # main.py
 
+import startup_profiler
+startup_profiler.start()
+
 import streamlit as st
 st.set_page_config(page_title="Commission Co-Pilot", layout="wide", page_icon="🤖")
 
@@ -10,46 +13,53 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-from openai import OpenAI
 
 from database import MongoManager, MemoryManager
 from app.auth import show_login_ui
 from app.chat_ui import show_main_chat_ui
 from app.state import initialize_session_state
+from app.resources import set_db_manager
 
 # --- Resource Initialization ---
 @st.cache_resource
 def init_resources():
-    """Initializes all shared resources and returns them."""
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
+    """
+    Initializes all shared resources and returns (db_manager, db_status). This runs once
+    per process, so it must not touch st.session_state: every session sets its own status.
+    """
     db_manager = None
     mongo_uri = os.getenv("MONGO_URI")
 
-    # Store connection status in session_state to be displayed in the sidebar
+    # Connection status, displayed in the sidebar
     if mongo_uri:
         try:
             db_manager = MongoManager()
-            st.session_state.db_status = {"type": "success", "message": "Connected to persistent database."}
+            db_status = {"type": "success", "message": "Connected to persistent database."}
         except Exception as e:
             db_manager = MemoryManager()
-            st.session_state.db_status = {"type": "warning", "message": f"DB connection failed. Using temporary storage."}
+            db_status = {"type": "warning", "message": f"DB connection failed. Using temporary storage."}
     else:
         db_manager = MemoryManager()
-        st.session_state.db_status = {"type": "warning", "message": "Using temporary storage (history will be lost)."}
+        db_status = {"type": "warning", "message": "Using temporary storage (history will be lost)."}
 
-    return openai_client, db_manager
+    return db_manager, db_status
 
-# Initialize resources once
-openai_client, db_manager = init_resources()
+# Initialize resources once (the OpenAI client is created lazily, see app/resources.py)
+with startup_profiler.step("init_resources"):
+    db_manager, db_status = init_resources()
+set_db_manager(db_manager)
 
 # --- Initialize Session State ---
-initialize_session_state()
+with startup_profiler.step("initialize_session_state"):
+    initialize_session_state()
+st.session_state.db_status = dict(db_status)
 
 # --- Main Application Router ---
 # if st.session_state.get("authenticated", False):
-#     show_main_chat_ui(db_manager=db_manager, openai_client=openai_client)
+#     show_main_chat_ui(db_manager=db_manager)
 # else:
 #     show_login_ui()
 
-show_main_chat_ui(db_manager=db_manager, openai_client=openai_client)
\ No newline at end of file
+show_main_chat_ui(db_manager=db_manager)
+
+startup_profiler.report_once()
\ No newline at end of file
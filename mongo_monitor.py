@@ -0,0 +1,210 @@
+# mongo_monitor.py
+"""
+Client-side MongoDB command monitoring.
+
+A pymongo CommandListener, registered before any client is created, records the
+duration, documents returned and reply bytes of every command in the telemetry
+registry (kind "mongo_cmd"), named "<tool> <command> <collection>" with the tool set by
+tool_context(). Commands slower than SLOW_QUERY_MS are explained on a background thread
+and written to the slow-query log as JSON lines with a plan summary, so collection scans
+and oversized projections show up without server-side profiling.
+
+Off unless MONGO_MONITOR=1.
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import monitoring
+
+import telemetry
+
+ENABLED = os.getenv("MONGO_MONITOR", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+# The same query shape is explained at most once per this many seconds
+EXPLAIN_COOLDOWN_SECONDS = 600
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Commands the driver sends for itself; not worth recording
+IGNORED = {"isMaster", "ismaster", "hello", "ping", "buildInfo", "saslStart", "saslContinue", "endSessions",
+           "explain", "killCursors", "getLastError"}
+MAX_PENDING = 1000
+
+current_tool = contextvars.ContextVar("mongo_monitor_tool", default=None)
+
+
+@contextlib.contextmanager
+def tool_context(tool: str):
+    """Tags the commands issued inside the block with the calling tool."""
+    token = current_tool.set(tool)
+    try:
+        yield
+    finally:
+        current_tool.reset(token)
+
+
+def _shape(value):
+    """The query with its values replaced, so different dates or ids share one shape."""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shape(v) for v in value[:3]]
+    return type(value).__name__
+
+
+def _documents_returned(command: str, reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command in ("count", "update", "delete", "insert"):
+        return int(reply.get("n", 0))
+    return 0
+
+
+def summarize_plan(explain: dict) -> dict:
+    """Stages of the winning plan, indexes used and, with executionStats, docs and keys examined."""
+    planner = explain.get("queryPlanner") or {}
+    if not planner and explain.get("stages"):
+        # aggregate explains wrap the find plan in the first stage
+        planner = (explain["stages"][0].get("$cursor") or {}).get("queryPlanner") or {}
+    stages, indexes = [], []
+
+    def walk(plan):
+        if not isinstance(plan, dict):
+            return
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        if plan.get("indexName"):
+            indexes.append(plan["indexName"])
+        for key in ("inputStage", "queryPlan"):
+            walk(plan.get(key))
+        for child in plan.get("inputStages", []):
+            walk(child)
+
+    walk(planner.get("winningPlan"))
+    stats = explain.get("executionStats") or {}
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, log_path: str = SLOW_QUERY_LOG, mongo_uri: str = None):
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+        self.mongo_uri = mongo_uri
+        self._pending = {}  # (connection, request_id) -> started info
+        self._lock = threading.Lock()
+        self._explained = {}  # shape key -> last explain time
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+        self._client = None
+
+    def started(self, event):
+        if event.command_name in IGNORED:
+            return
+        # getMore carries the cursor id under its own name and the collection separately
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        info = {
+            "command": event.command_name,
+            "collection": collection if isinstance(collection, str) else "",
+            "database": event.database_name,
+            "tool": current_tool.get() or "app",
+        }
+        if event.command_name in EXPLAINABLE:
+            # Keep the command only when it may need explaining; drop driver-added fields
+            info["body"] = {k: v for k, v in event.command.items() if not k.startswith("$") and k != "lsid"}
+        with self._lock:
+            if len(self._pending) < MAX_PENDING:
+                self._pending[(event.connection_id, event.request_id)] = info
+
+    def _finish(self, event, error: bool):
+        with self._lock:
+            info = self._pending.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return None
+        ms = event.duration_micros / 1000
+        name = f"{info['tool']} {info['command']} {info['collection']}".strip()
+        telemetry.registry.observe("mongo_cmd", name, ms, error=error)
+        return info, name, ms
+
+    def succeeded(self, event):
+        finished = self._finish(event, error=False)
+        if finished is None:
+            return
+        info, name, ms = finished
+        reply = event.reply or {}
+        telemetry.registry.add("rows_read", "mongo_cmd", name, _documents_returned(info["command"], reply))
+        try:
+            from bson import encode
+            telemetry.registry.add("reply_bytes", "mongo_cmd", name, len(encode(reply)))
+        except Exception:
+            pass
+        if ms >= self.threshold_ms:
+            self._slow(info, ms, reply)
+
+    def failed(self, event):
+        self._finish(event, error=True)
+
+    # --- slow queries ---
+    def _slow(self, info: dict, ms: float, reply: dict):
+        body = info.get("body")
+        shape_key = json.dumps([info["command"], info["collection"], _shape(body or {})], sort_keys=True, default=str)
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(shape_key)
+            explain = body is not None and (last is None or now - last >= EXPLAIN_COOLDOWN_SECONDS)
+            if explain:
+                self._explained[shape_key] = now
+        entry = {
+            "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "tool": info["tool"], "command": info["command"], "collection": info["collection"],
+            "duration_ms": round(ms, 1), "documents": _documents_returned(info["command"], reply),
+            "shape": _shape(body or {}),
+        }
+        self._explainer.submit(self._explain_and_log, info, entry, explain)
+
+    def _explain_client(self):
+        if self._client is None:
+            from pymongo import MongoClient
+            # Separate pool, so explains never queue behind the app's commands; the listener ignores them
+            self._client = MongoClient(self.mongo_uri or os.getenv("MONGO_URI"), serverSelectionTimeoutMS=5000)
+        return self._client
+
+    def _explain_and_log(self, info: dict, entry: dict, explain: bool):
+        if not explain and info.get("body") is not None:
+            entry["plan"] = "same shape explained in the last 10 minutes"
+        if explain:
+            try:
+                db = self._explain_client()[info["database"]]
+                result = db.command("explain", info["body"], verbosity="executionStats")
+                entry["plan"] = summarize_plan(result)
+            except Exception as e:
+                entry["plan_error"] = str(e)
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            print(f"Slow query log write failed: {e}")
+
+
+_listener = None
+
+
+def install():
+    """Registers the listener for every client created afterwards (once, and only when enabled)."""
+    global _listener
+    if not ENABLED or _listener is not None:
+        return _listener
+    _listener = SlowQueryListener()
+    monitoring.register(_listener)
+    return _listener
@@ -0,0 +1,247 @@
+# pipeline.py
+
+import os
+import json
+import time
+import threading
+import contextvars
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from jobs import report_progress
+
+# Local checkpoint directory used when no MongoDB is configured
+CHECKPOINT_DIR = Path(os.getenv("PIPELINE_CHECKPOINT_DIR", ".pipeline_checkpoints"))
+MAX_PARALLEL_STEPS = int(os.getenv("PIPELINE_MAX_PARALLEL_STEPS", "4"))
+# GridFS bucket of full step outputs when checkpoints are kept in MongoDB
+OUTPUT_BUCKET = "pipeline_outputs"
+
+
+class PipelineStepError(Exception):
+    """Raised by a step to stop the pipeline with a readable message."""
+
+
+class Step:
+    """A pipeline step: a function of (params, results of its dependencies)."""
+    def __init__(self, name: str, func, depends_on: list | None = None, label: str = ""):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on or [])
+        self.label = label or name
+
+
+def _split_scalars(values: dict) -> tuple:
+    """(scalar fields, {field: length} of list and dict fields)"""
+    kept, counts = {}, {}
+    for key, value in values.items():
+        if isinstance(value, (list, tuple, dict)):
+            counts[key] = len(value)
+        else:
+            kept[key] = value
+    return kept, counts
+
+
+def compact_result(result):
+    """
+    What a checkpoint keeps of a step result: its scalar fields and those of its details,
+    with lists and nested records replaced by their counts. Returns (compact, trimmed),
+    trimmed telling whether anything was left out.
+    """
+    if not isinstance(result, dict):
+        return result, False
+    compact, counts = _split_scalars({k: v for k, v in result.items() if k != "details"})
+    details = result.get("details")
+    if isinstance(details, dict):
+        compact["details"], detail_counts = _split_scalars(details)
+        counts.update(detail_counts)
+    elif isinstance(details, (list, tuple)):
+        compact["details"], counts["details"] = None, len(details)
+    elif "details" in result:
+        compact["details"] = details
+    if counts:
+        compact["counts"] = counts
+    return compact, bool(counts)
+
+
+class FileCheckpointStore:
+    """
+    Stores one JSON checkpoint document per run in a local directory, and full step
+    outputs next to it as {run_id}.{step}.json.
+    """
+    def __init__(self, directory: Path = CHECKPOINT_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, run_id: str) -> Path:
+        return self.directory / f"{run_id}.json"
+
+    def load(self, run_id: str) -> dict | None:
+        path = self._path(run_id)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, run_id: str, checkpoint: dict):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(run_id).with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, default=str)
+            os.replace(tmp_path, self._path(run_id))
+
+    def save_output(self, run_id: str, step: str, result) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{run_id}.{step}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, default=str)
+        return str(path)
+
+
+class MongoCheckpointStore:
+    """
+    Stores checkpoints in the pipeline_checkpoints collection and full step outputs in
+    the pipeline_outputs GridFS bucket, so a checkpoint stays far below the document limit.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.get_collection("pipeline_checkpoints")
+
+    def load(self, run_id: str) -> dict | None:
+        doc = self.collection.find_one({"_id": run_id})
+        if doc:
+            doc.pop("_id", None)
+        return doc
+
+    def save(self, run_id: str, checkpoint: dict):
+        self.collection.replace_one({"_id": run_id}, checkpoint, upsert=True)
+
+    def save_output(self, run_id: str, step: str, result) -> str:
+        from database import put_payload
+        return f"gridfs:{OUTPUT_BUCKET}/{put_payload(self.db, OUTPUT_BUCKET, f'{run_id}/{step}', result)}"
+
+
+def get_checkpoint_store():
+    """Uses MongoDB when MONGO_URI is set and reachable, local files otherwise."""
+    if os.getenv("MONGO_URI"):
+        try:
+            from database import MongoManager
+            return MongoCheckpointStore(MongoManager().db)
+        except Exception as e:
+            print(f"Checkpoint store falling back to local files: {e}")
+    return FileCheckpointStore()
+
+
+class Pipeline:
+    """
+    Runs steps as a dependency graph. Independent steps run concurrently and every
+    finished step is checkpointed so a failed run resumes from the last good step.
+    Checkpoints and dependants get the compact result (see compact_result); the full
+    output is saved separately by the store and referenced as the step's "output".
+    """
+    def __init__(self, name: str, steps: list, store=None, max_parallel: int = MAX_PARALLEL_STEPS):
+        self.name = name
+        self.steps = {step.name: step for step in steps}
+        self.store = store
+        self.max_parallel = max_parallel
+        self._validate()
+
+    def _validate(self):
+        for step in self.steps.values():
+            for dep in step.depends_on:
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+        # Kahn's algorithm to reject cycles up front
+        remaining = {name: set(step.depends_on) for name, step in self.steps.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Pipeline '{self.name}' has a dependency cycle: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _new_checkpoint(self, params: dict) -> dict:
+        return {
+            "pipeline": self.name,
+            "params": params,
+            "status": "running",
+            "started_at": datetime.utcnow().isoformat(),
+            "steps": {name: {"status": "pending"} for name in self.steps}
+        }
+
+    def run(self, run_id: str, params: dict) -> dict:
+        """Runs (or resumes) the pipeline and returns the final checkpoint."""
+        checkpoint = self.store.load(run_id) if self.store else None
+        if not checkpoint:
+            checkpoint = self._new_checkpoint(params)
+        if checkpoint.get("status") == "completed":
+            return checkpoint
+
+        checkpoint["status"] = "running"
+        checkpoint["resumed"] = any(s.get("status") == "done" for s in checkpoint["steps"].values())
+        results = {name: s.get("result") for name, s in checkpoint["steps"].items() if s.get("status") == "done"}
+        lock = threading.Lock()
+        failed = []
+
+        def run_step(step: Step):
+            started = time.perf_counter()
+            with lock:
+                checkpoint["steps"][step.name] = {"status": "running"}
+            try:
+                dep_results = {dep: results[dep] for dep in step.depends_on}
+                result = step.func(params, dep_results)
+                if isinstance(result, dict) and result.get("status") == "error":
+                    raise PipelineStepError(result.get("message", f"{step.label} failed"))
+                compact, trimmed = compact_result(result)
+                entry = {"status": "done", "result": compact}
+                if trimmed and self.store:
+                    try:
+                        entry["output"] = self.store.save_output(run_id, step.name, result)
+                    except Exception as e:
+                        print(f"Could not save the output of pipeline step {step.name}: {e}")
+            except Exception as e:
+                print(f"Pipeline step {step.name} failed: {e}")
+                entry = {"status": "failed", "error": str(e)}
+            entry["duration"] = round(time.perf_counter() - started, 3)
+            with lock:
+                checkpoint["steps"][step.name] = entry
+                if entry["status"] == "done":
+                    results[step.name] = entry["result"]
+                else:
+                    failed.append(step.name)
+                if self.store:
+                    self.store.save(run_id, checkpoint)
+            return step.name
+
+        total = len(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix=f"pipeline-{self.name}") as executor:
+            while True:
+                if not failed:
+                    for name, step in self.steps.items():
+                        state = checkpoint["steps"][name].get("status")
+                        if state in ("pending", "failed", "running") and name not in running \
+                                and all(dep in results for dep in step.depends_on):
+                            # A copy of the caller's context per step keeps its job and Mongo tool tag
+                            running[name] = executor.submit(contextvars.copy_context().run, run_step, step)
+                if not running:
+                    break
+                done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = future.result()
+                    del running[name]
+                report_progress(len(results) / total, f"{len(results)} of {total} steps completed")
+
+        if failed:
+            checkpoint["status"] = "failed"
+        elif len(results) == total:
+            checkpoint["status"] = "completed"
+        else:
+            checkpoint["status"] = "incomplete"
+        checkpoint["finished_at"] = datetime.utcnow().isoformat()
+        if self.store:
+            self.store.save(run_id, checkpoint)
+        return checkpoint
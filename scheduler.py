@@ -0,0 +1,107 @@
+# scheduler.py
+"""
+Nightly snapshot worker, run next to the Streamlit app:
+
+    python -m scheduler                 # every night at SNAPSHOT_RUN_AT (default 02:00)
+    python -m scheduler --once          # precompute now and exit (e.g. from cron)
+
+Precomputes yesterday's SAP vs ES reconciliation, the commission rollups for yesterday
+and month-to-date, and today's overdue shipment report through fn.refresh(), so the
+tools serve them from snapshots (see snapshots.py). A run marker per day keeps a
+restarted worker from recomputing a night that already completed.
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import snapshots
+
+RUN_AT = os.getenv("SNAPSHOT_RUN_AT", "02:00")
+MARKER_REPORT = "scheduler-run"
+
+
+def nightly_jobs(today: date) -> list:
+    """(label, refresh, kwargs) for every snapshot of the night."""
+    from tools.daily_ops import reconcile_sap_vs_es_sales
+    from tools.reports import get_general_commission_report
+    from tools.shipments import get_shipment_report
+
+    yesterday = (today - timedelta(days=1)).isoformat()
+    month_start = (today - timedelta(days=1)).replace(day=1).isoformat()
+    return [
+        ("SAP vs ES reconciliation, yesterday", reconcile_sap_vs_es_sales.refresh,
+         {"start_date": yesterday, "end_date": yesterday}),
+        ("Commission report, yesterday", get_general_commission_report.refresh,
+         {"start_date": yesterday, "end_date": yesterday}),
+        ("Commission report, month to date", get_general_commission_report.refresh,
+         {"start_date": month_start, "end_date": yesterday}),
+        ("Shipment report, overdue", get_shipment_report.refresh, {"date_query": "overdue"}),
+    ]
+
+
+def run_nightly(today: date = None, force: bool = False) -> bool:
+    """Refreshes every nightly snapshot; returns False when one of them failed."""
+    today = today or date.today()
+    store = snapshots.get_snapshot_store()
+    marker_id = f"{MARKER_REPORT}-{today.isoformat()}"
+    if not force and store.load(marker_id):
+        print(f"Snapshots for {today} already computed, skipping.")
+        return True
+
+    ok = True
+    for label, refresh, kwargs in nightly_jobs(today):
+        start = time.perf_counter()
+        try:
+            result = refresh(**kwargs)
+        except Exception as e:
+            print(f"[scheduler] {label}: failed: {e}")
+            ok = False
+            continue
+        if isinstance(result, dict) and result.get("status") == "error":
+            print(f"[scheduler] {label}: not stored: {result.get('message')}")
+            ok = False
+            continue
+        print(f"[scheduler] {label}: stored in {time.perf_counter() - start:.1f}s")
+
+    if ok:
+        store.save(marker_id, {"report": MARKER_REPORT, "key": {"date": today.isoformat()},
+                               "created_at": time.time(), "result": None})
+    return ok
+
+
+def seconds_until(run_at: str, now: datetime = None) -> float:
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in run_at.split(":"))
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute nightly report snapshots")
+    parser.add_argument("--once", action="store_true", help="Run now and exit")
+    parser.add_argument("--at", default=RUN_AT, help="Time of the nightly run, HH:MM (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="Recompute even if today's run already completed")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        return 0 if run_nightly(force=args.force) else 1
+
+    # Catch up at start when the worker was down during the last scheduled run
+    run_nightly(force=args.force)
+    while True:
+        wait = seconds_until(args.at)
+        print(f"[scheduler] next run in {wait / 3600:.1f}h at {args.at}")
+        time.sleep(wait)
+        run_nightly()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
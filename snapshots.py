@@ -0,0 +1,193 @@
+# snapshots.py
+"""
+Precomputed report snapshots.
+
+Tools decorated with @serves_snapshot("name") first look for a snapshot stored under
+their normalized arguments and return it when it is fresh; otherwise they compute live
+as before. Snapshots are only written by the scheduler worker (scheduler.py), which
+calls fn.refresh(...) for yesterday's and month-to-date requests every night.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import inspect
+import functools
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Local snapshot directory used when no MongoDB is configured
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", ".snapshots"))
+# Snapshots older than this are ignored and the tool computes live
+SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("SNAPSHOT_MAX_AGE_HOURS", "24"))
+DATAFRAME_KEY = "$dataframe"
+# Results larger than this are kept in the report_snapshots GridFS bucket, not in the document
+INLINE_RESULT_BYTES = 4 * 1024 * 1024
+
+
+def _snapshot_id(report: str, key: dict) -> str:
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+    return f"{report}-{digest}"
+
+
+def _to_storable(result):
+    """Tools returning a DataFrame are stored as records and rebuilt on load."""
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(result, pd.DataFrame):
+        return {DATAFRAME_KEY: result.to_dict("records")}
+    return result
+
+
+def _from_storable(result):
+    if isinstance(result, dict) and DATAFRAME_KEY in result:
+        import pandas as pd
+        return pd.DataFrame(result[DATAFRAME_KEY])
+    return result
+
+
+class FileSnapshotStore:
+    """One JSON document per snapshot in a local directory."""
+    def __init__(self, directory: Path = SNAPSHOT_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, snapshot_id: str) -> Path:
+        return self.directory / f"{snapshot_id}.json"
+
+    def load(self, snapshot_id: str) -> dict | None:
+        path = self._path(snapshot_id)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, snapshot_id: str, snapshot: dict):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(snapshot_id).with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, default=str)
+            os.replace(tmp_path, self._path(snapshot_id))
+
+    def delete_report(self, report: str) -> int:
+        removed = 0
+        for path in self.directory.glob(f"{report}-*.json"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+class MongoSnapshotStore:
+    """
+    Stores snapshots in the report_snapshots collection. A result too large to keep in
+    the document (e.g. a busy day's reconciliation) goes to the GridFS bucket of the same
+    name and the document holds its file id.
+    """
+    bucket = "report_snapshots"
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.get_collection("report_snapshots")
+
+    def load(self, snapshot_id: str) -> dict | None:
+        doc = self.collection.find_one({"_id": snapshot_id})
+        if doc:
+            doc.pop("_id", None)
+            if "result_file" in doc:
+                from database import get_payload
+                doc["result"] = get_payload(self.db, self.bucket, doc.pop("result_file"))
+        return doc
+
+    def save(self, snapshot_id: str, snapshot: dict):
+        import bson
+        from database import put_payload, delete_payload
+        previous = self.collection.find_one({"_id": snapshot_id}, {"result_file": 1}) or {}
+        if len(bson.encode({"result": snapshot["result"]})) > INLINE_RESULT_BYTES:
+            # put_payload replaces the earlier file of this snapshot
+            snapshot = {**snapshot, "result": None,
+                        "result_file": put_payload(self.db, self.bucket, snapshot_id, snapshot["result"])}
+        elif previous.get("result_file"):
+            delete_payload(self.db, self.bucket, previous["result_file"])
+        self.collection.replace_one({"_id": snapshot_id}, snapshot, upsert=True)
+
+    def delete_report(self, report: str) -> int:
+        from database import delete_payload
+        for doc in self.collection.find({"report": report, "result_file": {"$exists": True}}, {"result_file": 1}):
+            delete_payload(self.db, self.bucket, doc["result_file"])
+        return self.collection.delete_many({"report": report}).deleted_count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    """Uses MongoDB when MONGO_URI is set and reachable, local files otherwise."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from database import get_shared_db
+            db = None
+            try:
+                db = get_shared_db()
+            except Exception as e:
+                print(f"Snapshot store falling back to local files: {e}")
+            _store = MongoSnapshotStore(db) if db is not None else FileSnapshotStore()
+        return _store
+
+
+def invalidate(report: str) -> int:
+    """Drops every snapshot of a report, e.g. after its source data was reloaded."""
+    return get_snapshot_store().delete_report(report)
+
+
+def serves_snapshot(report: str, key=None):
+    """
+    Serves the decorated tool from a fresh snapshot of the same normalized arguments.
+    key(**arguments) may normalize them further (e.g. add today's date for relative
+    queries such as 'overdue'). The decorated function gains .refresh(*args, **kwargs),
+    which computes live and stores the result as the new snapshot.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        def snapshot_key(args, kwargs) -> dict:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            return key(**arguments) if key else arguments
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                snapshot_id = _snapshot_id(report, snapshot_key(args, kwargs))
+                snapshot = get_snapshot_store().load(snapshot_id)
+            except Exception as e:
+                print(f"Snapshot lookup failed for {report}: {e}")
+                snapshot = None
+            if snapshot and time.time() - snapshot["created_at"] <= SNAPSHOT_MAX_AGE_HOURS * 3600:
+                result = _from_storable(snapshot["result"])
+                if isinstance(result, dict) and isinstance(result.get("message"), str):
+                    taken = datetime.fromtimestamp(snapshot["created_at"]).strftime("%Y-%m-%d %H:%M")
+                    result["message"] += f" (precomputed at {taken})"
+                print(f"Serving {report} from snapshot {snapshot_id}")
+                return result
+            return func(*args, **kwargs)
+
+        def refresh(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if isinstance(result, dict) and result.get("status") == "error":
+                return result  # keep the previous snapshot rather than storing a failure
+            key_values = snapshot_key(args, kwargs)
+            get_snapshot_store().save(_snapshot_id(report, key_values), {
+                "report": report, "key": key_values, "created_at": time.time(),
+                "result": _to_storable(result)
+            })
+            return result
+
+        wrapper.refresh = refresh
+        return wrapper
+    return decorate
@@ -0,0 +1,146 @@
+# startup_profiler.py
+"""
+Cold-start profiler for the Streamlit entry point.
+
+Records per-module import time (self and cumulative) and the time spent in named
+resource-initialization steps. It is off unless STARTUP_PROFILE=1, in which case
+main.py prints a report at the end of the first script run. It can also be run
+directly to profile a cold import of the app's modules:
+
+    python -m startup_profiler
+"""
+
+import os
+import sys
+import time
+import builtins
+import threading
+import contextlib
+
+ENABLED = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+# Modules listed in the printed report
+REPORT_TOP_MODULES = 25
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started_at = None
+        self.imports = {}   # module -> {"cumulative": s, "self": s}
+        self.steps = []     # (name, seconds)
+        self.reported = False
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # --- import timing ---
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                entry = self.imports.setdefault(name, {"cumulative": 0.0, "self": 0.0})
+                entry["cumulative"] += elapsed
+                entry["self"] += max(0.0, elapsed - children)
+
+    def start(self):
+        """Installs the import hook. Call before importing anything heavy."""
+        if self._original_import is not None:
+            return
+        self.started_at = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    # --- resource init timing ---
+    @contextlib.contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps.append((name, time.perf_counter() - start))
+
+    # --- reporting ---
+    def snapshot(self) -> dict:
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1]["cumulative"], reverse=True)
+            return {
+                "since_start": (time.perf_counter() - self.started_at) if self.started_at else 0.0,
+                "imports": [{"module": m, **t} for m, t in imports],
+                "steps": [{"step": n, "seconds": s} for n, s in self.steps]
+            }
+
+    def format_report(self, top: int = REPORT_TOP_MODULES) -> str:
+        data = self.snapshot()
+        lines = [f"=== Startup profile ({data['since_start'] * 1000:.0f} ms since profiler start) ==="]
+        lines.append(f"{'module':<45} {'cumulative ms':>14} {'self ms':>10}")
+        for entry in data["imports"][:top]:
+            lines.append(f"{entry['module']:<45} {entry['cumulative'] * 1000:>14.1f} {entry['self'] * 1000:>10.1f}")
+        if data["steps"]:
+            lines.append(f"{'resource init step':<45} {'ms':>14}")
+            for entry in data["steps"]:
+                lines.append(f"{entry['step']:<45} {entry['seconds'] * 1000:>14.1f}")
+        return "\n".join(lines)
+
+
+profiler = StartupProfiler()
+
+
+def start():
+    """Starts import profiling if STARTUP_PROFILE is enabled (once per process)."""
+    if ENABLED and not profiler.reported:
+        profiler.start()
+
+
+@contextlib.contextmanager
+def step(name: str):
+    """Times a resource-initialization step (no-op when profiling is disabled)."""
+    if not ENABLED:
+        yield
+        return
+    with profiler.step(name):
+        yield
+
+
+def report_once():
+    """Prints the report the first time it is called in this process."""
+    if not ENABLED or profiler.reported:
+        return
+    profiler.reported = True
+    profiler.stop()
+    print(profiler.format_report())
+
+
+if __name__ == "__main__":
+    # Profile a cold import of the modules main.py loads before the first paint
+    ENABLED = True
+    profiler.start()
+    with profiler.step("import app modules"):
+        import streamlit
+        import ui_components
+        import database
+        import app.auth
+        import app.chat_ui
+        import app.state
+    with profiler.step("MemoryManager()"):
+        database.MemoryManager()
+    with profiler.step("agent_logic.get_prompt()"):
+        import agent_logic
+        agent_logic.get_prompt()
+    report_once()
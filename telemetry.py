@@ -0,0 +1,263 @@
+# telemetry.py
+"""
+Process-wide performance telemetry: latency histograms per operation, LLM token
+counts, rows read and written, and error counts.
+
+Off unless TELEMETRY=1. When off, the decorators return the functions and classes
+they are given unchanged and the record_* helpers return at once, so instrumented
+code pays nothing. When on, the metrics can be exported as a Prometheus text file or a
+JSON snapshot (TELEMETRY_EXPORT_PATH writes both, at most every TELEMETRY_EXPORT_SECONDS)
+and are shown in the operator panel of the sidebar.
+"""
+
+import os
+import json
+import time
+import bisect
+import contextlib
+import functools
+import threading
+from pathlib import Path
+
+ENABLED = os.getenv("TELEMETRY", "").lower() in ("1", "true", "yes")
+# Base path of the exported files: <path>.prom and <path>.json
+EXPORT_PATH = os.getenv("TELEMETRY_EXPORT_PATH")
+EXPORT_SECONDS = float(os.getenv("TELEMETRY_EXPORT_SECONDS", "15"))
+# Latency bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+METRIC_PREFIX = "aipoc"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # last bucket is +Inf
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def quantile(self, q: float) -> float:
+        """Quantile estimated by interpolating inside the bucket it falls in."""
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else BUCKETS_MS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return float(BUCKETS_MS[-1])
+
+
+class Registry:
+    """Histograms and counters keyed by (operation, name)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}   # (kind, name) -> Histogram
+        self.counters = {}  # (metric, kind, name) -> int
+        self.started_at = time.time()
+        self._last_export = 0.0
+
+    def observe(self, kind: str, name: str, ms: float, error: bool = False):
+        with self.lock:
+            histogram = self.latency.get((kind, name))
+            if histogram is None:
+                histogram = self.latency[(kind, name)] = Histogram()
+            histogram.observe(ms)
+            if error:
+                self._add("errors", kind, name, 1)
+        if EXPORT_PATH and time.monotonic() - self._last_export > EXPORT_SECONDS:
+            self._last_export = time.monotonic()
+            export_files(EXPORT_PATH)
+
+    def _add(self, metric: str, kind: str, name: str, value: int):
+        key = (metric, kind, name)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, metric: str, kind: str, name: str, value: int):
+        if value:
+            with self.lock:
+                self._add(metric, kind, name, value)
+
+    def reset(self):
+        with self.lock:
+            self.latency.clear()
+            self.counters.clear()
+            self.started_at = time.time()
+
+
+registry = Registry()
+
+
+def count_rows(result) -> int:
+    """Rows in a result: list length, or the list-valued entries of a tool result's details."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        inner = result.get("result", result)
+        details = inner.get("details") if isinstance(inner, dict) else None
+        if isinstance(details, dict):
+            return sum(len(v) for v in details.values() if isinstance(v, list))
+    return 0
+
+
+def instrument(kind: str, name: str = None, label=None, is_error=None, rows_read=None, rows_written=None):
+    """
+    Times every call of the decorated function under (kind, name). label(*args, **kwargs)
+    may name the call instead (e.g. the tool being executed); is_error(result) flags
+    errors reported in the return value; rows_read / rows_written(result) count rows.
+    Returns the function unchanged when telemetry is off.
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+        default_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call_name = (label(*args, **kwargs) if label else None) or default_name
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                registry.observe(kind, call_name, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            ms = (time.perf_counter() - start) * 1000
+            error = bool(is_error and is_error(result))
+            registry.observe(kind, call_name, ms, error=error)
+            if rows_read:
+                registry.add("rows_read", kind, call_name, rows_read(result))
+            if rows_written:
+                registry.add("rows_written", kind, call_name, rows_written(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def instrument_methods(kind: str, rows_read: dict = None, rows_written: dict = None):
+    """Class decorator instrumenting every public method; rows_* map method names to row counters."""
+    def decorate(cls):
+        if not ENABLED:
+            return cls
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or not callable(value):
+                continue
+            setattr(cls, attr, instrument(
+                kind, attr,
+                rows_read=(rows_read or {}).get(attr),
+                rows_written=(rows_written or {}).get(attr)
+            )(value))
+        return cls
+    return decorate
+
+
+class _Timer:
+    def __init__(self, kind: str, name: str):
+        self.kind, self.name = kind, name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe(self.kind, self.name, (time.perf_counter() - self.start) * 1000, error=exc_type is not None)
+        return False
+
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def timed(kind: str, name: str):
+    """Context manager timing a block under (kind, name)."""
+    return _Timer(kind, name) if ENABLED else _NO_TIMER
+
+
+def record_llm_usage(response, model: str = "planner"):
+    """Prompt and completion tokens of a chat model response (usage_metadata or token_usage)."""
+    if not ENABLED:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    if not usage:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        usage = {"input_tokens": token_usage.get("prompt_tokens", 0),
+                 "output_tokens": token_usage.get("completion_tokens", 0)}
+    registry.add("llm_prompt_tokens", "llm", model, int(usage.get("input_tokens") or 0))
+    registry.add("llm_completion_tokens", "llm", model, int(usage.get("output_tokens") or 0))
+
+
+def record_rows(kind: str, name: str, read: int = 0, written: int = 0):
+    if not ENABLED:
+        return
+    registry.add("rows_read", kind, name, read)
+    registry.add("rows_written", kind, name, written)
+
+
+# --- Export ---
+
+def snapshot() -> dict:
+    """JSON-friendly view: per-operation latency summary and all counters."""
+    with registry.lock:
+        operations = []
+        for (kind, name), h in sorted(registry.latency.items()):
+            operations.append({
+                "kind": kind, "name": name, "calls": h.total,
+                "errors": registry.counters.get(("errors", kind, name), 0),
+                "mean_ms": round(h.sum_ms / h.total, 2) if h.total else 0.0,
+                "p50_ms": round(h.quantile(0.5), 2), "p95_ms": round(h.quantile(0.95), 2),
+                "p99_ms": round(h.quantile(0.99), 2),
+                "rows_read": registry.counters.get(("rows_read", kind, name), 0),
+                "rows_written": registry.counters.get(("rows_written", kind, name), 0),
+                "buckets": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], h.counts)),
+            })
+        counters = [{"metric": m, "kind": k, "name": n, "value": v} for (m, k, n), v in sorted(registry.counters.items())]
+    return {"enabled": ENABLED, "started_at": registry.started_at, "captured_at": time.time(),
+            "operations": operations, "counters": counters}
+
+
+def _labels(kind: str, name: str) -> str:
+    name = str(name).replace("\\", "\\\\").replace('"', '\\"')
+    return f'kind="{kind}",name="{name}"'
+
+
+def prometheus_text() -> str:
+    """Prometheus text exposition format (for the node_exporter textfile collector or a scrape)."""
+    lines = [f"# HELP {METRIC_PREFIX}_latency_ms Latency of instrumented operations in milliseconds",
+             f"# TYPE {METRIC_PREFIX}_latency_ms histogram"]
+    with registry.lock:
+        for (kind, name), h in sorted(registry.latency.items()):
+            labels = _labels(kind, name)
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS_MS) + ["+Inf"], h.counts):
+                cumulative += count
+                lines.append(f'{METRIC_PREFIX}_latency_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{METRIC_PREFIX}_latency_ms_sum{{{labels}}} {h.sum_ms:.3f}")
+            lines.append(f"{METRIC_PREFIX}_latency_ms_count{{{labels}}} {h.total}")
+        by_metric = {}
+        for (metric, kind, name), value in sorted(registry.counters.items()):
+            by_metric.setdefault(metric, []).append(f"{METRIC_PREFIX}_{metric}_total{{{_labels(kind, name)}}} {value}")
+    for metric, samples in by_metric.items():
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric}_total counter")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def export_files(base_path: str):
+    """Writes <base>.prom and <base>.json."""
+    base = Path(base_path)
+    base.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        _write_atomic(base.with_name(base.name + ".prom"), prometheus_text())
+        _write_atomic(base.with_name(base.name + ".json"), json.dumps(snapshot(), indent=2))
+    except OSError as e:
+        print(f"Telemetry export failed: {e}")
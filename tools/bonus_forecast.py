@@ -0,0 +1,281 @@
+# tools/bonus_forecast.py
+
+import os
+import time
+import calendar
+import threading
+from datetime import datetime, date
+import numpy as np
+from jobs import report_progress
+from ingest import ingest_generation
+
+# Sponsor tree: one document per distributor with its sponsor (upline) id
+SPONSOR_COLLECTION = os.getenv("SPONSOR_COLLECTION", "distributors")
+SPONSOR_ID_FIELD = "Distributor id"
+SPONSOR_PARENT_FIELD = "Sponsor id"
+# Sales feeding personal volume (field names as stored by ES)
+SALES_COLLECTION = os.getenv("FORECAST_SALES_COLLECTION", "es")
+SALES_DISTRIBUTOR_FIELD = "Distribtutor id"
+SALES_AMOUNT_FIELD = "Amount"
+SALES_DATE_FIELD = "Sale date"
+# Month-end group volume needed per rank, highest first
+RANK_LADDER = [("6A", 100000), ("5A", 50000), ("4A", 25000), ("3A", 10000), ("2A", 5000), ("1A", 1000)]
+SIX_A_BONUS_RATE = float(os.getenv("SIX_A_BONUS_RATE", "0.02"))
+# The sponsor tree is reloaded after this long, or when distributors were added
+TREE_REFRESH_SECONDS = int(os.getenv("FORECAST_TREE_REFRESH_SECONDS", "3600"))
+# Candidates listed in the forecast result
+TOP_CANDIDATES = 25
+
+
+def _id_array(values) -> np.ndarray:
+    """Distributor ids as int64 when they are all numeric, as strings otherwise."""
+    values = list(values)
+    try:
+        return np.array([int(v) for v in values], dtype=np.int64)
+    except (TypeError, ValueError):
+        return np.array([str(v) for v in values])
+
+
+class DownlineTree:
+    """
+    Sponsor tree held as flat arrays: sorted ids, the parent index of every node (-1 for
+    roots) and the nodes grouped by depth, so roll-ups are one vectorized step per level.
+    """
+    def __init__(self, ids, sponsor_ids):
+        ids = _id_array(ids)
+        sponsor_ids = _id_array(sponsor_ids)
+        if ids.dtype != sponsor_ids.dtype:
+            ids, sponsor_ids = ids.astype(str), sponsor_ids.astype(str)
+        order = np.argsort(ids, kind="stable")
+        self.ids = ids[order]
+        self.parent = self.index_of(sponsor_ids[order])
+        self.parent[self.parent == np.arange(len(self.ids))] = -1  # self-sponsored roots
+        self.depth = self._depths(self.parent)
+        # Node indexes sorted by depth, deepest level first, with the level boundaries
+        self.by_depth = np.argsort(-self.depth, kind="stable")
+        depths = self.depth[self.by_depth]
+        self.level_starts = np.flatnonzero(np.r_[True, depths[1:] != depths[:-1]])
+        self.level_ends = np.r_[self.level_starts[1:], len(depths)]
+        self.max_depth = int(depths[0]) if len(depths) else 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, keys) -> np.ndarray:
+        """Node index of each id, -1 for ids not in the tree."""
+        keys = np.asarray(keys)
+        if keys.dtype != self.ids.dtype:
+            try:
+                keys = keys.astype(self.ids.dtype)
+            except (TypeError, ValueError):
+                return np.full(len(keys), -1, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.searchsorted(self.ids, keys)
+        idx = np.minimum(idx, len(self.ids) - 1)
+        return np.where(self.ids[idx] == keys, idx, -1).astype(np.int64)
+
+    @staticmethod
+    def _depths(parent: np.ndarray) -> np.ndarray:
+        """Depth of every node by pointer jumping: O(n log depth), no recursion."""
+        depth = (parent >= 0).astype(np.int64)
+        ancestor = parent.copy()
+        for _ in range(64):
+            has = ancestor >= 0
+            if not has.any():
+                break
+            depth[has] += depth[ancestor[has]]
+            ancestor[has] = ancestor[ancestor[has]]
+        else:
+            raise ValueError("Sponsor tree contains a cycle")
+        return depth
+
+    def rollup(self, personal: np.ndarray) -> np.ndarray:
+        """Group volume (own plus whole downline) of every node, one bottom-up pass per level."""
+        group = personal.astype(np.float64, copy=True)
+        for start, end in zip(self.level_starts, self.level_ends):
+            nodes = self.by_depth[start:end]
+            parents = self.parent[nodes]
+            keep = parents >= 0
+            if keep.any():
+                np.add.at(group, parents[keep], group[nodes[keep]])
+        return group
+
+    def prefers_incremental(self, new_nodes: int) -> bool:
+        """Walking the uplines of a few new sales beats a full pass; many sales on a deep tree do not."""
+        return new_nodes * (self.max_depth + 1) < len(self.ids)
+
+    def add_to_ancestors(self, group: np.ndarray, nodes: np.ndarray, amounts: np.ndarray):
+        """Adds new volume to the nodes and all their uplines in place, one step per level."""
+        nodes, amounts = nodes[nodes >= 0], amounts[nodes >= 0]
+        while len(nodes):
+            np.add.at(group, nodes, amounts)
+            nodes = self.parent[nodes]
+            keep = nodes >= 0
+            nodes, amounts = nodes[keep], amounts[keep]
+
+
+class BonusForecastEngine:
+    """
+    Keeps the sponsor tree and this month's volumes in memory between requests; new
+    sales since the last request are folded in incrementally. A load that rewrote
+    existing sales (a new ingest generation) triggers a full rebuild of the month.
+    """
+    def __init__(self):
+        self.tree = None
+        self.tree_loaded_at = 0.0
+        self.tree_size_in_db = 0
+        self.month = None
+        self.personal = None
+        self.group = None
+        self.watermark = None  # _id of the last sale folded in
+        self.sales_generation = None  # ingest generation the volumes were built from
+        self.lock = threading.Lock()
+
+    # --- loading ---
+    def _load_tree(self, db):
+        report_progress(0.1, "Loading sponsor tree")
+        cursor = db[SPONSOR_COLLECTION].find({}, {"_id": 0, SPONSOR_ID_FIELD: 1, SPONSOR_PARENT_FIELD: 1},
+                                            batch_size=10000)
+        ids, sponsors = [], []
+        for doc in cursor:
+            ids.append(doc.get(SPONSOR_ID_FIELD))
+            sponsors.append(doc.get(SPONSOR_PARENT_FIELD) or -1)
+        self.tree = DownlineTree(ids, sponsors)
+        self.tree_loaded_at = time.monotonic()
+        self.tree_size_in_db = len(ids)
+        self.month = None  # volumes are indexed by node, so rebuild them too
+
+    def _sales_arrays(self, rows: list) -> tuple:
+        """Node indexes and volumes of grouped sales rows."""
+        keys = _id_array(row["_id"] for row in rows)
+        amounts = np.array([row["volume"] for row in rows], dtype=np.float64)
+        return self.tree.index_of(keys), amounts
+
+    def _load_month(self, db, month_start: datetime):
+        report_progress(0.4, "Rolling up this month's volume")
+        sales = db[SALES_COLLECTION]
+        last = sales.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        self.watermark = last["_id"] if last else None
+        match = {SALES_DATE_FIELD: {"$gte": month_start}}
+        if self.watermark is not None:
+            match["_id"] = {"$lte": self.watermark}
+        rows = list(sales.aggregate([
+            {"$match": match},
+            {"$group": {"_id": f"${SALES_DISTRIBUTOR_FIELD}", "volume": {"$sum": f"${SALES_AMOUNT_FIELD}"}}}
+        ]))
+        self.personal = np.zeros(len(self.tree), dtype=np.float64)
+        if rows:
+            nodes, amounts = self._sales_arrays(rows)
+            known = nodes >= 0
+            np.add.at(self.personal, nodes[known], amounts[known])
+        self.group = self.tree.rollup(self.personal)
+        self.month = (month_start.year, month_start.month)
+
+    def _fold_in_new_sales(self, db, month_start: datetime) -> int:
+        if self.watermark is None:
+            match = {SALES_DATE_FIELD: {"$gte": month_start}}
+        else:
+            match = {SALES_DATE_FIELD: {"$gte": month_start}, "_id": {"$gt": self.watermark}}
+        sales = db[SALES_COLLECTION]
+        last = sales.find_one(match, {"_id": 1}, sort=[("_id", -1)])
+        if last is None:
+            return 0
+        match["_id"] = {**match.get("_id", {}), "$lte": last["_id"]}
+        rows = list(sales.aggregate([
+            {"$match": match},
+            {"$group": {"_id": f"${SALES_DISTRIBUTOR_FIELD}", "volume": {"$sum": f"${SALES_AMOUNT_FIELD}"}}}
+        ]))
+        self.watermark = last["_id"]
+        if rows:
+            nodes, amounts = self._sales_arrays(rows)
+            known = nodes >= 0
+            np.add.at(self.personal, nodes[known], amounts[known])
+            if self.tree.prefers_incremental(int(known.sum())):
+                self.tree.add_to_ancestors(self.group, nodes, amounts)
+            else:
+                self.group = self.tree.rollup(self.personal)
+        return len(rows)
+
+    def refresh(self, db, today: date) -> dict:
+        """Brings the tree and volumes up to date; returns what had to be done."""
+        month_start = datetime(today.year, today.month, 1)
+        done = {"tree_reloaded": False, "month_reloaded": False, "sales_rewritten": False, "distributors_updated": 0}
+        stale_tree = (self.tree is None or time.monotonic() - self.tree_loaded_at > TREE_REFRESH_SECONDS
+                      or db[SPONSOR_COLLECTION].estimated_document_count() != self.tree_size_in_db)
+        if stale_tree:
+            self._load_tree(db)
+            done["tree_reloaded"] = True
+        # Read before loading, so a rewrite during the load triggers another rebuild
+        generation = ingest_generation(db, SALES_COLLECTION)
+        done["sales_rewritten"] = self.sales_generation is not None and generation != self.sales_generation
+        if self.month != (today.year, today.month) or done["sales_rewritten"]:
+            self._load_month(db, month_start)
+            self.sales_generation = generation
+            done["month_reloaded"] = True
+        else:
+            done["distributors_updated"] = self._fold_in_new_sales(db, month_start)
+        return done
+
+    # --- forecast ---
+    def forecast(self, today: date) -> dict:
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        # Straight-line projection of the month-to-date run rate
+        projected = self.group * (days_in_month / today.day)
+        thresholds = np.array([threshold for _, threshold in RANK_LADDER], dtype=np.float64)
+        six_a = thresholds[0]
+
+        qualified = self.group >= six_a
+        on_track = (projected >= six_a) & ~qualified
+        rank_counts = {}
+        remaining = np.ones(len(projected), dtype=bool)
+        for rank, threshold in RANK_LADDER:
+            at_rank = remaining & (projected >= threshold)
+            rank_counts[rank] = int(at_rank.sum())
+            remaining &= ~at_rank
+
+        accrual = float(projected[qualified | on_track].sum() * SIX_A_BONUS_RATE)
+        candidates = np.flatnonzero(qualified | on_track)
+        top = candidates[np.argsort(-projected[candidates], kind="stable")[:TOP_CANDIDATES]]
+        return {
+            "month_progress": round(today.day / days_in_month, 3),
+            "distributors": len(self.tree),
+            "qualified_6a": int(qualified.sum()),
+            "on_track_6a": int(on_track.sum()),
+            "projected_rank_counts": rank_counts,
+            "expected_bonus_accrual": round(accrual, 2),
+            "candidates": [{
+                "Distributor ID": self.tree.ids[i].item(),
+                "Personal Volume": round(float(self.personal[i]), 2),
+                "Group Volume": round(float(self.group[i]), 2),
+                "Projected Group Volume": round(float(projected[i]), 2),
+                "Status": "Qualified" if qualified[i] else "On track"
+            } for i in top]
+        }
+
+
+_engine = BonusForecastEngine()
+
+
+def get_6a_bonus_forecast() -> dict:
+    """Shows how many distributors are on track for 6A this month and the expected bonus accrual."""
+    print("Executing get_6a_bonus_forecast.")
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+    today = date.today()
+    try:
+        start = time.perf_counter()
+        with _engine.lock:
+            refreshed = _engine.refresh(db, today)
+            details = _engine.forecast(today)
+        details["refresh"] = refreshed
+        details["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while forecasting 6A bonus: {e}", "details": None}
+
+    message = (f"Forecast: {details['qualified_6a'] + details['on_track_6a']} distributors are on track for 6A status "
+               f"({details['qualified_6a']} already qualified). "
+               f"Expected bonus accrual is ${details['expected_bonus_accrual']:,.0f}.")
+    return {"status": "success", "message": message, "details": details}
@@ -3,8 +3,9 @@
 import re
 from datetime import datetime, timedelta
 import streamlit as st
-import pandas as pd
 from database import MongoManager
+from jobs import report_progress
+from snapshots import serves_snapshot
 
 def recover_sap_commission(order_id: str, reason: str) -> dict:
     """Recovers commission from SAP for a specific cancelled order ID and reason."""
@@ -12,6 +13,7 @@ def recover_sap_commission(order_id: str, reason: str) -> dict:
     return {"status": "success", "message": f"Commission for cancelled order {order_id} is being recovered from SAP."}
 
 
+@serves_snapshot("reconcile_sap_vs_es_sales")
 def reconcile_sap_vs_es_sales(start_date: str, end_date: str) -> dict:
     try:
         start_dt = datetime.strptime(start_date, "%Y-%m-%d")
@@ -61,7 +63,10 @@ def reconcile_sap_vs_es_sales(start_date: str, end_date: str) -> dict:
             return str(record.get("Buyer id", ""))
         
         # Process ES records
-        for es_record in es_records:
+        report_progress(0.0, f"Matching {len(es_records)} ES records against SAP")
+        for i, es_record in enumerate(es_records):
+            if i and i % 500 == 0:
+                report_progress(i / len(es_records), f"Matched {i} of {len(es_records)} ES records")
             # Find matching SAP record
             matching_sap = next(
                 (sap for sap in sap_records 
@@ -123,33 +128,11 @@ def reconcile_sap_vs_es_sales(start_date: str, end_date: str) -> dict:
             "details": None
         }
 
-def remove_payment_block(records: list) -> dict:
-    """Function to handle payment block removal via SAP API"""
-    # TODO: Implement actual SAP API call
-    print(f"Executing remove_payment_block for {len(records)} records")
-    return {
-        "status": "success",
-        "message": f"Successfully removed payment block for {len(records)} records from SAP",
-        "details": {
-            "processed_records": len(records)
-        }
-    }
-
-def check_recovery_status() -> dict:
-    """Checks if today's order cancellations are fully recovered in payment."""
-    print("Executing check_recovery_status for today.")
-    return {"status": "success", "message": "All of today's cancelled orders have been fully recovered in the payment systems."}
-
 def process_sales_payment(sales_date: str) -> dict:
     """Makes payment for a specific sales date."""
     print(f"Executing process_sales_payment for date: {sales_date}")
     return {"status": "success", "message": f"Payments for sales on {sales_date} are being processed."}
 
-def issue_payment(payment_method: str, recipient: str, amount: float) -> dict:
-    """Transfers payment via bank or prints a check for a recipient and amount."""
-    print(f"Executing issue_payment for {recipient} via {payment_method}")
-    return {"status": "success", "message": f"A payment of {amount} has been issued to {recipient} via {payment_method}."}
-
 def update_es_payment_result(file_name: str) -> dict:
     """Updates payment results in the ES system from a given file."""
     print(f"Executing update_es_payment_result with file: {file_name}")
@@ -0,0 +1,99 @@
+# tools/daily_pipeline.py
+
+from datetime import datetime
+from pipeline import Pipeline, Step, PipelineStepError, get_checkpoint_store
+from tools.daily_ops import (
+    recover_canceled_orders, reconcile_sap_vs_es_sales,
+    process_sales_payment, update_es_payment_result
+)
+from tools.recovery import check_recovery_status
+from tools.payment_files import generate_payment_files
+
+# --- Step adapters: each receives the run params and the results of its dependencies ---
+
+def _recover_commission(params: dict, deps: dict) -> dict:
+    return recover_canceled_orders()
+
+def _reconcile(params: dict, deps: dict) -> dict:
+    sales_date = params["sales_date"]
+    return reconcile_sap_vs_es_sales(sales_date, sales_date)
+
+def _check_recovery(params: dict, deps: dict) -> dict:
+    return check_recovery_status(params["sales_date"], params["sales_date"])
+
+def _process_payment(params: dict, deps: dict) -> dict:
+    details = deps["reconcile"].get("details") or {}
+    if details.get("total_unmatched"):
+        raise PipelineStepError(
+            f"{details['total_unmatched']} records have unmatched SAP/ES amounts. "
+            "Resolve them before paying this sales date."
+        )
+    return process_sales_payment(params["sales_date"])
+
+def _bank_file(params: dict, deps: dict) -> dict:
+    result = generate_payment_files(params["sales_date"])
+    if result["status"] == "success":
+        # ES is updated from the manifest, which lists every bank file and cheque batch
+        result["file_name"] = result["details"]["manifest_file"]
+    return result
+
+def _es_update(params: dict, deps: dict) -> dict:
+    return update_es_payment_result(deps["bank_file"]["file_name"])
+
+def _summary(params: dict, deps: dict) -> dict:
+    details = deps["reconcile"].get("details") or {}
+    return {
+        "status": "success",
+        "message": f"Daily operations completed for sales date {params['sales_date']}.",
+        "sales_date": params["sales_date"],
+        "payment_block_records": details.get("total_payment_block", 0),
+        "bank_file": deps["bank_file"].get("file_name"),
+        "recovery": deps["check_recovery"].get("message")
+    }
+
+DAILY_STEPS = [
+    Step("recover_commission", _recover_commission, label="1. Recover SAP commission for cancelled orders"),
+    Step("reconcile", _reconcile, label="2. Reconcile SAP vs ES"),
+    Step("check_recovery", _check_recovery, ["recover_commission"], label="3. Check commission recovery status"),
+    Step("process_payment", _process_payment, ["reconcile", "check_recovery"], label="4. Execute SAP payment"),
+    Step("bank_file", _bank_file, ["process_payment"], label="5. Create bank transfer file"),
+    Step("es_update", _es_update, ["bank_file"], label="6. Update SAP payment at ES"),
+    Step("summary", _summary, ["es_update", "bank_file", "reconcile", "check_recovery"], label="7. Summary of commission payments"),
+]
+
+
+def execute_daily_pipeline(sales_date: str) -> dict:
+    """Executes daily steps 1-7 for a sales date, resuming from the last good step of a previous run."""
+    try:
+        datetime.strptime(sales_date, "%Y-%m-%d")
+    except ValueError:
+        return {"status": "error", "message": "Invalid date format. Please use YYYY-MM-DD format.", "details": None}
+
+    print(f"Executing execute_daily_pipeline for sales date: {sales_date}")
+    pipeline = Pipeline("daily_ops", DAILY_STEPS, store=get_checkpoint_store())
+    checkpoint = pipeline.run(f"daily_ops-{sales_date}", {"sales_date": sales_date})
+
+    steps = []
+    for step in DAILY_STEPS:
+        entry = checkpoint["steps"].get(step.name, {})
+        result = entry.get("result")
+        message = entry.get("error") or (result.get("message") if isinstance(result, dict) else "")
+        steps.append({
+            "Step": step.label,
+            "Status": entry.get("status", "pending"),
+            "Duration (s)": entry.get("duration"),
+            "Message": message or ""
+        })
+
+    if checkpoint["status"] == "completed":
+        message = checkpoint["steps"]["summary"]["result"]["message"]
+        status = "success"
+    else:
+        failed = [s["Step"] for s in steps if s["Status"] == "failed"]
+        message = f"Daily operations stopped at: {', '.join(failed) or 'unknown step'}. Run again to resume from the last good step."
+        status = "error"
+    return {
+        "status": status,
+        "message": message,
+        "details": {"sales_date": sales_date, "resumed": checkpoint.get("resumed", False), "steps": steps}
+    }
@@ -0,0 +1,283 @@
+# tools/ic_matching.py
+
+import os
+import time
+from bisect import bisect_left, bisect_right
+from jobs import report_progress
+
+# Open intercompany payment instructions and the debit notes they settle
+IC_PAYMENTS_COLLECTION = os.getenv("IC_PAYMENTS_COLLECTION", "ic_payments")
+IC_DEBIT_NOTES_COLLECTION = os.getenv("IC_DEBIT_NOTES_COLLECTION", "ic_debit_notes")
+# FX rounding tolerance: the larger of an absolute amount and a share of the amount
+TOLERANCE_ABS = float(os.getenv("IC_TOLERANCE_ABS", "1.00"))
+TOLERANCE_PCT = float(os.getenv("IC_TOLERANCE_PCT", "0.0005"))
+# Split/combined payments: at most this many items, drawn from this many nearest candidates
+MAX_SPLIT = 4
+SPLIT_WINDOW = 20
+
+
+def _cents(amount) -> int:
+    return int(round(float(amount) * 100))
+
+
+def _tolerance(cents: int, tolerance_abs: float, tolerance_pct: float) -> int:
+    return max(_cents(tolerance_abs), int(abs(cents) * tolerance_pct))
+
+
+def _find(parent: list, i: int) -> int:
+    """Root of i in a skip array, compressing the path walked."""
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+class _SortedSide:
+    """
+    Open items of one (counterparty, currency) group sorted by amount, with binary-search
+    windows over the amounts. Matched items are skipped through two skip arrays (union-find
+    with path compression), so runs of equal amounts cost amortized O(1) per lookup.
+    """
+    def __init__(self, items: list):
+        self.items = sorted(items, key=lambda item: item["cents"])
+        self.amounts = [item["cents"] for item in self.items]
+        self.used = [False] * len(self.items)
+        # _next[i]: first open index >= i (len = none); _prev[i + 1]: last open index <= i, plus one (0 = none)
+        self._next = list(range(len(self.items) + 1))
+        self._prev = list(range(len(self.items) + 1))
+
+    def next_open(self, i: int) -> int:
+        return _find(self._next, i)
+
+    def prev_open(self, i: int) -> int:
+        return _find(self._prev, i + 1) - 1
+
+    def closest(self, target: int, tolerance: int):
+        """Open item nearest to target within the tolerance window, or None."""
+        lo = bisect_left(self.amounts, target - tolerance)
+        hi = bisect_right(self.amounts, target + tolerance)
+        at = bisect_left(self.amounts, target, lo, hi)
+        # The nearest open item is the last open one below target or the first at or above it
+        below, above = self.prev_open(at - 1), self.next_open(at)
+        best, best_diff = None, None
+        for i in (below, above):
+            if lo <= i < hi:
+                diff = abs(self.amounts[i] - target)
+                if best is None or diff < best_diff:
+                    best, best_diff = i, diff
+        return best
+
+    def subset(self, target: int, tolerance: int, max_items: int, window: int):
+        """
+        Indexes of 2..max_items open items summing to target within tolerance, searched
+        among the `window` largest open items not above target + tolerance.
+        """
+        hi = bisect_right(self.amounts, target + tolerance)
+        candidates = []
+        i = self.prev_open(hi - 1)
+        while i >= 0 and len(candidates) < window and self.amounts[i] > 0:
+            candidates.append(i)
+            i = self.prev_open(i - 1)
+        if len(candidates) < 2:
+            return None
+        values = [self.amounts[i] for i in candidates]  # descending
+        best = None
+
+        def search(start, chosen, total):
+            nonlocal best
+            if len(chosen) >= 2 and abs(total - target) <= tolerance:
+                best = list(chosen)
+                return True
+            if len(chosen) == max_items:
+                return False
+            slots = max_items - len(chosen)
+            for k in range(start, len(values)):
+                if total + values[k] > target + tolerance:
+                    continue
+                # values are descending: if the largest remaining ones fall short, so will the rest
+                if total + sum(values[k:k + slots]) < target - tolerance:
+                    break
+                chosen.append(candidates[k])
+                if search(k + 1, chosen, total + values[k]):
+                    return True
+                chosen.pop()
+            return False
+
+        search(0, [], 0)
+        return best
+
+    def take(self, indexes):
+        for i in indexes:
+            self.used[i] = True
+            self._next[i] = i + 1
+            self._prev[i + 1] = i
+        return [self.items[i] for i in indexes]
+
+    def open_items(self):
+        return [item for item, used in zip(self.items, self.used) if not used]
+
+
+def _group(items: list) -> dict:
+    groups = {}
+    for item in items:
+        groups.setdefault((item["counterparty"], item["currency"]), []).append(item)
+    return groups
+
+
+def _normalize(records: list, id_field: str) -> list:
+    return [{
+        "id": str(r.get(id_field) or r.get("_id")),
+        "counterparty": str(r.get("counterparty", "")),
+        "currency": str(r.get("currency", "")).upper(),
+        "cents": _cents(r.get("amount", 0)),
+        "reference": str(r.get("reference") or ""),
+    } for r in records]
+
+
+def _match_row(match_type: str, payments: list, notes: list) -> dict:
+    paid = sum(p["cents"] for p in payments)
+    billed = sum(n["cents"] for n in notes)
+    return {
+        "Match Type": match_type,
+        "Counterparty": (payments or notes)[0]["counterparty"],
+        "Currency": (payments or notes)[0]["currency"],
+        "Payment IDs": ", ".join(p["id"] for p in payments),
+        "Debit Note IDs": ", ".join(n["id"] for n in notes),
+        "Paid": paid / 100,
+        "Billed": billed / 100,
+        "Difference": (paid - billed) / 100,
+    }
+
+
+def match_intercompany_payments(payments: list, notes: list, tolerance_abs: float = TOLERANCE_ABS,
+                                tolerance_pct: float = TOLERANCE_PCT, max_split: int = MAX_SPLIT,
+                                window: int = SPLIT_WINDOW) -> dict:
+    """
+    Matches payment instructions to debit notes per (counterparty, currency), without
+    comparing every pair:
+      1. a payment quoting a note number settles that note when the amounts agree within tolerance;
+      2. one payment, one note: nearest note amount in a binary-search tolerance window;
+      3. one payment for several notes, then several payments for one note: bounded subset sum;
+      4. a payment quoting a note it does not fully settle is a partial payment of it.
+    Returns matched rows, open items and counts.
+    """
+    payments = _normalize(payments, "payment_id")
+    notes = _normalize(notes, "note_id")
+    matched = []
+    note_groups = {key: _SortedSide(items) for key, items in _group(notes).items()}
+    payment_groups = _group(payments)
+    notes_by_id = {}
+    for key, side in note_groups.items():
+        for i, item in enumerate(side.items):
+            notes_by_id[item["id"]] = (side, i)
+
+    def tolerance_for(cents):
+        return _tolerance(cents, tolerance_abs, tolerance_pct)
+
+    open_payments = {}
+    total_groups = max(1, len(payment_groups))
+    for done, (key, group_payments) in enumerate(payment_groups.items()):
+        side = note_groups.get(key)
+        remaining = []
+        # 1. quoted note number
+        for payment in group_payments:
+            ref = notes_by_id.get(payment["reference"])
+            if side is not None and ref and ref[0] is side and not side.used[ref[1]] \
+                    and abs(side.amounts[ref[1]] - payment["cents"]) <= tolerance_for(payment["cents"]):
+                matched.append(_match_row("reference", [payment], side.take([ref[1]])))
+            else:
+                remaining.append(payment)
+        # 2. nearest amount within tolerance, largest payments first
+        unmatched = []
+        for payment in sorted(remaining, key=lambda p: -p["cents"]):
+            i = side.closest(payment["cents"], tolerance_for(payment["cents"])) if side is not None else None
+            if i is None:
+                unmatched.append(payment)
+                continue
+            match_type = "exact" if side.amounts[i] == payment["cents"] else "tolerance"
+            matched.append(_match_row(match_type, [payment], side.take([i])))
+        # 3a. one payment settling several notes
+        still_open = []
+        for payment in unmatched:
+            found = side.subset(payment["cents"], tolerance_for(payment["cents"]), max_split, window) if side else None
+            if found:
+                matched.append(_match_row("split", [payment], side.take(found)))
+            else:
+                still_open.append(payment)
+        open_payments[key] = still_open
+        report_progress((done + 1) / total_groups * 0.8, f"Matched {done + 1} of {total_groups} counterparty groups")
+
+    # 3b. several payments settling one note
+    for key, side in note_groups.items():
+        pay_side = _SortedSide(open_payments.get(key, []))
+        if len(pay_side.items) < 2:
+            continue
+        for i in range(len(side.items) - 1, -1, -1):
+            if side.used[i]:
+                continue
+            found = pay_side.subset(side.amounts[i], tolerance_for(side.amounts[i]), max_split, window)
+            if found:
+                matched.append(_match_row("combined", pay_side.take(found), side.take([i])))
+        open_payments[key] = pay_side.open_items()
+
+    # 4. partial payments against a quoted note
+    unmatched_payments = []
+    partial_paid = {}
+    for key, group_payments in open_payments.items():
+        for payment in group_payments:
+            ref = notes_by_id.get(payment["reference"])
+            if ref and not ref[0].used[ref[1]] and (payment["counterparty"], payment["currency"]) == key \
+                    and payment["cents"] < ref[0].amounts[ref[1]]:
+                partial_paid.setdefault(ref, []).append(payment)
+            else:
+                unmatched_payments.append(payment)
+    for (side, i), group_payments in partial_paid.items():
+        note = side.items[i]
+        if sum(p["cents"] for p in group_payments) > note["cents"]:
+            unmatched_payments.extend(group_payments)
+            continue
+        side.take([i])
+        row = _match_row("partial", group_payments, [note])
+        row["Open Balance"] = (note["cents"] - sum(p["cents"] for p in group_payments)) / 100
+        matched.append(row)
+
+    unmatched_notes = [note for side in note_groups.values() for note in side.open_items()]
+    counts = {}
+    for row in matched:
+        counts[row["Match Type"]] = counts.get(row["Match Type"], 0) + 1
+    return {
+        "matched": matched,
+        "unmatched_payments": [{"Payment ID": p["id"], "Counterparty": p["counterparty"], "Currency": p["currency"],
+                                "Amount": p["cents"] / 100, "Reference": p["reference"]} for p in unmatched_payments],
+        "unmatched_notes": [{"Debit Note ID": n["id"], "Counterparty": n["counterparty"], "Currency": n["currency"],
+                             "Amount": n["cents"] / 100} for n in unmatched_notes],
+        "match_counts": counts,
+        "total_payments": len(payments),
+        "total_notes": len(notes)
+    }
+
+
+def reconcile_intercompany_payments() -> dict:
+    """Matches incoming intercompany payment instructions against open debit notes."""
+    print("Executing reconcile_intercompany_payments.")
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+    try:
+        report_progress(0.0, "Loading payment instructions and debit notes")
+        payments = list(db[IC_PAYMENTS_COLLECTION].find({"status": {"$ne": "matched"}}))
+        notes = list(db[IC_DEBIT_NOTES_COLLECTION].find({"status": {"$ne": "settled"}}))
+        start = time.perf_counter()
+        details = match_intercompany_payments(payments, notes)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred during intercompany reconciliation: {e}", "details": None}
+
+    details["elapsed_seconds"] = round(elapsed, 3)
+    details["items_per_second"] = round((len(payments) + len(notes)) / elapsed, 1) if elapsed else 0.0
+    message = (f"Matched {len(details['matched'])} payment groups; {len(details['unmatched_payments'])} payment "
+               f"instructions and {len(details['unmatched_notes'])} debit notes remain open.")
+    return {"status": "success", "message": message, "details": details}
@@ -0,0 +1,285 @@
+# tools/invoices.py
+
+import os
+import time
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# External invoice system; without it invoice details are simulated
+INVOICE_API_URL = os.getenv("INVOICE_API_URL")
+# Dates fetched at the same time for a range request (also the connection pool size)
+INVOICE_MAX_PARALLEL = int(os.getenv("INVOICE_MAX_PARALLEL", "8"))
+INVOICE_CONNECT_TIMEOUT = 3.05
+INVOICE_READ_TIMEOUT = float(os.getenv("INVOICE_READ_TIMEOUT_SECONDS", "15"))
+INVOICE_RETRIES = int(os.getenv("INVOICE_RETRIES", "3"))
+# Past dates are finalized, so their responses are cached; today's and future dates never are
+INVOICE_CACHE_TTL_SECONDS = int(os.getenv("INVOICE_CACHE_TTL_SECONDS", str(6 * 3600)))
+INVOICE_CACHE_MAX_ENTRIES = 512
+# Longest range a single request may cover
+MAX_RANGE_DAYS = 366
+# Collection and fields invoice counts are aggregated over: one invoice per sales slip, while
+# the collection holds one document per (Slip, Distribtutor id, Buyer id) commission line
+INVOICE_COLLECTION = os.getenv("INVOICE_COLLECTION", "es")
+INVOICE_DATE_FIELD = os.getenv("INVOICE_DATE_FIELD", "Sale date")
+INVOICE_SLIP_FIELD = "Slip"
+INVOICE_COUNT_CACHE_MAX_DAYS = 4096
+# Exports arrive up to this many days late, so only older days are cached as closed
+INVOICE_LOAD_LAG_DAYS = int(os.getenv("INVOICE_LOAD_LAG_DAYS", "2"))
+
+
+class InvoiceApiError(Exception):
+    pass
+
+
+class InvoiceClient:
+    """
+    Client for the external invoice API: one pooled keep-alive session shared by all
+    sessions of the process, retries with backoff, and a TTL cache for finalized dates.
+    """
+    def __init__(self, base_url: str, max_parallel: int = INVOICE_MAX_PARALLEL,
+                 retries: int = INVOICE_RETRIES, cache_ttl: int = INVOICE_CACHE_TTL_SECONDS,
+                 timeout: tuple = (INVOICE_CONNECT_TIMEOUT, INVOICE_READ_TIMEOUT)):
+        self.base_url = base_url.rstrip("/")
+        self.max_parallel = max(1, max_parallel)
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET"]), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = OrderedDict()  # date -> (expires_at, invoices)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0}
+
+    def _cached(self, day: date):
+        with self._lock:
+            entry = self._cache.get(day)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._cache[day]
+                return None
+            self._cache.move_to_end(day)
+            self.stats["cache_hits"] += 1
+            return entry[1]
+
+    def _store(self, day: date, invoices: list):
+        if day >= date.today():
+            return  # not finalized yet
+        with self._lock:
+            self._cache[day] = (time.monotonic() + self.cache_ttl, invoices)
+            while len(self._cache) > INVOICE_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def fetch_day(self, day: date) -> list:
+        """Invoices of one sales date; raises InvoiceApiError when the API fails."""
+        cached = self._cached(day)
+        if cached is not None:
+            return cached
+        with self._lock:
+            self.stats["requests"] += 1
+        try:
+            response = self.session.get(f"{self.base_url}/invoices", params={"date": day.isoformat()},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            invoices = response.json().get("invoices", [])
+        except (requests.RequestException, ValueError) as e:
+            raise InvoiceApiError(f"{day.isoformat()}: {e}") from e
+        self._store(day, invoices)
+        return invoices
+
+    def fetch_range(self, start: date, end: date) -> dict:
+        """
+        Invoices for every date in [start, end], fetched concurrently with at most
+        max_parallel requests in flight. Returns {date: list or InvoiceApiError}.
+        """
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        results = {}
+
+        def fetch(day):
+            try:
+                return day, self.fetch_day(day)
+            except InvoiceApiError as e:
+                return day, e
+
+        if len(days) == 1:
+            return dict([fetch(days[0])])
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(days))) as pool:
+            for day, result in pool.map(fetch, days):
+                results[day] = result
+        return results
+
+
+class SimulatedInvoiceClient:
+    """Stand-in used when INVOICE_API_URL is not set (the previous simulated behaviour)."""
+    def fetch_range(self, start: date, end: date) -> dict:
+        results = {}
+        for i in range((end - start).days + 1):
+            day = start + timedelta(days=i)
+            if random.random() > 0.1:
+                results[day] = [
+                    {"Invoice ID": f"INV-{random.randint(1000, 2000)}", "Amount": f"${random.uniform(100, 5000):.2f}", "Status": random.choice(["Paid", "Unpaid", "Overdue"])},
+                    {"Invoice ID": f"INV-{random.randint(2001, 3000)}", "Amount": f"${random.uniform(100, 5000):.2f}", "Status": random.choice(["Paid", "Unpaid"])},
+                    {"Invoice ID": f"INV-{random.randint(3001, 4000)}", "Amount": f"${random.uniform(100, 5000):.2f}", "Status": "Paid"},
+                ]
+            else:
+                results[day] = InvoiceApiError(f"{day.isoformat()}: simulated outage")
+        return results
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_invoice_client():
+    """Process-wide client, so the connection pool and the cache are shared by all sessions."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InvoiceClient(INVOICE_API_URL) if INVOICE_API_URL else SimulatedInvoiceClient()
+        return _client
+
+
+def set_invoice_client(client):
+    """Swaps the invoice client (e.g. for one pointed at the local stub server)."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+# --- Invoice counts ---
+
+_count_cache = {}  # (collection, date) -> count, closed days only
+_count_cache_loads = {}  # collection -> ingest "loads" counter the cached counts were read at
+_count_cache_lock = threading.Lock()
+_indexed_collections = set()
+
+
+def _invoice_collection():
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return None
+    collection = db.get_collection(INVOICE_COLLECTION)
+    if collection.name not in _indexed_collections:
+        # Range match on the date field is the first stage of every count query
+        collection.create_index([(INVOICE_DATE_FIELD, 1)])
+        _indexed_collections.add(collection.name)
+    return collection
+
+
+def count_invoices_by_day(collection, start: date, end: date) -> dict:
+    """
+    Distinct slips per date in [start, end] with one grouped aggregation. Closed days are
+    served from the cache until the next ingest load; only the span of uncached days is queried.
+    """
+    from ingest import ingest_generation
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    loads = ingest_generation(collection.database, collection.name, "loads")
+    with _count_cache_lock:
+        if _count_cache_loads.get(collection.name) != loads:
+            # A load (possibly back-dated) happened since these counts were read
+            for key in [key for key in _count_cache if key[0] == collection.name]:
+                del _count_cache[key]
+            _count_cache_loads[collection.name] = loads
+        counts = {day: _count_cache[(collection.name, day)] for day in days if (collection.name, day) in _count_cache}
+    missing = [day for day in days if day not in counts]
+    if not missing:
+        return counts
+
+    first, last = missing[0], missing[-1]
+    pipeline = [
+        {"$match": {INVOICE_DATE_FIELD: {"$gte": datetime.combine(first, datetime.min.time()),
+                                          "$lt": datetime.combine(last + timedelta(days=1), datetime.min.time())}}},
+        {"$group": {"_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${INVOICE_DATE_FIELD}"}},
+                            "slip": f"${INVOICE_SLIP_FIELD}"}}},
+        {"$group": {"_id": "$_id.day", "count": {"$sum": 1}}}
+    ]
+    found = {row["_id"]: row["count"] for row in collection.aggregate(pipeline, allowDiskUse=True)}
+    closed_before = date.today() - timedelta(days=INVOICE_LOAD_LAG_DAYS)
+    with _count_cache_lock:
+        for day in missing:
+            counts[day] = found.get(day.isoformat(), 0)
+            if day < closed_before and _count_cache_loads.get(collection.name) == loads \
+                    and len(_count_cache) < INVOICE_COUNT_CACHE_MAX_DAYS:
+                _count_cache[(collection.name, day)] = counts[day]
+    return counts
+
+
+def clear_invoice_count_cache():
+    """Drops cached counts, e.g. after invoices were written other than through ingest.py."""
+    with _count_cache_lock:
+        _count_cache.clear()
+        _count_cache_loads.clear()
+
+
+def get_invoice_count(start_date: str, end_date: str = None) -> dict:
+    """Counts invoices per sales date for a date or a date range (YYYY-MM-DD)."""
+    print(f"Executing get_invoice_count for {start_date} to {end_date or start_date}")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start
+    except ValueError:
+        return {"status": "error", "message": "Invalid date format. Please use YYYY-MM-DD format.", "details": None}
+    if end < start:
+        return {"status": "error", "message": "The end date is before the start date.", "details": None}
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return {"status": "error", "message": f"Please request at most {MAX_RANGE_DAYS} days at a time.", "details": None}
+
+    try:
+        collection = _invoice_collection()
+        if collection is None:
+            return {"status": "error", "message": "Could not connect to the database.", "details": None}
+        counts = count_invoices_by_day(collection, start, end)
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while fetching invoice count: {e}", "details": None}
+
+    series = [{"Sales date": day.isoformat(), "Invoices": counts[day]} for day in sorted(counts)]
+    total = sum(counts.values())
+    if start == end:
+        message = f"There were {total} invoices for the sales date {start_date}."
+    else:
+        message = f"There were {total} invoices from {start_date} to {end_date} ({len(series)} days)."
+    return {"status": "success", "message": message, "details": {"counts": series, "total": total}}
+
+
+def fetch_invoice_details(start_date: str, end_date: str = None) -> dict:
+    """Fetches invoice details for a sales date or a date range (YYYY-MM-DD) from the external system."""
+    print(f"Executing fetch_invoice_details for {start_date} to {end_date or start_date}")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start
+    except ValueError:
+        return {"status": "error", "message": "Invalid date format. Please use YYYY-MM-DD format.", "details": None}
+    if end < start:
+        return {"status": "error", "message": "The end date is before the start date.", "details": None}
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return {"status": "error", "message": f"Please request at most {MAX_RANGE_DAYS} days at a time.", "details": None}
+
+    results = get_invoice_client().fetch_range(start, end)
+    invoices, failed_dates = [], []
+    for day in sorted(results):
+        if isinstance(results[day], Exception):
+            print(f"Invoice API call failed: {results[day]}")
+            failed_dates.append(day.isoformat())
+            continue
+        invoices.extend({"Sales date": day.isoformat(), **invoice} for invoice in results[day])
+
+    period = start_date if start == end else f"{start_date} to {end_date}"
+    if failed_dates and not invoices:
+        return {"status": "error",
+                "message": f"Sorry, I was unable to retrieve invoice details for {period} from the external system.",
+                "details": {"invoices": [], "failed_dates": failed_dates}}
+    message = f"Found {len(invoices)} invoices for {period}."
+    if failed_dates:
+        message += f" The external system did not answer for {len(failed_dates)} dates."
+    return {"status": "partial" if failed_dates else "success", "message": message,
+            "details": {"invoices": invoices, "failed_dates": failed_dates}}
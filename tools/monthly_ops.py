@@ -10,11 +10,6 @@ def accrue_reverse_commissions() -> dict:
     print("Executing accrue_reverse_commissions.")
     return {"status": "success", "message": "Intercompany commission expenses have been accrued. The reversal is scheduled for tomorrow."}
 
-def reconcile_intercompany_payments() -> dict:
-    """Matches incoming intercompany payment instructions against records."""
-    print("Executing reconcile_intercompany_payments.")
-    return {"status": "success", "message": "All incoming intercompany payment instructions have been successfully matched and reconciled."}
-
 def send_balance_confirmations() -> dict:
     """Sends balance confirmation requests to all intercompany partners."""
     print("Executing send_balance_confirmations.")
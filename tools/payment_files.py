@@ -0,0 +1,350 @@
+# tools/payment_files.py
+
+import io
+import os
+import csv
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from jobs import report_progress
+
+# Approved commission lines, one per distributor and order (field names as stored by ES)
+COMMISSION_LINES_COLLECTION = os.getenv("COMMISSION_LINES_COLLECTION", "commission_lines")
+VENDOR_COLLECTION = os.getenv("VENDOR_COLLECTION", "vendors")
+PAYMENT_FILE_DIR = Path(os.getenv("PAYMENT_FILE_DIR", "payment_files"))
+# "fixed" (120-column records) or "csv"
+BANK_FILE_LAYOUT = os.getenv("BANK_FILE_LAYOUT", "fixed")
+# Limits the bank imposes on a single upload; output is split into numbered files
+BANK_FILE_MAX_RECORDS = int(os.getenv("BANK_FILE_MAX_RECORDS", "5000"))
+BANK_FILE_MAX_BYTES = int(os.getenv("BANK_FILE_MAX_BYTES", str(2 * 1024 * 1024)))
+CHEQUE_BATCH_SIZE = int(os.getenv("CHEQUE_BATCH_SIZE", "500"))
+COMPANY_ID = os.getenv("BANK_COMPANY_ID", "AIPOC")
+RECORD_WIDTH = 120
+# Next free cheque number, so print batches of different runs never reuse one
+COUNTER_COLLECTION = "payment_counters"
+
+
+def _fixed(value, width: int, numeric: bool = False) -> str:
+    """A field of exactly `width` UTF-8 bytes, so a non-ASCII payee name does not shift the columns after it."""
+    text = str(value if value is not None else "")
+    if numeric:
+        return text.rjust(width, "0")[-width:]
+    # Cut on bytes, dropping a character split by the cut, then pad with spaces to the width
+    text = text.replace("\n", " ").encode("utf-8")[:width].decode("utf-8", errors="ignore")
+    return text + " " * (width - len(text.encode("utf-8")))
+
+
+def _account_hash(account) -> int:
+    """Numeric part of an account number, summed into the trailer's hash total."""
+    digits = "".join(ch for ch in str(account or "") if ch.isdigit())
+    return int(digits[-15:]) if digits else 0
+
+
+class _Layout:
+    """Header, detail and trailer records of one bank file layout."""
+    extension = "txt"
+
+    def header(self, file_date: str, sequence: int) -> str:
+        return _fixed("H" + _fixed(COMPANY_ID, 10) + file_date + _fixed(sequence, 4, numeric=True), RECORD_WIDTH) + "\n"
+
+    def detail(self, payment: dict) -> str:
+        return _fixed("D" + _fixed(payment["bank_code"], 8) + _fixed(payment["account"], 20)
+                      + _fixed(payment["cents"], 15, numeric=True) + _fixed(payment["payee_id"], 15)
+                      + _fixed(payment["payee_name"], 35) + _fixed(payment["reference"], 20), RECORD_WIDTH) + "\n"
+
+    def trailer(self, count: int, total_cents: int, hash_total: int) -> str:
+        return _fixed("T" + _fixed(count, 8, numeric=True) + _fixed(total_cents, 18, numeric=True)
+                      + _fixed(hash_total % 10 ** 18, 18, numeric=True), RECORD_WIDTH) + "\n"
+
+
+class _CsvLayout(_Layout):
+    extension = "csv"
+    columns = ["Record", "Bank code", "Account", "Amount", "Payee ID", "Payee name", "Reference"]
+
+    @staticmethod
+    def _row(values) -> str:
+        out = io.StringIO()
+        csv.writer(out, lineterminator="\n").writerow(values)
+        return out.getvalue()
+
+    def header(self, file_date: str, sequence: int) -> str:
+        return self._row(["H", COMPANY_ID, file_date, sequence, "", "", ""]) + self._row(self.columns)
+
+    def detail(self, payment: dict) -> str:
+        return self._row(["D", payment["bank_code"], payment["account"], f"{payment['cents'] / 100:.2f}",
+                          payment["payee_id"], payment["payee_name"], payment["reference"]])
+
+    def trailer(self, count: int, total_cents: int, hash_total: int) -> str:
+        return self._row(["T", count, f"{total_cents / 100:.2f}", hash_total % 10 ** 18, "", "", ""])
+
+
+LAYOUTS = {"fixed": _Layout, "csv": _CsvLayout}
+
+
+class BankFileWriter:
+    """
+    Writes payments straight to disk as they arrive, keeping only running control totals
+    (count, amount, account hash total, SHA-256). A new numbered file is started before a
+    record would exceed the bank's record or size limit.
+    """
+    def __init__(self, directory: Path, stem: str, file_date: str, layout: str = BANK_FILE_LAYOUT,
+                 max_records: int = BANK_FILE_MAX_RECORDS, max_bytes: int = BANK_FILE_MAX_BYTES):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown bank file layout '{layout}'")
+        self.layout = LAYOUTS[layout]()
+        self.directory = directory
+        self.stem = stem
+        self.file_date = file_date
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.files = []  # manifest entries of closed files
+        self._handle = None
+
+    def _open(self):
+        sequence = len(self.files) + 1
+        self._path = self.directory / f"{self.stem}_{sequence:03d}.{self.layout.extension}"
+        self._handle = open(self._path, "w", encoding="utf-8", newline="")
+        self._sha = hashlib.sha256()
+        self._count = self._cents = self._hash_total = self._bytes = 0
+        self._write(self.layout.header(self.file_date, sequence))
+
+    def _write(self, text: str):
+        data = text.encode("utf-8")
+        self._handle.write(text)
+        self._sha.update(data)
+        self._bytes += len(data)
+
+    def _close(self):
+        self._write(self.layout.trailer(self._count, self._cents, self._hash_total))
+        self._handle.close()
+        self._handle = None
+        self.files.append({
+            "file_name": self._path.name, "records": self._count, "total_amount": self._cents / 100,
+            "hash_total": self._hash_total % 10 ** 18, "bytes": self._bytes, "sha256": self._sha.hexdigest()
+        })
+
+    def add(self, payment: dict):
+        line = self.layout.detail(payment)
+        # the trailer still has to fit under the size limit
+        reserve = len(self.layout.trailer(0, 0, 0).encode("utf-8"))
+        if self._handle is not None and (self._count >= self.max_records
+                                         or self._bytes + len(line.encode("utf-8")) + reserve > self.max_bytes):
+            self._close()
+        if self._handle is None:
+            self._open()
+        self._write(line)
+        self._count += 1
+        self._cents += payment["cents"]
+        self._hash_total += _account_hash(payment["account"])
+
+    def finish(self) -> list:
+        if self._handle is not None:
+            self._close()
+        return self.files
+
+
+class ChequeBatchWriter:
+    """
+    Cheque print batches of a fixed size, numbered from a starting cheque number. With
+    last_cheque set, numbers past the reserved block are refused rather than printed.
+    """
+    columns = ["Cheque number", "Payee ID", "Payee name", "Address", "Amount", "Reference"]
+
+    def __init__(self, directory: Path, stem: str, first_cheque: int = 1, batch_size: int = CHEQUE_BATCH_SIZE,
+                 last_cheque: int = None):
+        self.directory = directory
+        self.stem = stem
+        self.next_cheque = first_cheque
+        self.last_cheque = last_cheque
+        self.batch_size = batch_size
+        self.files = []
+        self._handle = None
+
+    def add(self, payment: dict):
+        if self.last_cheque is not None and self.next_cheque > self.last_cheque:
+            raise ValueError(f"More cheques than the reserved numbers (last reserved: {self.last_cheque})")
+        if self._handle is not None and self._count >= self.batch_size:
+            self._close()
+        if self._handle is None:
+            self._path = self.directory / f"{self.stem}_{len(self.files) + 1:03d}.csv"
+            self._handle = open(self._path, "w", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._handle)
+            self._writer.writerow(self.columns)
+            self._count = self._cents = 0
+            self._first = self.next_cheque
+        self._writer.writerow([self.next_cheque, payment["payee_id"], payment["payee_name"], payment["address"],
+                               f"{payment['cents'] / 100:.2f}", payment["reference"]])
+        self.next_cheque += 1
+        self._count += 1
+        self._cents += payment["cents"]
+
+    def _close(self):
+        self._handle.close()
+        self._handle = None
+        self.files.append({"file_name": self._path.name, "cheques": self._count, "total_amount": self._cents / 100,
+                           "first_cheque": self._first, "last_cheque": self.next_cheque - 1})
+
+    def finish(self) -> list:
+        if self._handle is not None:
+            self._close()
+        return self.files
+
+
+def _payment(row: dict, reference: str) -> dict:
+    return {
+        "payee_id": str(row.get("payee_id") or ""),
+        "payee_name": str(row.get("payee_name") or ""),
+        "bank_code": str(row.get("bank_code") or ""),
+        "account": str(row.get("account") or ""),
+        "address": str(row.get("address") or ""),
+        "method": row.get("method") or ("bank_transfer" if row.get("account") else "cheque"),
+        "cents": int(round(float(row.get("amount") or 0) * 100)),
+        "reference": reference,
+    }
+
+
+def _reserve_cheque_numbers(db, count: int) -> int:
+    """
+    First of `count` consecutive cheque numbers, reserved in one atomic increment before
+    anything is written, so concurrent runs never print the same number.
+    """
+    if db is None or count <= 0:
+        return 1
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+    counters = db[COUNTER_COLLECTION]
+    try:
+        counters.update_one({"_id": "cheque_number"}, {"$setOnInsert": {"next": 1}}, upsert=True)
+    except DuplicateKeyError:
+        pass  # created by a concurrent run
+    counter = counters.find_one_and_update({"_id": "cheque_number"}, {"$inc": {"next": count}},
+                                           upsert=True, return_document=ReturnDocument.BEFORE)
+    return counter["next"]
+
+
+def _payments_pipeline(match: dict) -> list:
+    """One payment per distributor, summed on the server."""
+    return [
+        {"$match": match},
+        {"$group": {"_id": "$Distributor id", "amount": {"$sum": "$Amount"},
+                    "payee_name": {"$first": "$Distributor name"}, "bank_code": {"$first": "$Bank code"},
+                    "account": {"$first": "$Account number"}, "address": {"$first": "$Address"},
+                    "method": {"$first": "$Payment method"}}},
+    ]
+
+
+def _cheque_count_pipeline(match: dict) -> list:
+    """Number of payments write_payment_files will print as cheques (see _payment)."""
+    return _payments_pipeline(match) + [
+        {"$match": {"amount": {"$gte": 0.005},
+                    "$or": [{"method": "cheque"},
+                            {"method": {"$in": [None, ""]}, "account": {"$in": [None, ""]}}]}},
+        {"$count": "cheques"},
+    ]
+
+
+def write_payment_files(payments, stem: str, file_date: str, directory: Path = PAYMENT_FILE_DIR,
+                        layout: str = BANK_FILE_LAYOUT, first_cheque: int = 1, expected: int = 0,
+                        reserved_cheques: int = None) -> dict:
+    """
+    Streams payments (an iterable of dicts from _payment) into bank transfer files and
+    cheque print batches. Memory use does not depend on the number of payments.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    bank = BankFileWriter(directory, f"{stem}_bank", file_date, layout=layout)
+    last_cheque = first_cheque + reserved_cheques - 1 if reserved_cheques is not None else None
+    cheques = ChequeBatchWriter(directory, f"{stem}_cheques", first_cheque=first_cheque, last_cheque=last_cheque)
+    skipped = 0
+    for i, payment in enumerate(payments, 1):
+        if payment["cents"] <= 0:
+            skipped += 1
+        elif payment["method"] == "cheque":
+            cheques.add(payment)
+        else:
+            bank.add(payment)
+        if expected and i % 1000 == 0:
+            report_progress(min(i / expected, 1.0), f"Wrote {i} of {expected} payments")
+    manifest = {"bank_files": bank.finish(), "cheque_batches": cheques.finish(), "skipped_zero_amounts": skipped,
+                "next_cheque": cheques.next_cheque}
+    manifest["transfers"] = sum(f["records"] for f in manifest["bank_files"])
+    manifest["cheques"] = sum(f["cheques"] for f in manifest["cheque_batches"])
+    if reserved_cheques is not None and manifest["cheques"] < reserved_cheques:
+        # Reserved but not printed, e.g. lines changed between the count and the write; to be voided
+        manifest["unused_cheque_numbers"] = [cheques.next_cheque, last_cheque]
+    manifest["total_amount"] = round(sum(f["total_amount"] for f in manifest["bank_files"] + manifest["cheque_batches"]), 2)
+    manifest_path = directory / f"{stem}_manifest.json"
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    manifest["manifest_file"] = manifest_path.name
+    return manifest
+
+
+def generate_payment_files(sales_date: str, layout: str = BANK_FILE_LAYOUT) -> dict:
+    """Writes the bank transfer files and cheque print batches for the approved commissions of a sales date."""
+    print(f"Executing generate_payment_files for sales date: {sales_date}")
+    try:
+        day = datetime.strptime(sales_date, "%Y-%m-%d")
+    except ValueError:
+        return {"status": "error", "message": "Invalid date format. Please use YYYY-MM-DD format.", "details": None}
+    if layout not in LAYOUTS:
+        return {"status": "error", "message": f"Unknown bank file layout '{layout}'.", "details": None}
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+
+    lines = db[COMMISSION_LINES_COLLECTION]
+    match = {"Sales date": day, "Status": "approved"}
+    try:
+        expected = lines.count_documents(match)
+        counted = list(lines.aggregate(_cheque_count_pipeline(match), allowDiskUse=True))
+        cheque_count = counted[0]["cheques"] if counted else 0
+        first_cheque = _reserve_cheque_numbers(db, cheque_count)
+        # One payment per distributor, summed on the server and read in batches
+        cursor = lines.aggregate(_payments_pipeline(match) + [{"$sort": {"_id": 1}}], allowDiskUse=True, batchSize=2000)
+        reference = f"COMM{day:%Y%m%d}"
+        payments = (_payment({**row, "payee_id": row["_id"]}, reference) for row in cursor)
+        report_progress(0.0, f"Writing payment files for {expected} commission lines")
+        manifest = write_payment_files(payments, f"commission_{day:%Y%m%d}", f"{day:%Y%m%d}", layout=layout,
+                                       first_cheque=first_cheque, expected=expected, reserved_cheques=cheque_count)
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while writing payment files: {e}", "details": None}
+
+    if not manifest["transfers"] and not manifest["cheques"]:
+        return {"status": "error", "message": f"There are no approved commissions to pay for sales date {sales_date}.",
+                "details": manifest}
+    message = (f"Wrote {manifest['transfers']} bank transfers in {len(manifest['bank_files'])} files and "
+               f"{manifest['cheques']} cheques in {len(manifest['cheque_batches'])} print batches "
+               f"(total {manifest['total_amount']:,.2f}).")
+    return {"status": "success", "message": message, "details": manifest}
+
+
+def issue_payment(amount: float, vendor_id: str, payment_method: str = None) -> dict:
+    """Transfers payment via bank or prints a check for a vendor and amount."""
+    print(f"Executing issue_payment for vendor {vendor_id}")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return {"status": "error", "message": f"'{amount}' is not a valid amount.", "details": None}
+    if amount <= 0:
+        return {"status": "error", "message": "The payment amount must be positive.", "details": None}
+
+    from database import get_shared_db
+    db = get_shared_db()
+    vendor = db[VENDOR_COLLECTION].find_one({"Vendor id": vendor_id}) if db is not None else None
+    if db is not None and vendor is None:
+        return {"status": "error", "message": f"Vendor {vendor_id} was not found.", "details": None}
+    vendor = vendor or {}
+    row = {"payee_id": vendor_id, "payee_name": vendor.get("Vendor name"), "bank_code": vendor.get("Bank code"),
+           "account": vendor.get("Account number"), "address": vendor.get("Address"), "amount": amount,
+           "method": payment_method or vendor.get("Payment method")}
+    if row["method"] not in (None, "bank_transfer", "cheque"):
+        return {"status": "error", "message": "Payment method must be 'bank_transfer' or 'cheque'.", "details": None}
+    now = datetime.now()
+    payment = _payment(row, f"VND{now:%Y%m%d%H%M%S}")
+    cheque_count = 1 if payment["method"] == "cheque" and payment["cents"] > 0 else 0
+    manifest = write_payment_files([payment], f"vendor_{vendor_id}_{now:%Y%m%d%H%M%S}", f"{now:%Y%m%d}",
+                                   first_cheque=_reserve_cheque_numbers(db, cheque_count), reserved_cheques=cheque_count)
+    via = "bank transfer" if manifest["transfers"] else "cheque"
+    return {"status": "success", "message": f"A payment of {amount:,.2f} has been issued to vendor {vendor_id} via {via}.",
+            "details": manifest}
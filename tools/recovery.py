@@ -0,0 +1,239 @@
+# tools/recovery.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import numpy as np
+from ingest import to_int
+from jobs import report_progress
+
+# Orders cancelled in ES and the commission recoveries booked for them in the payment system
+CANCELLED_ORDERS_COLLECTION = os.getenv("CANCELLED_ORDERS_COLLECTION", "cancelled_orders")
+RECOVERIES_COLLECTION = os.getenv("RECOVERIES_COLLECTION", "commission_recoveries")
+ORDER_ID_FIELD = "Order id"
+AMOUNT_FIELD = "Commission"
+CANCEL_DATE_FIELD = "Cancel date"
+RECOVERY_DATE_FIELD = "Recovery date"
+# Closed days whose ID arrays are kept in memory (per collection)
+CACHE_DAYS = 400
+# Today and yesterday may still receive late bookings, so they are always read fresh
+OPEN_DAYS = 2
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+EMPTY_AMOUNTS = np.empty(0, dtype=np.float64)
+
+
+class _DayCache:
+    """
+    Sorted ID arrays per (collection, day), kept only for closed days: bookings are
+    dated when they are made, so the sets of older days no longer change.
+    """
+    def __init__(self, max_days: int = CACHE_DAYS):
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, collection: str, day: date):
+        with self._lock:
+            arrays = self._days.get((collection, day))
+            if arrays is not None:
+                self._days.move_to_end((collection, day))
+            return arrays
+
+    def put(self, collection: str, day: date, arrays):
+        with self._lock:
+            self._days[(collection, day)] = arrays
+            self._days.move_to_end((collection, day))
+            while len(self._days) > self.max_days * 2:
+                self._days.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+
+
+_cache = _DayCache()
+_indexed = set()
+
+
+def _order_id(value) -> int | None:
+    try:
+        return to_int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _amount(value) -> float:
+    if hasattr(value, "to_decimal"):  # Decimal128
+        value = value.to_decimal()
+    elif isinstance(value, dict):
+        value = next(iter(value.values()), 0)
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _day_arrays(ids: list, amounts: list | None):
+    """(ids, amounts) as int64/float64 arrays sorted by id; ids that are not integers are dropped."""
+    id_array = np.asarray(ids)
+    keep = None
+    if id_array.dtype.kind not in "iu":
+        # Strings or {"$numberLong": ...} from older imports: convert one by one
+        converted = [_order_id(value) for value in ids]
+        keep = np.array([value is not None for value in converted], dtype=bool)
+        id_array = np.array([value for value in converted if value is not None], dtype=np.int64)
+    id_array = id_array.astype(np.int64, copy=False)
+    if amounts is None:
+        amount_array = np.zeros(len(id_array), dtype=np.float64)
+    else:
+        try:
+            amount_array = np.array(amounts, dtype=np.float64)
+        except (TypeError, ValueError):
+            amount_array = np.array([_amount(value) for value in amounts], dtype=np.float64)
+        if keep is not None:
+            amount_array = amount_array[keep]
+    order = np.argsort(id_array, kind="stable")
+    return id_array[order], amount_array[order]
+
+
+def _fetch_days(db, collection: str, date_field: str, days: list, with_amounts: bool) -> tuple:
+    """
+    One aggregation over the given days that returns each day's order ids (and amounts)
+    as arrays, so the client converts lists instead of walking documents.
+    Returns ({day: arrays}, skipped ids).
+    """
+    if collection not in _indexed:
+        # Covers the range scan and the pushed order id
+        db[collection].create_index([(date_field, 1), (ORDER_ID_FIELD, 1)])
+        _indexed.add(collection)
+    first, last = min(days), max(days)
+    match = {
+        date_field: {"$gte": datetime.combine(first, datetime.min.time()),
+                     "$lt": datetime.combine(last + timedelta(days=1), datetime.min.time())},
+        ORDER_ID_FIELD: {"$exists": True},
+    }
+    group = {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${date_field}"}},
+             "ids": {"$push": f"${ORDER_ID_FIELD}"}}
+    if with_amounts:
+        group["amounts"] = {"$push": {"$ifNull": [f"${AMOUNT_FIELD}", 0]}}
+
+    wanted = set(days)
+    fetched = {day: (EMPTY_IDS, EMPTY_AMOUNTS) for day in days}
+    skipped = 0
+    for row in db[collection].aggregate([{"$match": match}, {"$group": group}], allowDiskUse=True):
+        day = datetime.strptime(row["_id"], "%Y-%m-%d").date()
+        if day not in wanted:
+            continue
+        ids, amounts = _day_arrays(row["ids"], row.get("amounts"))
+        skipped += len(row["ids"]) - len(ids)
+        fetched[day] = (ids, amounts)
+    return fetched, skipped
+
+
+def _load_range(db, collection: str, date_field: str, start: date, end: date, today: date,
+                with_amounts: bool = False) -> dict:
+    """
+    Sorted ids, aligned amounts and day ordinals of [start, end]. Closed days come from
+    the cache when present; the rest is fetched in a single query.
+    """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    closed_before = today - timedelta(days=OPEN_DAYS - 1)
+    per_day, missing = {}, []
+    for day in days:
+        arrays = _cache.get(collection, day) if day < closed_before else None
+        if arrays is None:
+            missing.append(day)
+        else:
+            per_day[day] = arrays
+    skipped = 0
+    if missing:
+        fetched, skipped = _fetch_days(db, collection, date_field, missing, with_amounts)
+        for day, arrays in fetched.items():
+            per_day[day] = arrays
+            if day < closed_before:
+                _cache.put(collection, day, arrays)
+
+    return {
+        "ids": np.concatenate([per_day[day][0] for day in days]),
+        "amounts": np.concatenate([per_day[day][1] for day in days]),
+        "ordinals": np.concatenate([np.full(len(per_day[day][0]), day.toordinal(), dtype=np.int32) for day in days]),
+        "cached_days": len(days) - len(missing),
+        "skipped": skipped,
+    }
+
+
+def _sorted_unique(ids: np.ndarray, *aligned: np.ndarray) -> tuple:
+    """
+    ids sorted and deduplicated (first occurrence kept), with the aligned arrays
+    reordered to match. A stable sort of the already sorted day runs beats np.unique's hashing.
+    """
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    keep = np.empty(len(ids), dtype=bool)
+    keep[:1] = True
+    np.not_equal(ids[1:], ids[:-1], out=keep[1:])
+    return (ids[keep], *(values[order][keep] for values in aligned))
+
+
+def find_unrecovered(db, start: date, end: date, today: date = None) -> dict:
+    """
+    Cancelled orders of [start, end] without a recovery booked from start through today,
+    by sorted-set difference of the two order ID arrays.
+    """
+    today = today or date.today()
+    cancelled = _load_range(db, CANCELLED_ORDERS_COLLECTION, CANCEL_DATE_FIELD, start, end, today, with_amounts=True)
+    recovered = _load_range(db, RECOVERIES_COLLECTION, RECOVERY_DATE_FIELD, start, max(end, today), today)
+
+    # An order cancelled twice counts once, with its first cancellation
+    ids, amounts, ordinals = _sorted_unique(cancelled["ids"], cancelled["amounts"], cancelled["ordinals"])
+    recovered_ids, = _sorted_unique(recovered["ids"])
+    gaps = np.setdiff1d(ids, recovered_ids, assume_unique=True)
+    positions = np.searchsorted(ids, gaps)
+
+    unrecovered = [
+        {ORDER_ID_FIELD: int(order_id), CANCEL_DATE_FIELD: date.fromordinal(int(ordinal)).isoformat(),
+         AMOUNT_FIELD: round(float(amount), 2)}
+        for order_id, ordinal, amount in zip(gaps, ordinals[positions], amounts[positions])
+    ]
+    return {
+        "unrecovered": unrecovered,
+        "cancelled_orders": int(len(ids)),
+        "recovered_orders": int(len(ids) - len(gaps)),
+        "unrecovered_commission": round(float(amounts[positions].sum()), 2),
+        "cached_days": cancelled["cached_days"] + recovered["cached_days"],
+        "skipped_ids": cancelled["skipped"] + recovered["skipped"],
+    }
+
+
+def check_recovery_status(start_date: str = None, end_date: str = None) -> dict:
+    """Checks if the order cancellations of a date range (default: today) are fully recovered in payment."""
+    print(f"Executing check_recovery_status for {start_date or 'today'} to {end_date or start_date or 'today'}.")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else date.today()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start
+    except ValueError:
+        return {"status": "error", "message": "Invalid date format. Please use YYYY-MM-DD format.", "details": None}
+    if end < start:
+        start, end = end, start
+
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+    try:
+        report_progress(0.0, "Loading cancelled and recovered order IDs")
+        started = time.perf_counter()
+        details = find_unrecovered(db, start, end)
+        details["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while checking recoveries: {e}", "details": None}
+
+    period = start.isoformat() if start == end else f"{start.isoformat()} to {end.isoformat()}"
+    if not details["unrecovered"]:
+        message = f"All {details['cancelled_orders']} cancelled orders of {period} have been fully recovered in the payment systems."
+    else:
+        message = (f"{len(details['unrecovered'])} of {details['cancelled_orders']} cancelled orders of {period} "
+                   f"are not recovered yet ({details['unrecovered_commission']:,.2f} commission outstanding).")
+    return {"status": "success", "message": message, "details": details}
@@ -1,6 +1,8 @@
 # tools/reports.py
 import pandas as pd
+from snapshots import serves_snapshot
 
+@serves_snapshot("get_general_commission_report")
 def get_general_commission_report(start_date: str, end_date: str) -> dict:
     """Generates an overall commission report for a given date range."""
     print(f"Executing get_general_commission_report for {start_date} to {end_date}")
@@ -21,8 +23,3 @@ def get_top_vendor_payments() -> dict:
         "Total Payments (Last Month)": [125000, 98000, 85000, 72000]
     }
     return pd.DataFrame(dummy_data)
-
-def get_6a_bonus_forecast() -> dict:
-    """Shows how many vendors are targeting 6A and the expected bonus accrual."""
-    print("Executing get_6a_bonus_forecast.")
-    return {"status": "success", "message": "Forecast: 15 vendors are on track for 6A status. Expected bonus accrual is $45,200."}
\ No newline at end of file
@@ -0,0 +1,193 @@
+# tools/sap_bulk.py
+
+import os
+import time
+import random
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from jobs import report_progress
+
+# SAP payment-block endpoint; without it remove_payment_block only simulates the call
+SAP_API_URL = os.getenv("SAP_API_URL")
+SAP_BATCH_SIZE = int(os.getenv("SAP_BATCH_SIZE", "50"))
+SAP_CONCURRENCY = int(os.getenv("SAP_CONCURRENCY", "4"))
+SAP_MAX_ATTEMPTS = int(os.getenv("SAP_MAX_ATTEMPTS", "4"))
+SAP_TIMEOUT_SECONDS = float(os.getenv("SAP_TIMEOUT_SECONDS", "30"))
+# Exponential backoff: base * 2**attempt with full jitter, capped
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_MAX_SECONDS = 5.0
+# HTTP statuses worth retrying; other 4xx fail the batch for good
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+# A reconciliation record is one (Slip, Distributor, Buyer); one slip can pay several distributors
+RECORD_KEY_FIELDS = ["Slip", "Distributor ID", "Buyer ID"]
+
+
+def idempotency_key(record: dict) -> str:
+    """
+    Stable key per (Slip, Distributor ID, Buyer ID), so a batch retried after a lost
+    response is not applied twice. SAP returns the stored outcome for keys it has
+    already processed.
+    """
+    key = "|".join(str(record.get(field, "")) for field in RECORD_KEY_FIELDS)
+    return "pbr-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _outcome(record: dict, status: str, message: str) -> dict:
+    return {"Slip": str(record.get("Slip", "")), "Distributor ID": record.get("Distributor ID"),
+            "Buyer ID": record.get("Buyer ID"), "Status": status, "Message": message}
+
+
+class SapBulkExecutor:
+    """Sends records to a SAP bulk endpoint in batches, concurrently, with retries."""
+    def __init__(self, url: str, batch_size: int = SAP_BATCH_SIZE, concurrency: int = SAP_CONCURRENCY,
+                 max_attempts: int = SAP_MAX_ATTEMPTS, timeout: float = SAP_TIMEOUT_SECONDS,
+                 backoff_base: float = BACKOFF_BASE_SECONDS, backoff_max: float = BACKOFF_MAX_SECONDS):
+        self.url = url
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # One pooled connection per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _backoff(self, attempt: int, retry_after: str | None = None):
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        time.sleep(min(delay, self.backoff_max))
+
+    def _send_batch(self, batch_no: int, records: list) -> dict:
+        """Sends one batch, retrying the records that did not get a final outcome."""
+        pending = {idempotency_key(r): r for r in records}
+        outcomes = {}
+        attempts = 0
+        error, retry_after = "", None
+        while pending and attempts < self.max_attempts:
+            if attempts:
+                self._backoff(attempts - 1, retry_after)
+            attempts += 1
+            retry_after = None
+            payload = {"records": [{"idempotency_key": key, "slip": str(r.get("Slip", "")),
+                                    "distributor_id": r.get("Distributor ID"), "buyer_id": r.get("Buyer ID"),
+                                    "amount": r.get("Amount")} for key, r in pending.items()]}
+            try:
+                response = self._session().post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            if response.status_code in RETRYABLE_STATUSES:
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+                continue
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                break
+            try:
+                results = response.json().get("results", [])
+            except ValueError:
+                error = "invalid response from SAP"
+                continue
+            error = "no outcome returned"
+            for item in results:
+                key = item.get("idempotency_key")
+                if key not in pending:
+                    continue
+                if item.get("status") == "retry":
+                    error = item.get("message", "retry requested")
+                    continue
+                outcomes[key] = {"status": item.get("status", "removed"), "message": item.get("message", "")}
+                del pending[key]
+        for key in pending:
+            outcomes[key] = {"status": "failed", "message": error}
+
+        by_key = {idempotency_key(r): r for r in records}
+        return {
+            "batch": batch_no,
+            "attempts": attempts,
+            "outcomes": [_outcome(by_key[key], outcome["status"], outcome["message"]) for key, outcome in outcomes.items()]
+        }
+
+    def run(self, records: list) -> dict:
+        """Processes all records and returns an outcome for every input record, and throughput."""
+        # A record listed twice is sent once; the repeat gets a "duplicate" outcome
+        by_key, duplicates = {}, []
+        for record in records:
+            key = idempotency_key(record)
+            if key in by_key:
+                duplicates.append(_outcome(record, "duplicate", "Listed more than once; sent once"))
+            else:
+                by_key[key] = record
+        unique = list(by_key.values())
+        batches = [unique[i:i + self.batch_size] for i in range(0, len(unique), self.batch_size)]
+        start = time.perf_counter()
+        outcomes, attempts, done = [], 0, 0
+        report_progress(0.0, f"Sending {len(unique)} records to SAP in {len(batches)} batches")
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches) or 1)) as pool:
+            # Each batch runs in a copy of the caller's context (job progress, Mongo tool tag)
+            futures = [pool.submit(contextvars.copy_context().run, self._send_batch, n, batch)
+                       for n, batch in enumerate(batches)]
+            for future in as_completed(futures):
+                batch_result = future.result()
+                outcomes.extend(batch_result["outcomes"])
+                attempts += batch_result["attempts"]
+                done += 1
+                report_progress(done / len(batches), f"{done} of {len(batches)} batches sent")
+        elapsed = time.perf_counter() - start
+
+        failed = [o for o in outcomes if o["Status"] == "failed"]
+        outcomes.extend(duplicates)
+        return {
+            "processed_records": len(records),
+            "sent_records": len(unique),
+            "succeeded": len(unique) - len(failed),
+            "failed": len(failed),
+            "duplicates": len(duplicates),
+            "batches": len(batches),
+            "requests": attempts,
+            "retries": attempts - len(batches),
+            "elapsed_seconds": round(elapsed, 3),
+            "records_per_second": round(len(unique) / elapsed, 1) if elapsed else 0.0,
+            "outcomes": sorted(outcomes, key=lambda o: (o["Slip"], str(o["Distributor ID"]), str(o["Buyer ID"])))
+        }
+
+
+def remove_payment_block(records: list, batch_size: int = None, concurrency: int = None) -> dict:
+    """Removes the SAP payment block for reconciliation records, in concurrent batches."""
+    print(f"Executing remove_payment_block for {len(records)} records")
+    if not SAP_API_URL:
+        # No SAP endpoint configured: keep the simulated response
+        return {
+            "status": "success",
+            "message": f"Successfully removed payment block for {len(records)} records from SAP",
+            "details": {"processed_records": len(records)}
+        }
+
+    executor = SapBulkExecutor(SAP_API_URL, batch_size=batch_size or SAP_BATCH_SIZE,
+                               concurrency=concurrency or SAP_CONCURRENCY)
+    details = executor.run(records)
+    print(f"remove_payment_block: {details['succeeded']} succeeded, {details['failed']} failed, "
+          f"{details['records_per_second']} records/s, {details['retries']} retries")
+    if details["failed"] == 0:
+        status, message = "success", f"Successfully removed payment block for {details['succeeded']} records from SAP"
+    elif details["succeeded"]:
+        status, message = "partial", (f"Removed payment block for {details['succeeded']} records; "
+                                      f"{details['failed']} records failed")
+    else:
+        status, message = "error", f"Payment block removal failed for all {details['failed']} records"
+    if details["duplicates"]:
+        message += f" ({details['duplicates']} duplicate records were listed more than once and sent once)"
+    return {"status": status, "message": message, "details": details}
@@ -0,0 +1,84 @@
+# tools/shipments.py
+
+import os
+from datetime import datetime, timedelta
+from snapshots import serves_snapshot
+
+SHIPMENT_COLLECTION = os.getenv("SHIPMENT_COLLECTION", "sales")
+# Delivery dates are stored as YYYY/MM/DD strings, so range matches compare lexically
+DELIVERY_DATE_FIELD = "Delivery Date"
+SHIPMENT_REPORT_LIMIT = 200
+SHIPMENT_PROJECTION = {
+    "_id": 0, "Name": 1, "ItemCode": 1, "quantity": 1, "price": 1,
+    "Delivery Date": 1, "ship to address": 1, "ship to city": 1,
+    "ship to country": 1, "GWS Order number": 1
+}
+
+_indexed = False
+
+
+def _shipment_collection():
+    global _indexed
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return None
+    collection = db.get_collection(SHIPMENT_COLLECTION)
+    if not _indexed:
+        # Every report filters and sorts on the delivery date
+        collection.create_index([(DELIVERY_DATE_FIELD, -1)])
+        _indexed = True
+    return collection
+
+
+def _delivery_date_query(date_query: str):
+    """Mongo filter for 'this month', 'overdue', 'last 7 days' or a YYYY/MM/DD date; None if not understood."""
+    today = datetime.now()
+    normalized_query = date_query.lower().strip()
+    if "this month" in normalized_query:
+        return {DELIVERY_DATE_FIELD: {"$gte": today.replace(day=1).strftime("%Y/%m/%d")}}
+    if "overdue" in normalized_query:
+        return {DELIVERY_DATE_FIELD: {"$lt": today.strftime("%Y/%m/%d")}}
+    if "last 7 days" in normalized_query:
+        return {DELIVERY_DATE_FIELD: {"$gte": (today - timedelta(days=7)).strftime("%Y/%m/%d")}}
+    try:
+        datetime.strptime(normalized_query, "%Y/%m/%d")
+        return {DELIVERY_DATE_FIELD: normalized_query}
+    except ValueError:
+        return None
+
+
+def _report_key(date_query: str) -> dict:
+    # 'overdue' or 'this month' mean something else tomorrow, so the snapshot is per day
+    return {"date_query": (date_query or "").lower().strip(), "as_of": datetime.now().strftime("%Y-%m-%d")}
+
+
+@serves_snapshot("get_shipment_report", key=_report_key)
+def get_shipment_report(date_query: str) -> dict:
+    """
+    Gets a shipment report based on a delivery date: 'this month', 'overdue', 'last 7 days',
+    or a specific date in 'YYYY/MM/DD' format.
+    """
+    print(f"Executing get_shipment_report for: {date_query}")
+    query = _delivery_date_query(date_query or "")
+    if query is None:
+        return {"status": "error",
+                "message": f"I didn't understand the date '{date_query}'. Please try a specific date like '2025/05/30', or a period like 'this month' or 'overdue'.",
+                "details": None}
+    collection = _shipment_collection()
+    if collection is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+
+    try:
+        records = list(collection.find(query, SHIPMENT_PROJECTION)
+                       .sort(DELIVERY_DATE_FIELD, -1).limit(SHIPMENT_REPORT_LIMIT))
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to execute query: {e}", "details": None}
+
+    for record in records:
+        if isinstance(record.get("GWS Order number"), dict):
+            record["GWS Order number"] = record["GWS Order number"].get("$numberLong")
+    message = f"Found {len(records)} shipments for '{date_query}'."
+    if len(records) == SHIPMENT_REPORT_LIMIT:
+        message += f" Showing the latest {SHIPMENT_REPORT_LIMIT}."
+    return {"status": "success", "message": message, "details": {"shipments": records}}
@@ -0,0 +1,222 @@
+# tools/year_end.py
+
+import os
+import re
+import csv
+import hashlib
+import unicodedata
+from pathlib import Path
+from datetime import datetime
+from jobs import report_progress
+
+# Commission lines paid to distributors (field names as stored by ES, see tools/payment_files.py)
+COMMISSION_LINES_COLLECTION = os.getenv("COMMISSION_LINES_COLLECTION", "commission_lines")
+# A 1099 reports amounts paid in the calendar year: paid lines, by the date they were paid.
+# Until ES stores a payment date, FORM_1099_DATE_FIELD can be set to another date field (e.g.
+# "Sales date"); the report states the basis it used.
+PAID_STATUSES = ["paid"]
+FORM_1099_DATE_FIELD = os.getenv("FORM_1099_DATE_FIELD", "Payment date")
+TAX_ID_FIELD = "Tax id"
+# Keyed hashes of each distributor's name and tax ID per tax year; no names or SSNs are stored
+IDENTITY_SNAPSHOT_COLLECTION = "identity_snapshots"
+# Required: without a key the SSN hashes could be reversed by hashing all 10^9 SSNs
+IDENTITY_HASH_KEY = os.getenv("IDENTITY_HASH_KEY", "")
+YEAR_END_DIR = Path(os.getenv("YEAR_END_DIR", "year_end_reports"))
+# Payments below the IRS reporting threshold of the tax year are not reported
+FORM_1099_THRESHOLD = float(os.getenv("FORM_1099_THRESHOLD", "600"))
+SNAPSHOT_BATCH = 1000
+# Identity changes returned to the chat; the full list is in the changes file
+CHANGES_SAMPLE = 200
+
+FORM_1099_COLUMNS = ["Distributor id", "Name", "Tax id", "Total paid", "Commission lines"]
+CHANGE_COLUMNS = ["Distributor id", "Name", "Tax id", "Changed", "Previous year", "Names this year", "Tax ids this year"]
+
+
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]+")
+_NOT_DIGIT = re.compile(r"\D+")
+
+
+def _normalize_name(value) -> str:
+    """Case, accents, punctuation and spacing do not count as a name change."""
+    text = str(value or "")
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _NOT_ALNUM.sub(" ", text.upper()).strip()
+
+
+def _normalize_tax_id(value) -> str:
+    """Only the digits of an SSN or EIN count, so 123-45-6789 and 123456789 are the same."""
+    return _NOT_DIGIT.sub("", str(value or ""))
+
+
+def _hash_key() -> bytes:
+    return hashlib.sha256(IDENTITY_HASH_KEY.encode("utf-8")).digest()
+
+
+def _hash(text: str, key: bytes) -> str:
+    # Keyed BLAKE2b is a MAC in itself and about three times faster than HMAC-SHA256
+    return hashlib.blake2b(text.encode("utf-8"), key=key, digest_size=16).hexdigest()
+
+
+def key_fingerprint(key: bytes) -> str:
+    """Short id of the hash key, stored with each snapshot; it reveals nothing about the key."""
+    return hashlib.blake2b(b"identity-hash-key", key=key, digest_size=4).hexdigest()
+
+
+def mask_tax_id(tax_id) -> str:
+    digits = _normalize_tax_id(tax_id)
+    return f"***-**-{digits[-4:]}" if digits else ""
+
+
+def _paid_lines_pipeline(year: int) -> list:
+    """
+    Totals per distributor of the lines paid in the year, computed on the server in two
+    groups: first per (distributor, name, tax ID) variant with its last payment date, then
+    per distributor with its variants, so a name or SSN that changed during the year shows
+    up as a second variant.
+    """
+    return [
+        {"$match": {FORM_1099_DATE_FIELD: {"$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1)},
+                    "Status": {"$in": PAID_STATUSES}}},
+        {"$group": {"_id": {"id": "$Distributor id", "name": "$Distributor name", "tax_id": f"${TAX_ID_FIELD}"},
+                    "amount": {"$sum": "$Amount"}, "lines": {"$sum": 1}, "last": {"$max": f"${FORM_1099_DATE_FIELD}"}}},
+        {"$group": {"_id": "$_id.id", "amount": {"$sum": "$amount"}, "lines": {"$sum": "$lines"},
+                    "variants": {"$push": {"name": "$_id.name", "tax_id": "$_id.tax_id", "last": "$last"}}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def _basis() -> str:
+    return f"lines with status {' or '.join(PAID_STATUSES)}, by {FORM_1099_DATE_FIELD} in the tax year"
+
+
+def _identity_change(names: set, tax_ids: set, current: dict, previous: dict | None) -> str | None:
+    """
+    'name', 'tax id' or 'name and tax id' when the identity changed this year or since last
+    year. Last year's hashes only count when they were made with the same key.
+    """
+    if previous is not None and previous.get("key_id") != current["key_id"]:
+        previous = None
+    name_changed = len(names) > 1 or (previous is not None and previous["name_hash"] != current["name_hash"])
+    tax_id_changed = len(tax_ids) > 1 or (previous is not None and previous["tax_id_hash"] != current["tax_id_hash"])
+    if name_changed and tax_id_changed:
+        return "name and tax id"
+    return "name" if name_changed else "tax id" if tax_id_changed else None
+
+
+def _flush_snapshots(collection, pending: list):
+    from pymongo import ReplaceOne
+    if pending:
+        collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in pending], ordered=False)
+        pending.clear()
+
+
+def write_1099_report(rows, year: int, previous: dict, key: bytes, directory: Path = YEAR_END_DIR,
+                      snapshots=None, expected: int = 0) -> dict:
+    """
+    Streams per-distributor rows into the 1099 file and the identity-change file, one row
+    at a time, and writes this year's identity hashes in batches. Memory holds last
+    year's hashes (one entry per distributor) and one batch of snapshots.
+    """
+    directory = Path(directory) / str(year)
+    directory.mkdir(parents=True, exist_ok=True)
+    form_path, changes_path = directory / f"1099_{year}.csv", directory / f"identity_changes_{year}.csv"
+    form_tmp, changes_tmp = form_path.with_suffix(".tmp"), changes_path.with_suffix(".tmp")
+    key_id = key_fingerprint(key)
+    summary = {"tax_year": year, "basis": _basis(), "distributors": 0, "reportable": 0, "below_threshold": 0, "total_reported": 0.0,
+               "identity_changes": 0, "changes": [], "form_file": str(form_path), "changes_file": str(changes_path),
+               "key_id": key_id, "previous_other_key": sum(1 for doc in previous.values() if doc.get("key_id") != key_id)}
+    pending = []
+
+    with open(form_tmp, "w", newline="", encoding="utf-8") as form_file, \
+            open(changes_tmp, "w", newline="", encoding="utf-8") as changes_file:
+        form_writer, changes_writer = csv.writer(form_file), csv.writer(changes_file)
+        form_writer.writerow(FORM_1099_COLUMNS)
+        changes_writer.writerow(CHANGE_COLUMNS)
+        for row in rows:
+            distributor_id = row["_id"]
+            variants = row["variants"]
+            latest = variants[0] if len(variants) == 1 else \
+                max(variants, key=lambda v: (v["last"] is not None, v["last"] or datetime.min))
+            names = {_normalize_name(v["name"]) for v in variants}
+            tax_ids = {_normalize_tax_id(v["tax_id"]) for v in variants}
+            name = _normalize_name(latest["name"]) if len(names) > 1 else next(iter(names))
+            tax_id = _normalize_tax_id(latest["tax_id"]) if len(tax_ids) > 1 else next(iter(tax_ids))
+            current = {"name_hash": _hash(name, key), "tax_id_hash": _hash(tax_id, key), "key_id": key_id}
+            summary["distributors"] += 1
+
+            amount = round(float(row["amount"] or 0), 2)
+            if amount >= FORM_1099_THRESHOLD:
+                form_writer.writerow([distributor_id, latest["name"], latest["tax_id"], f"{amount:.2f}", row["lines"]])
+                summary["reportable"] += 1
+                summary["total_reported"] += amount
+            else:
+                summary["below_threshold"] += 1
+
+            changed = _identity_change(names, tax_ids, current, previous.get(str(distributor_id)))
+            if changed:
+                change = {
+                    "Distributor id": distributor_id, "Name": latest["name"], "Tax id": mask_tax_id(latest["tax_id"]),
+                    "Changed": changed, "Previous year": "yes" if str(distributor_id) in previous else "no",
+                    "Names this year": len(names), "Tax ids this year": len(tax_ids),
+                }
+                changes_writer.writerow([change[column] for column in CHANGE_COLUMNS])
+                summary["identity_changes"] += 1
+                if len(summary["changes"]) < CHANGES_SAMPLE:
+                    summary["changes"].append(change)
+
+            if snapshots is not None:
+                pending.append({"_id": f"{year}:{distributor_id}", "year": year, "distributor_id": str(distributor_id),
+                                **current})
+                if len(pending) >= SNAPSHOT_BATCH:
+                    _flush_snapshots(snapshots, pending)
+            if summary["distributors"] % 5000 == 0:
+                fraction = min(summary["distributors"] / expected, 0.99) if expected else 0.0
+                report_progress(fraction, f"Totalled {summary['distributors']} distributors")
+    if snapshots is not None:
+        _flush_snapshots(snapshots, pending)
+    os.replace(form_tmp, form_path)
+    os.replace(changes_tmp, changes_path)
+    summary["total_reported"] = round(summary["total_reported"], 2)
+    return summary
+
+
+def generate_1099_report(tax_year: str) -> dict:
+    """Writes the year-end 1099 file and the list of distributors whose name or SSN changed."""
+    print(f"Executing generate_1099_report for tax year: {tax_year}")
+    try:
+        year = int(str(tax_year).strip())
+    except ValueError:
+        return {"status": "error", "message": "Please give the tax year as a four-digit year, e.g. 2025.", "details": None}
+    if not 2000 <= year <= datetime.now().year:
+        return {"status": "error", "message": f"{year} is not a tax year that can be reported.", "details": None}
+    if not IDENTITY_HASH_KEY:
+        return {"status": "error", "message": "IDENTITY_HASH_KEY is not set; it is required to store the name and "
+                                              "SSN hashes used for change detection.", "details": None}
+    from database import get_shared_db
+    db = get_shared_db()
+    if db is None:
+        return {"status": "error", "message": "Could not connect to the database.", "details": None}
+
+    snapshots = db[IDENTITY_SNAPSHOT_COLLECTION]
+    try:
+        snapshots.create_index("year")
+        report_progress(0.0, f"Loading {year - 1} identity hashes")
+        previous = {doc["distributor_id"]: doc for doc in
+                    snapshots.find({"year": year - 1},
+                                   {"_id": 0, "distributor_id": 1, "name_hash": 1, "tax_id_hash": 1, "key_id": 1})}
+        cursor = db[COMMISSION_LINES_COLLECTION].aggregate(_paid_lines_pipeline(year), allowDiskUse=True, batchSize=2000)
+        summary = write_1099_report(cursor, year, previous, _hash_key(), snapshots=snapshots, expected=len(previous))
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while writing the 1099 report: {e}", "details": None}
+
+    if not summary["distributors"]:
+        return {"status": "error", "message": f"No commission payments were found for tax year {year} "
+                                              f"({_basis()}; see FORM_1099_DATE_FIELD).", "details": summary}
+    message = (f"Wrote 1099 records for {summary['reportable']} of {summary['distributors']} distributors "
+               f"(total {summary['total_reported']:,.2f}); {summary['identity_changes']} had a name or SSN change. "
+               f"Basis: {summary['basis']}.")
+    if summary["previous_other_key"]:
+        message += (f" {summary['previous_other_key']} of last year's identity hashes were made with a different "
+                    f"IDENTITY_HASH_KEY, so those distributors were only checked for changes within {year}.")
+    return {"status": "success", "message": message, "details": summary}
@@ -3,8 +3,8 @@
 import streamlit as st
 import base64
 from pathlib import Path
-import pandas as pd
 import random
+from app.exports import render_download_buttons
 
 def display_welcome_message():
     """Displays a professional welcome message in the chat container."""
@@ -36,12 +36,12 @@ def display_predefined_actions():
         # --- Daily Operations Section ---
         st.subheader("🛠️ Daily Operations", anchor=False)
         daily_actions = [
-            ("0. Execute all steps 1-7 for the SAP ES Matched Data", "", False),
+            ("0. Execute all steps 1-7 for the SAP ES Matched Data", "", True),
             ("1. Recover SAP Commission For cancelled orders", "", False),
             ("2. Reconcile SAP vs ES Commission For a specific date", "", True),
-            ("3. Check Commission Recovery Status For today's payments", "", False),
+            ("3. Check Commission Recovery Status For today's payments", "", True),
             ("4. Execute SAP payment for a specific sale date", "", False),
-            ("5. Create a bank transfer file or print cheque", "", False),
+            ("5. Create a bank transfer file or print cheque", "", True),
             ("6. Update SAP payment at ES", "", False),
             ("7. Download the summary of commission payments for a sales date", "", False),
             ("8. E8PA Members Fast commission payment", "", False)
@@ -57,7 +57,7 @@ def display_predefined_actions():
         monthly_actions = [
             ("Post Intercompany Debits", "Send debit notes", False),
             ("Accrue & Reverse Commissions", "Handle IC commission", False),
-            ("Reconcile IC Payments", "Match payment instructions", False),
+            ("Reconcile IC Payments", "Match payment instructions", True),
             ("Send Balance Confirmations", "To IC partners", False),
             ("TDS Report", "", False),
             ("Send Commision GST Invoices", "", False),
@@ -73,7 +73,7 @@ def display_predefined_actions():
         report_actions = [
             ("General Commission Report", "View overall commissions", True),
             ("Top Vendor Payments", "Ranked for last month", False),
-            ("6A Bonus Forecast", "Expected bonus accrual", False)
+            ("6A Bonus Forecast", "Expected bonus accrual", True)
         ]
         cols = st.columns(4)
         for i, (title, caption, is_working) in enumerate(report_actions):
@@ -83,7 +83,7 @@ def display_predefined_actions():
          # --- Year-End Operationsn ---
         st.subheader("📆 Year-End Operations", anchor=False)
         yearly_actions = [
-            ("1099 report and list of distributor who had a name or SSN change", "", False)
+            ("1099 report and list of distributor who had a name or SSN change", "", True)
         ]
         cols = st.columns(4)
         for i, (title, caption, is_working) in enumerate(yearly_actions):
@@ -157,28 +157,23 @@ def display_reconciliation_results(result: dict, idx=None):
         st.error(result["message"])
         return
 
+    from app.results_grid import render_results_grid
     details = result["details"]
     st.info(f"Reconciliation completed for period {details['start_date']} to {details['end_date']}")
-    print(f"idx: {idx}")
+    cache_key = f"{idx}:reconciliation" if idx is not None else None
     # Display unmatched amounts
     if details["unmatched_amounts"]:
         st.write("#### Unmatched Amounts")
-        df_unmatched = pd.DataFrame(details["unmatched_amounts"])
-        st.dataframe(df_unmatched)
-        # Download button for complete list
-        csv = pd.DataFrame(details["unmatched_amounts"]).to_csv(index=False)
-        st.download_button(
-            label="Download Complete List",
-            data=csv,
-            file_name="unmatched_amounts.csv",
-            mime="text/csv",
-            key=f"unmatched_download_btn_{idx}" if idx is not None else "unmatched_download_btn"
+        render_results_grid(f"unmatched_{idx}", details["unmatched_amounts"], cache_key and f"{cache_key}:unmatched")
+        # Download buttons for complete list, serialized only when clicked
+        render_download_buttons(
+            f"{idx}:unmatched_amounts" if idx is not None else None,
+            details["unmatched_amounts"], "unmatched_amounts", label="Download"
         )
     # Display payment block removal
     if details["payment_block_removal"]:
         st.write("#### You can remove the payment block for the following records from SAP")
-        df_payment_block = pd.DataFrame(details["payment_block_removal"])
-        st.dataframe(df_payment_block)
+        render_results_grid(f"payment_block_{idx}", details["payment_block_removal"], cache_key and f"{cache_key}:payment_block")
         # Confirmation button if there are records
         if len(details["payment_block_removal"]) > 0:
             btn_key = f"remove_payment_block_btn_{idx}" if idx is not None else "remove_payment_block_btn"
@@ -188,13 +183,219 @@ def display_reconciliation_results(result: dict, idx=None):
             ):
                 print("Removing payment block...====>")
                 from agent_logic import execute_action
-                result = execute_action({
-                    "action": "remove_payment_block",
-                    "args": {"records": details["payment_block_removal"]}
-                })
-                st.success(result.get("result", {}).get("message", "Payment block removed from SAP"))
+                from jobs import get_job_manager
+                # Large lists are sent in batches on the worker pool; the result is posted to the chat
+                job_id = get_job_manager().submit(
+                    execute_action,
+                    {"action": "remove_payment_block", "args": {"records": details["payment_block_removal"]}},
+                    label="remove_payment_block",
+                    chat_id=st.session_state.get("chat_id")
+                )
+                st.session_state.active_jobs.append(job_id)
+                st.rerun()
+
+def display_payment_block_results(result: dict, idx=None):
+    """Display the per-record outcome of a bulk payment block removal"""
+    details = result.get("details") or {}
+    if result["status"] == "success":
+        st.success(result["message"])
+    elif result["status"] == "partial":
+        st.warning(result["message"])
+    else:
+        st.error(result["message"])
+    if "records_per_second" in details:
+        st.caption(
+            f"{details['processed_records']} records in {details['batches']} batches, "
+            f"{details['elapsed_seconds']}s ({details['records_per_second']} records/s), {details['retries']} retries"
+        )
+    failed = [o for o in details.get("outcomes", []) if o["Status"] == "failed"]
+    if failed:
+        st.write("#### Records still blocked")
+        st.dataframe(failed, hide_index=True)
+        render_download_buttons(
+            f"{idx}:payment_block_failed" if idx is not None else None,
+            failed, "payment_block_failed", label="Download"
+        )
+    duplicates = [o for o in details.get("outcomes", []) if o["Status"] == "duplicate"]
+    if duplicates:
+        st.write("#### Records listed more than once (sent once)")
+        st.dataframe(duplicates, hide_index=True)
+
+def display_pipeline_results(result: dict, idx=None):
+    """Display the outcome of each daily pipeline step in the chat UI"""
+    details = result.get("details")
+    if not details:
+        st.error(result["message"])
+        return
+
+    if result["status"] == "success":
+        st.success(result["message"])
+    else:
+        st.error(result["message"])
+    if details.get("resumed"):
+        st.caption("Resumed from the last checkpoint.")
+    import pandas as pd
+    st.dataframe(pd.DataFrame(details["steps"]), hide_index=True)
+
+def display_invoice_results(result: dict, idx=None):
+    """Display invoice details fetched from the external system"""
+    details = result.get("details") or {}
+    if result["status"] == "error":
+        st.error(result["message"])
+        return
+    if result["status"] == "partial":
+        st.warning(result["message"])
+        st.caption(f"No answer for: {', '.join(details['failed_dates'])}")
+    else:
+        st.info(result["message"])
+    if details.get("invoices"):
+        st.dataframe(details["invoices"][:100], hide_index=True)
+        render_download_buttons(
+            f"{idx}:invoices" if idx is not None else None,
+            details["invoices"], "invoices", label="📥 All Invoices"
+        )
+
+def display_invoice_counts(result: dict, idx=None):
+    """Display invoice counts per sales date"""
+    details = result.get("details") or {}
+    if result["status"] == "error":
+        st.error(result["message"])
+        return
+    st.info(result["message"])
+    if len(details.get("counts", [])) > 1:
+        import pandas as pd
+        series = pd.DataFrame(details["counts"]).set_index("Sales date")
+        st.bar_chart(series)
+        st.dataframe(series, use_container_width=True)
+
+def display_bonus_forecast(result: dict, idx=None):
+    """Display the 6A forecast with the leading candidates"""
+    details = result.get("details")
+    if not details:
+        st.error(result["message"])
+        return
+    st.success(result["message"])
+    cols = st.columns(3)
+    cols[0].metric("Qualified for 6A", f"{details['qualified_6a']:,}")
+    cols[1].metric("On track for 6A", f"{details['on_track_6a']:,}")
+    cols[2].metric("Expected bonus accrual", f"${details['expected_bonus_accrual']:,.0f}")
+    st.caption(f"{details['distributors']:,} distributors, {details['month_progress']:.0%} of the month elapsed")
+    if details["candidates"]:
+        st.dataframe(details["candidates"], hide_index=True)
+
+def display_ic_matching_results(result: dict, idx=None):
+    """Display matched intercompany payments and the items left open"""
+    details = result.get("details")
+    if not details:
+        st.error(result["message"])
+        return
+    st.success(result["message"])
+    counts = ", ".join(f"{count} {kind}" for kind, count in details["match_counts"].items())
+    st.caption(
+        f"{details['total_payments']} payment instructions, {details['total_notes']} debit notes"
+        f"{' (' + counts + ')' if counts else ''}; matched in {details['elapsed_seconds']}s "
+        f"({details['items_per_second']:,.0f} items/s)"
+    )
+    sections = [
+        ("Matched", "matched", "ic_matched"),
+        ("Unmatched payment instructions", "unmatched_payments", "ic_unmatched_payments"),
+        ("Unmatched debit notes", "unmatched_notes", "ic_unmatched_notes"),
+    ]
+    for title, key, file_name in sections:
+        rows = details.get(key) or []
+        if not rows:
+            continue
+        with st.expander(f"{title} ({len(rows)})", expanded=key != "matched"):
+            st.dataframe(rows[:500], hide_index=True)
+            render_download_buttons(f"{idx}:{file_name}" if idx is not None else None, rows, file_name, label="Download")
+
+def display_payment_files(result: dict, idx=None):
+    """Display the bank transfer files and cheque print batches that were written"""
+    details = result.get("details")
+    if result["status"] == "error" or not details:
+        st.error(result["message"])
+        return
+    st.success(result["message"])
+    if details["bank_files"]:
+        st.write("#### Bank transfer files")
+        st.dataframe(details["bank_files"], hide_index=True)
+    if details["cheque_batches"]:
+        st.write("#### Cheque print batches")
+        st.dataframe(details["cheque_batches"], hide_index=True)
+    st.caption(f"Control totals and hashes are in {details['manifest_file']}.")
+
+def display_shipment_report(result: dict, idx=None):
+    """Display the shipments found for a delivery date"""
+    details = result.get("details")
+    if not details:
+        st.error(result["message"])
+        return
+    st.info(result["message"])
+    if details["shipments"]:
+        st.dataframe(details["shipments"], hide_index=True)
+        render_download_buttons(
+            f"{idx}:shipments" if idx is not None else None,
+            details["shipments"], "shipment_report", label="📥 Shipments"
+        )
+
+def display_recovery_status(result: dict, idx=None):
+    """Display the cancelled orders that have no commission recovery yet"""
+    details = result.get("details")
+    if not details:
+        st.error(result["message"])
+        return
+    if details["unrecovered"]:
+        st.warning(result["message"])
+    else:
+        st.success(result["message"])
+    st.caption(
+        f"{details['cancelled_orders']} cancelled, {details['recovered_orders']} recovered; "
+        f"checked in {details['elapsed_seconds']}s ({details['cached_days']} days from cache)"
+        + (f"; {details['skipped_ids']} non-numeric order ids skipped" if details["skipped_ids"] else "")
+    )
+    if details["unrecovered"]:
+        st.dataframe(details["unrecovered"][:500], hide_index=True)
+        render_download_buttons(
+            f"{idx}:unrecovered" if idx is not None else None,
+            details["unrecovered"], "unrecovered_cancellations", label="📥 Unrecovered orders"
+        )
+
+def display_1099_report(result: dict, idx=None):
+    """Display the 1099 totals and the distributors whose name or SSN changed"""
+    details = result.get("details")
+    if result["status"] == "error" or not details:
+        st.error(result["message"])
+        return
+    st.success(result["message"])
+    st.caption(
+        f"{details['below_threshold']} distributors were paid less than the reporting threshold. "
+        f"Files: {details['form_file']}, {details['changes_file']}"
+    )
+    if details.get("previous_other_key"):
+        st.warning(f"{details['previous_other_key']} of last year's identity hashes used a different key; "
+                   "those distributors were not compared with last year.")
+    if details["changes"]:
+        st.write("#### Name or SSN changes")
+        if details["identity_changes"] > len(details["changes"]):
+            st.caption(f"Showing {len(details['changes'])} of {details['identity_changes']}; all are in the changes file.")
+        st.dataframe(details["changes"], hide_index=True)
+        render_download_buttons(
+            f"{idx}:identity_changes" if idx is not None else None,
+            details["changes"], f"identity_changes_{details['tax_year']}", label="📥 Changes"
+        )
 
 # Tool-to-UI mapping for dynamic invocation
 TOOL_UI_RENDERERS = {
     "reconcile_sap_vs_es_sales": display_reconciliation_results,
+    "execute_daily_pipeline": display_pipeline_results,
+    "remove_payment_block": display_payment_block_results,
+    "fetch_invoice_details": display_invoice_results,
+    "get_invoice_count": display_invoice_counts,
+    "get_6a_bonus_forecast": display_bonus_forecast,
+    "reconcile_intercompany_payments": display_ic_matching_results,
+    "generate_payment_files": display_payment_files,
+    "issue_payment": display_payment_files,
+    "get_shipment_report": display_shipment_report,
+    "check_recovery_status": display_recovery_status,
+    "generate_1099_report": display_1099_report,
 }
\ No newline at end of file